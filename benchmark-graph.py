@@ -0,0 +1,172 @@
+import argparse, gc, json, os, random, sys, tempfile, time, tracemalloc
+from os.path import abspath, dirname
+
+# Ensure we benchmark the version of dlldiag in this source tree rather than any installed version
+sys.path.insert(0, dirname(abspath(__file__)))
+from dlldiag.common import GraphWriter
+from dlldiag.subcommands.graph import GraphAggregator, GraphBuilder, GraphHelpers
+
+
+def generateLog(numEntries, numThreads, numModules, seed):
+	'''
+	Generates a synthetic instrumentation log with nested LoadLibrary() and LdrLoadDll() calls spread across multiple threads
+	'''
+	rng = random.Random(seed)
+	modules = ['C:\\WINDOWS\\SYSTEM32\\MODULE{:05d}.DLL'.format(index) for index in range(numModules)]
+	flags = [[], ['LOAD_LIBRARY_SEARCH_DEFAULT_DIRS'], ['LOAD_LIBRARY_SEARCH_SYSTEM32', 'LOAD_LIBRARY_SEARCH_USER_DIRS']]
+	stacks = {thread: [] for thread in range(1000, 1000 + numThreads)}
+	entries = []
+	timestamp = 133000000000000000
+	
+	def enter(thread):
+		caller = stacks[thread][-1]['result'] if len(stacks[thread]) > 0 else 'C:\\APP\\APP.EXE'
+		target = rng.choice(modules)
+		function = rng.choice(['LoadLibraryW', 'LoadLibraryExW', 'LdrLoadDll', 'SetDllDirectoryW'])
+		entry = {
+			'type': 'enter',
+			'random': rng.randint(0, 32767),
+			'timestamp_start': timestamp,
+			'module': caller,
+			'thread': thread,
+			'function': function
+		}
+		if function == 'LoadLibraryW':
+			entry['arguments'] = [target]
+		elif function == 'LoadLibraryExW':
+			entry['arguments'] = [target, 0, rng.choice(flags)]
+		elif function == 'LdrLoadDll':
+			entry['arguments'] = [target, rng.choice(flags)]
+			entry['stack'] = [caller, 'C:\\WINDOWS\\SYSTEM32\\KERNELBASE.DLL'] + rng.sample(modules, 6)
+		else:
+			entry['arguments'] = ['C:\\APP\\PLUGINS']
+		entries.append(entry)
+		stacks[thread].append(dict(entry, result=target))
+	
+	def leave(thread):
+		call = stacks[thread].pop()
+		succeeded = rng.random() < 0.9
+		entry = dict(call, type='return', timestamp_end=timestamp)
+		error = {'code': 0 if succeeded else 126, 'message': '' if succeeded else 'The specified module could not be found.'}
+		if call['function'] == 'SetDllDirectoryW':
+			entry['result'] = 1
+		elif succeeded == False:
+			entry['result'] = 'NULL'
+		entry['error'] = error
+		if call['function'] == 'LdrLoadDll':
+			entry['status'] = error
+		entries.append(entry)
+	
+	# Open and close nested calls on randomly selected threads until we have generated the requested number of entries
+	while len(entries) < numEntries:
+		timestamp += rng.randint(1, 5000)
+		thread = rng.choice(list(stacks.keys()))
+		if len(stacks[thread]) > 0 and (len(stacks[thread]) >= 4 or rng.random() < 0.5):
+			leave(thread)
+		else:
+			enter(thread)
+	
+	# Close any calls that are still open
+	for thread, stack in stacks.items():
+		while len(stack) > 0:
+			timestamp += 1
+			leave(thread)
+	
+	return entries
+
+
+def measureMemory(lines, compact, aggregate=False):
+	'''
+	Measures the memory retained by a graph constructed from the supplied JSON log lines
+	'''
+	gc.collect()
+	tracemalloc.start()
+	builder = GraphAggregator() if aggregate == True else GraphBuilder(compact=compact)
+	for line in lines:
+		builder.addEntry(json.loads(line))
+	graph = builder.finish()
+	gc.collect()
+	retained = tracemalloc.get_traced_memory()[0]
+	tracemalloc.stop()
+	return retained
+
+
+if __name__ == '__main__':
+	
+	# Our supported command-line arguments
+	parser = argparse.ArgumentParser(description='Benchmarks call graph reconstruction using synthetic instrumentation logs')
+	parser.add_argument('--sizes', nargs='+', default=[10000, 100000, 1000000], type=int, help='Numbers of log entries to generate')
+	parser.add_argument('--threads', default=8, type=int, help='Number of threads to spread the calls across')
+	parser.add_argument('--modules', default=2000, type=int, help='Number of unique modules to load')
+	parser.add_argument('--seed', default=0, type=int, help='Random seed for generating the synthetic logs')
+	parser.add_argument('--write', action='store_true', help='Time writing the graph to file in each supported format instead of timing construction')
+	parser.add_argument('--summary', action='store_true', help='Time rendering the summary of the graph (with and without extended details) instead of timing construction')
+	parser.add_argument('--memory', action='store_true', help='Measure the memory retained by the graph with dictionaries, compact log records and aggregation instead of timing construction')
+	args = parser.parse_args()
+	
+	# If requested, measure the memory retained by graphs constructed from JSON log lines, as they would be parsed from a real log file
+	if args.memory == True:
+		for size in args.sizes:
+			lines = [json.dumps(entry) for entry in generateLog(size, args.threads, args.modules, args.seed)]
+			dictionaries = measureMemory(lines, compact=False)
+			records = measureMemory(lines, compact=True)
+			aggregated = measureMemory(lines, compact=True, aggregate=True)
+			print('{:>10} entries:{:10.1f} MiB with dictionaries{:10.1f} MiB with compact records{:10.1f} MiB aggregated    ({:.1f}x / {:.1f}x reduction)'.format(
+				len(lines),
+				dictionaries / (1024 * 1024),
+				records / (1024 * 1024),
+				aggregated / (1024 * 1024),
+				dictionaries / records,
+				dictionaries / aggregated
+			), flush=True)
+		sys.exit(0)
+	
+	# If requested, time writing the graph to file in each supported format
+	if args.write == True:
+		with tempfile.TemporaryDirectory() as tempDir:
+			for size in args.sizes:
+				graph = GraphHelpers.constructGraph(generateLog(size, args.threads, args.modules, args.seed))
+				for format in GraphWriter.FORMATS:
+					outfile = os.path.join(tempDir, 'graph.{}'.format(format))
+					start = time.perf_counter()
+					GraphHelpers.writeToFile(graph, outfile, format)
+					elapsed = time.perf_counter() - start
+					print('{:>10} entries:{:>8}{:10.3f}s total{:10.1f} MiB    ({} edges)'.format(
+						size,
+						format,
+						elapsed,
+						os.path.getsize(outfile) / (1024 * 1024),
+						graph.number_of_edges()
+					), flush=True)
+		sys.exit(0)
+	
+	# If requested, time rendering the summary of the graph, discarding the output
+	if args.summary == True:
+		for size in args.sizes:
+			graph = GraphHelpers.constructGraph(generateLog(size, args.threads, args.modules, args.seed))
+			for extendedDetails in [False, True]:
+				with open(os.devnull, 'w') as devnull:
+					start = time.perf_counter()
+					GraphHelpers.printSummary(graph, extendedDetails, stream=devnull)
+					elapsed = time.perf_counter() - start
+				print('{:>10} entries:{:>9}{:10.3f}s total    ({} vertices, {} edges)'.format(
+					size,
+					'extended' if extendedDetails == True else 'basic',
+					elapsed,
+					graph.number_of_nodes(),
+					graph.number_of_edges()
+				), flush=True)
+		sys.exit(0)
+	
+	# Time graph reconstruction for each log size
+	for size in args.sizes:
+		log = generateLog(size, args.threads, args.modules, args.seed)
+		start = time.perf_counter()
+		graph = GraphHelpers.constructGraph(log)
+		elapsed = time.perf_counter() - start
+		print('{:>10} entries:{:10.3f}s total{:10.3f}us per entry    ({} vertices, {} edges)'.format(
+			len(log),
+			elapsed,
+			(elapsed * 1000000) / len(log),
+			graph.number_of_nodes(),
+			graph.number_of_edges()
+		), flush=True)
@@ -0,0 +1,58 @@
+import argparse, glob, os, sys, time
+from os.path import abspath, dirname, isdir, join
+
+# Ensure we benchmark the version of dlldiag in this source tree rather than any installed version
+sys.path.insert(0, dirname(abspath(__file__)))
+from dlldiag.common import ImportTableReader, ModuleHeader
+
+# Our supported command-line arguments
+parser = argparse.ArgumentParser(description='Benchmarks the minimal import table reader against pefile')
+parser.add_argument('paths', nargs='+', help='PE files or directories containing PE files to parse')
+parser.add_argument('--iterations', default=5, type=int, help='Number of times to parse each module')
+args = parser.parse_args()
+
+# Gather the list of modules to parse
+modules = []
+for path in args.paths:
+	if isdir(path):
+		for extension in ['dll', 'exe', 'sys']:
+			modules.extend(glob.glob(join(path, '**', '*.{}'.format(extension)), recursive=True))
+	else:
+		modules.append(path)
+
+# Filter out any files that are not valid PE modules
+parsed = {}
+for module in modules:
+	try:
+		parsed[module] = ModuleHeader._parsePefile(module)
+	except Exception:
+		pass
+modules = sorted(parsed.keys())
+print('Benchmarking {} modules ({:.1f} MiB total), {} iterations each\n'.format(
+	len(modules),
+	sum([os.stat(m).st_size for m in modules]) / (1024 * 1024),
+	args.iterations
+), flush=True)
+
+# Verify that the fast path produces identical results wherever it does not fall back to pefile
+fallbacks = 0
+for module in modules:
+	facts = ImportTableReader.readFacts(module)
+	if facts is None:
+		fallbacks += 1
+	elif facts != parsed[module]:
+		print('Mismatch for {}:\n  pefile: {}\n  reader: {}'.format(module, parsed[module], facts), file=sys.stderr)
+print('The minimal reader handled {} of {} modules ({} fell back to pefile)\n'.format(len(modules) - fallbacks, len(modules), fallbacks))
+
+# Time each parsing approach
+for name, function in [('pefile', ModuleHeader._parsePefile), ('minimal reader', ImportTableReader.readFacts)]:
+	start = time.perf_counter()
+	for _ in range(args.iterations):
+		for module in modules:
+			function(module)
+	elapsed = time.perf_counter() - start
+	print('{:16}{:10.3f}s total{:10.3f}ms per module'.format(
+		name + ':',
+		elapsed,
+		(elapsed * 1000) / max(len(modules) * args.iterations, 1)
+	), flush=True)
@@ -0,0 +1,137 @@
+import argparse, io, statistics, subprocess, sys, tarfile, tempfile, time
+from os.path import abspath, dirname
+
+# Ensure we benchmark the version of dlldiag in this source tree rather than any installed version
+ROOT = dirname(abspath(__file__))
+sys.path.insert(0, ROOT)
+from dlldiag.subcommands import subcommands
+
+# The script that we run in a fresh interpreter to invoke a subcommand's help message
+# (The help message is printed after the subcommand's module has been imported, so this captures its import cost
+# without requiring any of the subcommand's inputs or any Windows-only functionality)
+SCRIPT = '''
+import sys
+sys.path.insert(0, {!r})
+sys.argv = ['dlldiag'] + {!r}
+from dlldiag.main import main
+main()
+'''
+
+
+def exportRevision(revision, directory):
+	'''
+	Extracts the dlldiag package from the specified git revision of this source tree into the specified directory
+	'''
+	archive = subprocess.run(
+		['git', 'archive', '--format=tar', revision, 'dlldiag'],
+		cwd=ROOT,
+		stdout=subprocess.PIPE,
+		stderr=subprocess.PIPE
+	)
+	if archive.returncode != 0:
+		raise RuntimeError('failed to export revision "{}": {}'.format(revision, archive.stderr.decode('utf-8', 'replace').strip()))
+	with tarfile.open(fileobj=io.BytesIO(archive.stdout)) as tar:
+		tar.extractall(directory)
+
+
+def measureStartup(args, root=ROOT):
+	'''
+	Runs dlldiag from the specified source tree with the specified arguments in a fresh interpreter and returns the wall
+	clock time in seconds, the total import time in seconds as reported by `-X importtime`, the list of (module,
+	cumulative time) tuples for the top-level imports, and whether dlldiag ran successfully
+	'''
+	start = time.perf_counter()
+	result = subprocess.run(
+		[sys.executable, '-X', 'importtime', '-c', SCRIPT.format(root, args)],
+		stdout=subprocess.DEVNULL,
+		stderr=subprocess.PIPE,
+		universal_newlines=True
+	)
+	elapsed = time.perf_counter() - start
+
+	# Parse the import timings, which are reported as "import time: self [us] | cumulative | imported package"
+	total = 0
+	topLevel = []
+	for line in result.stderr.splitlines():
+		if line.startswith('import time:') and '|' in line:
+			fields = line[len('import time:'):].split('|')
+			try:
+				selfTime, cumulative = int(fields[0]), int(fields[1])
+			except ValueError:
+				continue
+			total += selfTime
+			module = fields[2].rstrip()
+			if not module.startswith('  '):
+				topLevel.append((module.strip(), cumulative / 1000000))
+
+	return elapsed, total / 1000000, topLevel, result.returncode == 0
+
+
+if __name__ == '__main__':
+
+	# Our supported command-line arguments
+	parser = argparse.ArgumentParser(description='Benchmarks dlldiag startup time by measuring the import cost of each subcommand')
+	parser.add_argument('subcommands', nargs='*', default=None, help='Subcommands to benchmark (defaults to all subcommands, plus running with no subcommand)')
+	parser.add_argument('--runs', default=10, type=int, help='Number of times to run each subcommand (the median is reported)')
+	parser.add_argument('--top', default=5, type=int, help='Number of most expensive top-level imports to list for each subcommand')
+	parser.add_argument('--max-import-ms', default=None, type=float, help='Exit with a non-zero status code if the median import time for any subcommand exceeds this many milliseconds')
+	parser.add_argument('--baseline', default=None, metavar='REV', help='Also benchmark the specified git revision of this source tree and exit with a non-zero status code if the median import time for any subcommand exceeds the baseline')
+	parser.add_argument('--tolerance', default=10.0, type=float, help='Percentage by which the median import time may exceed the baseline to allow for measurement noise (default is 10)')
+	args = parser.parse_args()
+
+	# If a baseline revision was specified then extract it so we can benchmark it alongside the working tree
+	baselineDir = tempfile.TemporaryDirectory() if args.baseline is not None else None
+	if baselineDir is not None:
+		try:
+			exportRevision(args.baseline, baselineDir.name)
+		except RuntimeError as e:
+			print('Error: {}'.format(e))
+			sys.exit(1)
+
+	# Benchmark each of the requested subcommands
+	failed = False
+	for subcommand in args.subcommands if len(args.subcommands) > 0 else [None] + list(subcommands.keys()):
+		arguments = [subcommand, '--help'] if subcommand is not None else []
+		name = subcommand if subcommand is not None else '(none)'
+
+		# Interleave the runs for the working tree and the baseline, so that both are equally affected by system load
+		runs = []
+		baselineRuns = []
+		for _ in range(args.runs):
+			runs.append(measureStartup(arguments))
+			if baselineDir is not None:
+				baselineRuns.append(measureStartup(arguments, baselineDir.name))
+
+		wall = statistics.median([run[0] for run in runs])
+		imports = statistics.median([run[1] for run in runs])
+		print('{:>12}:{:10.1f}ms wall clock{:10.1f}ms importing'.format(name, wall * 1000, imports * 1000), flush=True)
+
+		# List the most expensive top-level imports from the last run
+		for module, cumulative in sorted(runs[-1][2], key=lambda item: -item[1])[:args.top]:
+			print('{:>12} {:10.1f}ms  {}'.format('', cumulative * 1000, module))
+
+		# Timings are meaningless if dlldiag failed to run
+		if all([run[3] for run in runs]) == False:
+			print('{:>12} failed to run!'.format(''), flush=True)
+			failed = True
+			continue
+
+		# Check the import time against the threshold, if one was specified
+		if args.max_import_ms is not None and imports * 1000 > args.max_import_ms:
+			print('{:>12} exceeded the import time threshold of {}ms!'.format('', args.max_import_ms), flush=True)
+			failed = True
+
+		# Check the import time against the baseline, skipping any subcommands that don't run successfully in the baseline
+		if baselineDir is not None:
+			if all([run[3] for run in baselineRuns]) == False:
+				print('{:>12} does not run successfully in the baseline, skipping comparison'.format(''), flush=True)
+				continue
+			baseline = statistics.median([run[1] for run in baselineRuns])
+			print('{:>12}{:10.1f}ms importing in the baseline ({:+.1f}%)'.format('', baseline * 1000, (imports / baseline - 1) * 100), flush=True)
+			if imports > baseline * (1 + args.tolerance / 100):
+				print('{:>12} exceeded the baseline import time by more than {}%!'.format('', args.tolerance), flush=True)
+				failed = True
+
+	if baselineDir is not None:
+		baselineDir.cleanup()
+	sys.exit(1 if failed == True else 0)
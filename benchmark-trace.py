@@ -0,0 +1,137 @@
+import argparse, contextlib, io, random, sys, time
+from os.path import abspath, dirname
+
+# Ensure we benchmark the version of dlldiag in this source tree rather than any installed version
+sys.path.insert(0, dirname(abspath(__file__)))
+from dlldiag.common import FileIO
+from dlldiag.subcommands.trace import CallTrace, TraceHelpers
+
+
+def generateOutput(numLines, numThreads, seed):
+	'''
+	Generates synthetic debugger output containing a loader snaps trace with nested calls spread across multiple threads
+	'''
+	rng = random.Random(seed)
+	functions = TraceHelpers.getFunctionWhitelist()
+	prefixes = ['{:04x}:{:04x}'.format(0x1a2c, 0x3000 + thread) for thread in range(numThreads)]
+	stacks = {prefix: [] for prefix in prefixes}
+	lines = ['ModLoad: 00007ff6`12340000 00007ff6`12350000   dlldiag-helper-loadlibrary.exe', '[LOADLIBRARY][START]']
+	timestamp = 1000000
+	count = 0
+	
+	def emit(prefix, function, details):
+		lines.append('{} @ {} - {} - {}'.format(prefix, timestamp, function, details))
+	
+	# Open and close nested calls on randomly selected threads, interspersed with lines for functions we ignore
+	while count < numLines:
+		timestamp += rng.randint(1, 50)
+		prefix = rng.choice(prefixes)
+		stack = stacks[prefix]
+		if rng.random() < 0.3:
+			emit(prefix, 'LdrpFindKnownDll', 'ENTER: DLL name: MODULE{:04d}.DLL'.format(rng.randint(0, 999)))
+		elif len(stack) > 0 and (len(stack) >= 6 or rng.random() < 0.5):
+			emit(prefix, stack.pop(), 'RETURN: Status: 0x{:08x}'.format(rng.choice([0, 0, 0, 0xc0000135])))
+		else:
+			function = rng.choice(functions)
+			stack.append(function)
+			emit(prefix, function, 'ENTER: DLL name: C:\\Windows\\SYSTEM32\\MODULE{:04d}.DLL'.format(rng.randint(0, 999)))
+		count += 1
+	
+	# Close any calls that are still open
+	for prefix, stack in stacks.items():
+		while len(stack) > 0:
+			emit(prefix, stack.pop(), 'RETURN: Status: 0x00000000')
+	
+	# Swap a small number of adjacent lines so that some RETURN lines precede their corresponding ENTER lines
+	for _ in range(numLines // 1000):
+		index = rng.randint(2, len(lines) - 2)
+		lines[index], lines[index + 1] = lines[index + 1], lines[index]
+	
+	lines.extend(['[LOADLIBRARY][END]', 'ModLoad: 00007ffb`56780000 00007ffb`56790000   C:\\Windows\\System32\\KERNELBASE.dll'])
+	return '\n'.join(lines) + '\n'
+
+
+def legacyParse(output, mapStatus):
+	'''
+	The list-based parsing approach used prior to the introduction of the streaming parser, retained for comparison
+	'''
+	
+	# Isolate the trace output between the start and end markers
+	startMarker = '[LOADLIBRARY][START]'
+	endMarker = '[LOADLIBRARY][END]'
+	start = output.index(startMarker) + len(startMarker)
+	end = output.index(endMarker)
+	subset = output[start:end]
+	
+	# Split, filter and parse each line
+	lines = [line.split(' - ', 2) for line in subset.replace('\r\n', '\n').split('\n')]
+	lines = [line for line in lines if len(line) == 3 and line[1] in TraceHelpers.getFunctionWhitelist()]
+	parsedLines = [TraceHelpers.parseLine(line[0], line[1], line[2]) for line in lines]
+	
+	# Pair the ENTER and RETURN lines
+	calls = []
+	pending = []
+	while len(parsedLines) > 0:
+		parsed = parsedLines.pop(0)
+		if parsed['operation'] == 'ENTER':
+			trace = CallTrace(parsed['prefix'], parsed['function'], parsed['dll'], parsed['result'])
+			calls.append(trace)
+			pending.append(trace)
+		else:
+			matches = [c for c in reversed(pending) if parsed['prefix'] == c.prefix and parsed['function'] == c.function]
+			if len(matches) > 0:
+				match = matches[0]
+				match.result = mapStatus(int(parsed['result'], 16))
+				pending.remove(match)
+			elif len(parsedLines) > 1:
+				parsedLines.insert(2, parsed)
+	
+	return (subset, calls)
+
+
+def streamingParse(output, mapStatus):
+	'''
+	Parses the supplied debugger output using the streaming parser
+	'''
+	raw = []
+	lines = TraceHelpers.extractTraceLines(io.StringIO(output), raw)
+	calls = TraceHelpers.pairCalls(TraceHelpers.parseLines(lines), mapStatus)
+	return (''.join(raw), calls)
+
+
+if __name__ == '__main__':
+	
+	# Our supported command-line arguments
+	parser = argparse.ArgumentParser(description='Benchmarks loader snaps trace parsing using recorded or synthetic debugger output')
+	parser.add_argument('logs', nargs='*', help='Recorded debugger output files containing loader snaps traces')
+	parser.add_argument('--sizes', nargs='+', default=[10000, 50000, 200000], type=int, help='Numbers of trace lines to generate if no recorded logs are specified')
+	parser.add_argument('--threads', default=4, type=int, help='Number of threads to spread the synthetic calls across')
+	parser.add_argument('--seed', default=0, type=int, help='Random seed for generating the synthetic output')
+	parser.add_argument('--skip-legacy', action='store_true', help='Don\'t time the legacy list-based parser, which is quadratic in the number of lines')
+	args = parser.parse_args()
+	
+	# Gather the debugger output to parse
+	if len(args.logs) > 0:
+		inputs = [(log, FileIO.readFile(log).replace('\r\n', '\n')) for log in args.logs]
+	else:
+		inputs = [('{} lines'.format(size), generateOutput(size, args.threads, args.seed)) for size in args.sizes]
+	
+	# Time each parsing approach, verifying that both approaches produce identical results
+	# (We map status codes to themselves since RtlNtStatusToDosError() is only available under Windows)
+	mapStatus = lambda status: status
+	for name, output in inputs:
+		print('{}:'.format(name), flush=True)
+		results = {}
+		for parserName, function in [('streaming', streamingParse), ('legacy', legacyParse)]:
+			if parserName == 'legacy' and args.skip_legacy == True:
+				continue
+			
+			start = time.perf_counter()
+			with contextlib.redirect_stdout(io.StringIO()):
+				raw, calls = function(output, mapStatus)
+			elapsed = time.perf_counter() - start
+			results[parserName] = (raw, [str(c) for c in calls])
+			print('    {:12}{:10.3f}s total    ({} calls)'.format(parserName + ':', elapsed, len(calls)), flush=True)
+		
+		if len(results) > 1 and results['streaming'] != results['legacy']:
+			print('    Mismatch between the results of the streaming and legacy parsers!', file=sys.stderr)
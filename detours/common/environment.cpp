@@ -18,9 +18,9 @@ string GetEnvVar(const string& key)
 
 uint64_t GetTimestamp()
 {
-	// Retrieve the current system time
+	// Retrieve the current system time with the highest available precision, so that we can measure the duration of individual calls
 	FILETIME time;
-	GetSystemTimeAsFileTime(&time);
+	GetSystemTimePreciseAsFileTime(&time);
 	
 	// Convert the time structure to an integer timestamp
 	ULARGE_INTEGER timestamp;
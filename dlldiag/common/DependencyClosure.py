@@ -0,0 +1,138 @@
+from .DllSearchOrder import DllSearchOrder
+from .ModuleHeader import ModuleHeader
+from .StringUtils import StringUtils
+from collections import OrderedDict, deque
+
+class DependencyClosure(object):
+	'''
+	Computes the transitive import closure for a PE module offline, using only the information
+	stored in module headers and an emulated DLL search order
+	'''
+	
+	def __init__(self, delayLoad=True, manifest=None):
+		'''
+		Creates a new dependency closure calculator.
+		
+		`delayLoad` specifies whether delay-loaded imports should be followed.
+		`manifest` specifies an `ImageManifest` from which the headers of any modules it includes should be
+		retrieved, rather than parsing them from the filesystem.
+		'''
+		self._searchOrder = None
+		self._delayLoad = delayLoad
+		self._manifest = manifest
+		self._headers = {}
+		self._resolved = {}
+		
+		# The results of the most recent call to `compute()`, along with any header parsing errors
+		self.modules = OrderedDict()
+		self.dependencies = OrderedDict()
+		self.missing = OrderedDict()
+		self.apiSets = OrderedDict()
+		self.errors = OrderedDict()
+	
+	def getHeader(self, module):
+		'''
+		Returns the parsed `ModuleHeader` for the specified module, raising an error if it cannot be parsed
+		'''
+		header = self._parseHeader(module)
+		if header is None:
+			raise RuntimeError('failed to parse the module header for "{}": {}'.format(module, self.errors[module]))
+		return header
+	
+	def compute(self, module, searchOrder):
+		'''
+		Walks the transitive import closure of the specified module in breadth-first order,
+		using the supplied `DllSearchOrder` object to resolve imported DLL names to files.
+		
+		Upon completion, `modules` maps the path of each module in the closure to its `ModuleHeader`
+		(or `None` for modules that are present in the manifest but whose headers are unknown),
+		`dependencies` maps each module path to a list of (imported name, resolved path) tuples,
+		`missing` and `apiSets` map unresolved DLL names and API set names to the list of modules
+		that import them, and `errors` maps the paths of unparseable modules to error messages.
+		'''
+		
+		# Parse the root module and use its architecture to filter candidates during resolution
+		root = self.getHeader(module)
+		architecture = root.getArchitecture()
+		
+		# Discard the results of any previous computation (parsed headers are retained and reused)
+		self._searchOrder = searchOrder
+		self._resolved = {}
+		self.modules = OrderedDict([(module, root)])
+		self.dependencies = OrderedDict()
+		self.missing = OrderedDict()
+		self.apiSets = OrderedDict()
+		
+		# Visit each module in the closure exactly once
+		queue = deque([module])
+		while len(queue) > 0:
+			path = queue.popleft()
+			header = self.modules[path]
+			self.dependencies[path] = []
+			for dll in self._listImports(header):
+				
+				# API sets are resolved by the loader via the API set schema rather than the filesystem
+				if DllSearchOrder.isApiSet(dll):
+					self.apiSets.setdefault(dll.casefold(), []).append(path)
+					self.dependencies[path].append((dll, None))
+					continue
+				
+				# Resolve the imported DLL and record it as missing if no suitable file was found
+				resolved = self._resolve(dll, architecture)
+				self.dependencies[path].append((dll, resolved))
+				if resolved is None:
+					self.missing.setdefault(dll.casefold(), []).append(path)
+				elif resolved not in self.modules:
+					self.modules[resolved] = self._headers[resolved]
+					
+					# The imports of modules whose headers are unknown cannot be followed (these are recorded in `errors`)
+					if self.modules[resolved] is not None:
+						queue.append(resolved)
+		
+		return self
+	
+	def _listImports(self, header):
+		'''
+		Returns the unique list of imports for the specified module that we are following
+		'''
+		imports = header.listAllImports() if self._delayLoad == True else header.listImports() + header.listBoundImports()
+		return StringUtils.uniqueCaseInsensitive(imports)
+	
+	def _parseHeader(self, path):
+		'''
+		Parses the header for the specified module, ensuring that each file is only ever parsed once
+		'''
+		if path not in self._headers:
+			try:
+				header = self._manifest.getHeader(path) if self._manifest is not None and self._manifest.contains(path) else ModuleHeader(path)
+				header.getArchitecture()
+				self._headers[path] = header
+			except Exception as e:
+				self._headers[path] = None
+				self.errors[path] = str(e)
+		
+		return self._headers[path]
+	
+	def _resolve(self, dll, architecture):
+		'''
+		Resolves an imported DLL name to the path of the first candidate file with a matching architecture,
+		caching the result since the search order is the same for every module in the process
+		'''
+		key = dll.casefold()
+		if key not in self._resolved:
+			self._resolved[key] = None
+			for candidate in self._searchOrder.candidates(dll):
+				
+				# The loader skips over images with a mismatched architecture and continues searching
+				header = self._parseHeader(candidate)
+				if header is not None and header.getArchitecture() == architecture:
+					self._resolved[key] = candidate
+					break
+				
+				# Modules that the manifest lists without header details are still present in the image, so we resolve
+				# to them even though we cannot verify their architecture or follow their imports
+				if header is None and self._manifest is not None and self._manifest.contains(candidate):
+					self._resolved[key] = candidate
+					break
+		
+		return self._resolved[key]
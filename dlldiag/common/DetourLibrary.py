@@ -1,5 +1,5 @@
 from .FileIO import FileIO
-import json, os, subprocess, tempfile, threading, time
+import json, os, shutil, subprocess, tempfile, threading, time
 from os.path import abspath, dirname, join
 
 class DetourLibrary(object):
@@ -7,6 +7,12 @@ class DetourLibrary(object):
 	Provides access to our Detours-based instrumentation DLLs
 	'''
 	
+	# The number of 100-nanosecond intervals between the Windows FILETIME epoch (1601) and the Unix epoch (1970)
+	FILETIME_EPOCH_OFFSET = 116444736000000000
+	
+	# The number of timestamp units (100-nanosecond intervals) in a millisecond
+	TICKS_PER_MILLISECOND = 10000
+	
 	def __init__(self, architecture, dll):
 		'''
 		Creates a new instrumentation DLL wrapper.
@@ -18,7 +24,7 @@ class DetourLibrary(object):
 		self.detourDLL = DetourLibrary._resolveDetourDLL(architecture, dll)
 		self.envVar = 'DLLDIAG_DETOUR_{}_LOGFILE'.format(dll.upper())
 	
-	def run(self, executable, args, timeout=None, capture=True, merge=False, **kwargs):
+	def run(self, executable, args, timeout=None, capture=True, merge=False, callback=None, idleCallback=None, saveLog=None, **kwargs):
 		'''
 		Runs the specified executable with our instrumentation DLL injected.
 		This is a wrapper for `subprocess.run()`.
@@ -26,6 +32,14 @@ class DetourLibrary(object):
 		`timeout` specifies a timeout in seconds after which the process should be stopped.
 		`capture` specifies whether stdout and stderr should be captured.
 		`merge` specifies whether stderr should be redirected to stdout.
+		`callback` specifies a function to call with each parsed log entry while the process is running.
+		`idleCallback` specifies a function to call whenever no new log entries are available (requires `callback`.)
+		`saveLog` specifies a file that the raw log should be copied to once the process completes, so it can be replayed later.
+		
+		If a callback is specified then the log file is tailed as it grows rather than being read after
+		the process completes, and the `log` attribute of the returned result will be `None`.
+		The `timestamp` attribute of the returned result holds the time at which the process was started,
+		in the same format as the timestamps in the log entries.
 		'''
 		
 		# Configure stdout and stderr as requested
@@ -45,8 +59,9 @@ class DetourLibrary(object):
 			logFile = join(tempDir, 'log.txt')
 			env[self.envVar] = logFile
 			
-			# Start a child process to run the executable with our DLL injected
+			# Start a child process to run the executable with our DLL injected, recording the time at which it was started
 			command = [self.withDLL, '/d:{}'.format(self.detourDLL), executable] + args
+			started = DetourLibrary.timestamp()
 			process = subprocess.Popen(
 				command,
 				stdout=stdout,
@@ -64,16 +79,110 @@ class DetourLibrary(object):
 					daemon=True
 				).start()
 			
-			# Wait for the child process to complete and retrieve its stdout, stderr and exit code
-			stdout, stderr = process.communicate(None)
-			exitCode = process.poll()
-			result = subprocess.CompletedProcess(command, exitCode, stdout, stderr)
+			# If a callback was specified then stream the log entries to it until the child process completes
+			if callback is not None:
+				output = []
+				waiter = threading.Thread(target=lambda: output.extend(process.communicate(None)), daemon=True)
+				waiter.start()
+				try:
+					for entry in DetourLibrary.tailLog(logFile, waiter.is_alive, idleCallback=idleCallback):
+						callback(entry)
+				except BaseException:
+					
+					# If we are interrupted (e.g. by Ctrl-C) or the callback fails then stop the child process tree, so the
+					# target doesn't outlive us and the temporary directory containing the log file can be removed
+					DetourLibrary._terminateTree(process)
+					waiter.join()
+					raise
+				waiter.join()
+				result = subprocess.CompletedProcess(command, process.poll(), output[0], output[1])
+				setattr(result, 'log', None)
+			
+			else:
+				
+				# Wait for the child process to complete and retrieve its stdout, stderr and exit code
+				stdout, stderr = process.communicate(None)
+				exitCode = process.poll()
+				result = subprocess.CompletedProcess(command, exitCode, stdout, stderr)
+				
+				# Parse the log file and include it in the returned result
+				logEntries = [json.loads(line) for line in FileIO.readFile(logFile).splitlines()]
+				setattr(result, 'log', logEntries)
+			
+			setattr(result, 'timestamp', started)
+			
+			# Copy the raw log to the specified file if requested (the log will not exist if no calls were logged)
+			if saveLog is not None:
+				if os.path.exists(logFile):
+					shutil.copyfile(logFile, saveLog)
+				else:
+					FileIO.writeFile(saveLog, '')
 			
-			# Parse the log file and include it in the returned result
-			logEntries = [json.loads(line) for line in FileIO.readFile(logFile).splitlines()]
-			setattr(result, 'log', logEntries)
 			return result
 	
+	@staticmethod
+	def readLog(logFile):
+		'''
+		Yields each parsed entry from a previously-saved log file
+		'''
+		if os.path.exists(logFile) == False:
+			raise RuntimeError('the log file "{}" does not exist'.format(logFile))
+		return DetourLibrary.tailLog(logFile, lambda: False)
+	
+	@staticmethod
+	def timestamp():
+		'''
+		Returns the current system time in the same format as the timestamps in the log entries
+		(the number of 100-nanosecond intervals since January 1, 1601 UTC, as used by the Windows FILETIME structure)
+		'''
+		return (time.time_ns() // 100) + DetourLibrary.FILETIME_EPOCH_OFFSET
+	
+	@staticmethod
+	def tailLog(logFile, isRunning, pollInterval=0.1, chunkSize=65536, idleCallback=None):
+		'''
+		Yields each parsed entry from a log file as it is written, until the writer stops running.
+		
+		`isRunning` is a function that reports whether the writer is still running.
+		`pollInterval` specifies the number of seconds to wait between checks for new data.
+		`chunkSize` specifies the maximum number of bytes to read at once, which bounds memory usage
+		along with the length of the longest individual log line.
+		`idleCallback` specifies a function to call whenever we are waiting for new data to be written.
+		'''
+		
+		# Wait for the log file to be created, since it is only opened once the instrumentation DLL has been loaded
+		while not os.path.exists(logFile):
+			if isRunning() == False:
+				return
+			time.sleep(pollInterval)
+		
+		with open(logFile, 'rb') as log:
+			partial = b''
+			while True:
+				
+				# Determine whether the writer is still running before we read, so we don't miss any trailing data
+				running = isRunning()
+				
+				# Read and parse all complete lines, retaining any incomplete final line until the rest of it has been written
+				chunk = log.read(chunkSize)
+				if len(chunk) > 0:
+					lines = (partial + chunk).split(b'\n')
+					partial = lines.pop()
+					for line in lines:
+						if len(line.strip()) > 0:
+							yield json.loads(line.decode('utf-8'))
+					continue
+				
+				# If the writer has stopped then parse any unterminated final line and stop tailing
+				if running == False:
+					if len(partial.strip()) > 0:
+						yield json.loads(partial.decode('utf-8'))
+					return
+				
+				# Wait for more data to be written
+				if idleCallback is not None:
+					idleCallback()
+				time.sleep(pollInterval)
+	
 	@staticmethod
 	def _resolveWithDLL(architecture):
 		'''
@@ -113,11 +222,29 @@ class DetourLibrary(object):
 		# Wait for the timeout to elapse
 		time.sleep(timeout)
 		
-		# If the child process is still running then use `taskkill` to terminate it
+		# If the child process is still running then terminate it
 		if process.returncode is None:
-			subprocess.run(
+			DetourLibrary._terminateTree(process)
+	
+	@staticmethod
+	def _terminateTree(process):
+		'''
+		Forcibly terminates a process and its child processes.
+		
+		`process` is a `subprocess.Popen` object representing the target process.
+		'''
+		
+		# Use `taskkill` to terminate the entire process tree, since the instrumented executable is a child of `withdll.exe`
+		try:
+			killed = subprocess.run(
 				['taskkill', '/F', '/T', '/PID', str(process.pid)],
 				stdout=subprocess.DEVNULL,
 				stderr=subprocess.DEVNULL,
 				check=False
-			)
+			).returncode == 0
+		except OSError:
+			killed = False
+		
+		# If `taskkill` failed then fall back to terminating the immediate child process
+		if killed == False and process.poll() is None:
+			process.kill()
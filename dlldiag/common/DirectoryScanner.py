@@ -0,0 +1,155 @@
+from .HeaderCache import HeaderCache
+from .ModuleHeader import ModuleHeader
+import concurrent.futures, functools, os
+from os.path import join, splitext
+
+class DirectoryScanner(object):
+	'''
+	Provides functionality for parsing the headers of every PE module in a directory tree using a pool of worker processes
+	'''
+	
+	# The file extensions that identify PE modules
+	MODULE_EXTENSIONS = ['.cpl', '.dll', '.drv', '.exe', '.ocx', '.pyd', '.sys']
+	
+	@staticmethod
+	def listModules(directory):
+		'''
+		Returns the sorted list of PE modules found in the specified directory tree
+		'''
+		modules = []
+		for root, _, files in os.walk(directory):
+			modules.extend([join(root, f) for f in files if splitext(f)[1].lower() in DirectoryScanner.MODULE_EXTENSIONS])
+		return sorted(modules, key=str.casefold)
+	
+	@staticmethod
+	def findDuplicates(modules, workers=None):
+		'''
+		Identifies the modules with identical contents, returning a dictionary that maps the SHA-256 hash of the
+		contents to the sorted list of modules for each group of two or more identical modules.
+		
+		Only the modules whose size matches that of another module are hashed, since modules with a unique size
+		cannot have any duplicates. `workers` specifies the number of threads to use for hashing files (the number
+		of CPU cores will be used if `None`.)
+		'''
+		
+		# Group the modules by size, ignoring any that cannot be accessed (these will be reported when they are parsed)
+		sizes = {}
+		for module in modules:
+			try:
+				sizes.setdefault(os.path.getsize(module), []).append(module)
+			except OSError:
+				pass
+		
+		# Hash the modules that share their size with at least one other module
+		# (Threads are sufficient here, since hashlib releases the GIL when hashing large buffers)
+		candidates = [module for group in sizes.values() if len(group) > 1 for module in group]
+		if len(candidates) == 0:
+			return {}
+		with concurrent.futures.ThreadPoolExecutor(workers if workers is not None else (os.cpu_count() or 1)) as executor:
+			digests = list(executor.map(DirectoryScanner._hashModule, candidates))
+		
+		# Group the modules by hash and discard any hashes that are only shared by a single module
+		groups = {}
+		for module, digest in zip(candidates, digests):
+			if digest is not None:
+				groups.setdefault(digest, []).append(module)
+		return {digest: sorted(group, key=str.casefold) for digest, group in groups.items() if len(group) > 1}
+	
+	@staticmethod
+	def scan(modules, workers=None, duplicates=None, useCache=True):
+		'''
+		Parses the header for each of the specified modules, yielding (module, `ModuleHeader`, error) tuples as
+		soon as they are available, in the same order as the supplied list. `ModuleHeader` will be `None` and
+		`error` will contain the error message for any modules that could not be parsed.
+		
+		`workers` specifies the number of worker processes (the number of CPU cores will be used if `None`.)
+		`duplicates` specifies the groups of modules with identical contents returned by `findDuplicates()`, if
+		any, in which case only the first module of each group is parsed and the results are shared by the group.
+		`useCache` specifies whether the default `HeaderCache` should be used, which should be disabled when scanning
+		modules that are unlikely to be parsed again (e.g. when indexing an image), so that they don't evict useful entries.
+		'''
+		
+		# If we know which modules have identical contents then only parse one module from each group
+		if duplicates is not None and len(duplicates) > 0:
+			yield from DirectoryScanner._scanUnique(modules, workers, duplicates, useCache)
+			return
+		
+		# Don't bother spinning up worker processes if there is only a small amount of work to do
+		workers = workers if workers is not None else (os.cpu_count() or 1)
+		workers = min(workers, len(modules))
+		if workers <= 1:
+			for module in modules:
+				yield DirectoryScanner._scanModule(module, useCache)[:3]
+			return
+		
+		# Distribute the modules across the worker processes in small chunks so results can be streamed back promptly
+		chunksize = max(1, min(16, len(modules) // (workers * 4)))
+		# (multiprocessing is imported on demand, since it is relatively slow to import and only needed for large scans)
+		import multiprocessing
+		mode = HeaderCache.getWorkerMode() if useCache == True else 'off'
+		cache = HeaderCache.getDefault() if useCache == True else None
+		scanModule = functools.partial(DirectoryScanner._scanModule, useCache=useCache)
+		with multiprocessing.Pool(workers, initializer=HeaderCache.resetDefault, initargs=(mode,)) as pool:
+			for module, header, error, hits, misses in pool.imap(scanModule, modules, chunksize):
+				
+				# Propagate the cache statistics from the worker processes so they are reflected in our own
+				if cache is not None:
+					cache.hits += hits
+					cache.misses += misses
+				
+				yield (module, header, error)
+	
+	@staticmethod
+	def _scanUnique(modules, workers, duplicates, useCache):
+		'''
+		Parses the header for the first of each group of modules with identical contents and shares the result with the
+		other modules in the group, yielding the results for all of the specified modules in the same order as `scan()`
+		'''
+		
+		# Map each duplicate module to the module with identical contents that appears first in the supplied list
+		position = {module: index for index, module in enumerate(modules)}
+		representatives = {}
+		for group in duplicates.values():
+			group = [module for module in group if module in position]
+			first = min(group, key=position.get) if len(group) > 0 else None
+			for module in group:
+				if module != first:
+					representatives[module] = first
+		
+		# Parse the unique modules, retrieving each result as soon as it is needed
+		# (Since the first module of each group is parsed before the other modules in the group, this never blocks on later results)
+		parsed = DirectoryScanner.scan([module for module in modules if module not in representatives], workers, useCache=useCache)
+		results = {}
+		for module in modules:
+			source = representatives.get(module, module)
+			while source not in results:
+				result = next(parsed)
+				results[result[0]] = result
+			_, header, error = results[source]
+			yield (module, header.withFilename(module) if header is not None else None, error)
+	
+	@staticmethod
+	def _hashModule(module):
+		'''
+		Computes the SHA-256 hash of the contents of a single module, returning `None` if it cannot be read
+		'''
+		try:
+			return HeaderCache.hashFile(module)
+		except OSError:
+			return None
+	
+	@staticmethod
+	def _scanModule(module, useCache=True):
+		'''
+		Parses the header for a single module, returning the result along with the number of cache hits and misses
+		'''
+		cache = HeaderCache.getDefault() if useCache == True else None
+		hits, misses = (cache.hits, cache.misses) if cache is not None else (0, 0)
+		try:
+			result = (module, ModuleHeader(module, cache=None if useCache == True else False), None)
+		except Exception as e:
+			result = (module, None, str(e))
+		
+		if cache is not None:
+			hits, misses = cache.hits - hits, cache.misses - misses
+		return result + (hits, misses)
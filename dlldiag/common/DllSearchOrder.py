@@ -0,0 +1,96 @@
+import os
+from os.path import isdir, isfile, join
+
+class DllSearchOrder(object):
+	'''
+	Emulates the standard Windows DLL search order so that imports can be resolved offline against
+	a copied or mounted filesystem tree (e.g. an extracted Windows container image)
+	'''
+	
+	# The default list of KnownDLLs for recent versions of Windows
+	# (The real list is stored under `HKLM\SYSTEM\CurrentControlSet\Control\Session Manager\KnownDLLs`)
+	DEFAULT_KNOWN_DLLS = [
+		'advapi32.dll', 'clbcatq.dll', 'combase.dll', 'comdlg32.dll', 'coml2.dll', 'difxapi.dll',
+		'gdi32.dll', 'gdiplus.dll', 'imagehlp.dll', 'imm32.dll', 'kernel32.dll', 'kernelbase.dll',
+		'msctf.dll', 'msvcrt.dll', 'normaliz.dll', 'nsi.dll', 'ntdll.dll', 'ole32.dll', 'oleaut32.dll',
+		'psapi.dll', 'rpcrt4.dll', 'sechost.dll', 'setupapi.dll', 'shcore.dll', 'shell32.dll',
+		'shlwapi.dll', 'user32.dll', 'wldap32.dll', 'wow64.dll', 'wow64win.dll', 'ws2_32.dll'
+	]
+	
+	def __init__(self, appDir, systemDir=None, extraDirs=[], knownDlls=None, manifest=None):
+		'''
+		Creates a new search order emulator.
+		
+		`appDir` specifies the directory containing the application executable.
+		`systemDir` specifies the System32 (or SysWOW64) directory that matches the application's architecture.
+		`extraDirs` specifies additional directories to search after the system directory (e.g. PATH entries).
+		`knownDlls` specifies the list of KnownDLLs (the default list will be used if `None`.)
+		`manifest` specifies an `ImageManifest` whose contents are used to list any directories that it includes,
+		so that DLLs can be resolved against an image that is not present on the filesystem (e.g. a `systemDir` of
+		"C:\\Windows\\System32" inside the image.) All other directories are listed from the filesystem.
+		'''
+		self._appDir = appDir
+		self._systemDir = systemDir
+		self._extraDirs = list(extraDirs)
+		self._knownDlls = set([dll.casefold() for dll in (knownDlls if knownDlls is not None else DllSearchOrder.DEFAULT_KNOWN_DLLS)])
+		self._manifest = manifest
+		self._listings = {}
+	
+	@staticmethod
+	def isApiSet(dll):
+		'''
+		Determines whether the specified DLL name refers to an API set, which the loader resolves
+		via the API set schema rather than by searching the filesystem
+		'''
+		name = dll.casefold()
+		return name.startswith('api-ms-') or name.startswith('ext-ms-')
+	
+	def isKnownDll(self, dll):
+		'''
+		Determines whether the specified DLL name is in the list of KnownDLLs
+		'''
+		return dll.casefold() in self._knownDlls
+	
+	def listDirectories(self, dll):
+		'''
+		Returns the list of directories that will be searched for the specified DLL, in order
+		'''
+		
+		# KnownDLLs are always loaded from the system directory, so they bypass the search order entirely
+		if self._systemDir is not None and self.isKnownDll(dll):
+			return [self._systemDir]
+		
+		# Search the application directory, then the system directory, then any additional directories
+		directories = [self._appDir, self._systemDir] + self._extraDirs
+		return [d for d in directories if d is not None]
+	
+	def candidates(self, dll):
+		'''
+		Yields the full path to each file matching the specified DLL name, in search order.
+		
+		Filenames are compared case-insensitively, mirroring the behaviour of NTFS on Windows
+		even when the filesystem tree is being accessed from a case-sensitive host.
+		'''
+		name = dll.casefold()
+		for directory in self.listDirectories(dll):
+			path = self._listDirectory(directory).get(name, None)
+			if path is not None:
+				yield path
+	
+	def _listDirectory(self, directory):
+		'''
+		Returns a mapping from case-folded filenames to full paths for the files in the specified
+		directory, listing each directory only once no matter how many lookups are performed
+		'''
+		listing = self._listings.get(directory, None)
+		if listing is None and self._manifest is not None:
+			listing = self._manifest.listDirectory(directory)
+		if listing is None:
+			listing = {}
+			if isdir(directory):
+				for entry in os.listdir(directory):
+					path = join(directory, entry)
+					if isfile(path):
+						listing[entry.casefold()] = path
+			self._listings[directory] = listing
+		return listing
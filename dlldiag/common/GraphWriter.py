@@ -0,0 +1,212 @@
+from .LogRecord import LogRecord
+import json
+
+class GraphWriter(object):
+	'''
+	Writes networkx call hierarchy graphs to file in GraphViz DOT, GraphML or node-link JSON format, streaming
+	the output one vertex or edge at a time rather than building a copy of the graph or of the document in memory
+	'''
+	
+	# The supported output formats, and the file extensions that are used to infer each format
+	FORMATS = ['dot', 'graphml', 'json']
+	EXTENSIONS = {'.dot': 'dot', '.gv': 'dot', '.graphml': 'graphml', '.json': 'json'}
+	
+	# The edge attributes that are written by default (attributes that are not present on an edge are skipped)
+	DEFAULT_EDGE_ATTRIBUTES = ['function', 'calls', 'succeeded', 'failed']
+	
+	# The attributes whose values are integers, for the purposes of declaring GraphML attribute types
+	INTEGER_ATTRIBUTES = frozenset(['calls', 'failed', 'first_timestamp', 'last_timestamp', 'random', 'succeeded', 'thread', 'timestamp_end', 'timestamp_start'])
+	
+	@staticmethod
+	def formatForFile(outfile):
+		'''
+		Infers the output format from the extension of the specified output file, defaulting to DOT
+		'''
+		extension = outfile[outfile.rfind('.'):].lower() if '.' in outfile else ''
+		return GraphWriter.EXTENSIONS.get(extension, 'dot')
+	
+	@staticmethod
+	def write(graph, outfile, format=None, nodeAttributes=None, edgeAttributes=None):
+		'''
+		Writes the supplied graph to file.
+		
+		`format` specifies the output format (this will be inferred from the file extension if `None`.)
+		`nodeAttributes` and `edgeAttributes` specify the names of the vertex and edge attributes to write. The
+		names can refer to attributes of the vertex or edge itself, or to fields of the log entry stored in its
+		`details` attribute (e.g. "function", "arguments" or "result".) By default, no vertex attributes and
+		the edge attributes listed in `DEFAULT_EDGE_ATTRIBUTES` are written.
+		'''
+		nodeAttributes = nodeAttributes if nodeAttributes is not None else []
+		edgeAttributes = edgeAttributes if edgeAttributes is not None else GraphWriter.DEFAULT_EDGE_ATTRIBUTES
+		format = format if format is not None else GraphWriter.formatForFile(outfile)
+		if format not in GraphWriter.FORMATS:
+			raise RuntimeError('unsupported graph output format "{}"'.format(format))
+		
+		writer = {'dot': GraphWriter._writeDot, 'graphml': GraphWriter._writeGraphML, 'json': GraphWriter._writeJSON}[format]
+		with open(outfile, 'w', encoding='utf-8', newline='') as file:
+			writer(graph, file, nodeAttributes, edgeAttributes)
+	
+	@staticmethod
+	def _attributes(data, names):
+		'''
+		Retrieves the values of the requested attributes that are present in the supplied vertex or edge data
+		'''
+		details = data.get('details', None)
+		attributes = []
+		for name in names:
+			if name in data:
+				attributes.append((name, data[name]))
+			elif details is not None and name in details:
+				attributes.append((name, details[name]))
+		return attributes
+	
+	@staticmethod
+	def _encode(value):
+		'''
+		Encodes the values that the JSON encoder does not support natively, such as compact log records
+		'''
+		return value.toDict() if isinstance(value, LogRecord) else str(value)
+	
+	@staticmethod
+	def _toJSON(value):
+		'''
+		Encodes an attribute value as JSON
+		'''
+		return json.dumps(value, default=GraphWriter._encode)
+	
+	@staticmethod
+	def _toString(value):
+		'''
+		Converts an attribute value to a string, encoding anything other than strings and numbers as JSON
+		'''
+		if isinstance(value, str):
+			return value
+		elif isinstance(value, (int, float)) and not isinstance(value, bool):
+			return str(value)
+		else:
+			return GraphWriter._toJSON(value)
+	
+	@staticmethod
+	def _quoteDot(value):
+		'''
+		Quotes a string for use as an identifier in DOT format
+		(Every backslash is escaped, since GraphViz applies its label escapes such as "\\n" and "\\N" to identifiers when
+		they are used as labels, which would otherwise mangle Windows paths such as "C:\\Windows\\System32\\ntdll.dll")
+		'''
+		return '"{}"'.format(GraphWriter._toString(value).replace('\\', '\\\\').replace('"', '\\"'))
+	
+	@staticmethod
+	def _writeDot(graph, file, nodeAttributes, edgeAttributes):
+		'''
+		Writes the supplied graph to file in GraphViz DOT format
+		'''
+		file.write('digraph {\n' if graph.is_directed() == True else 'graph {\n')
+		for vertex, data in graph.nodes(data=True):
+			file.write('{}{};\n'.format(GraphWriter._quoteDot(vertex), GraphWriter._formatDotAttributes(GraphWriter._attributes(data, nodeAttributes))))
+		for source, target, data in graph.edges(data=True):
+			file.write('{} {} {}{};\n'.format(
+				GraphWriter._quoteDot(source),
+				'->' if graph.is_directed() == True else '--',
+				GraphWriter._quoteDot(target),
+				GraphWriter._formatDotAttributes(GraphWriter._attributes(data, edgeAttributes))
+			))
+		file.write('}\n')
+	
+	@staticmethod
+	def _formatDotAttributes(attributes):
+		'''
+		Formats a list of attribute names and values as a DOT attribute list
+		'''
+		if len(attributes) == 0:
+			return ''
+		return ' [{}]'.format(', '.join(['{}={}'.format(GraphWriter._quoteDot(name), GraphWriter._quoteDot(value)) for name, value in attributes]))
+	
+	@staticmethod
+	def _writeGraphML(graph, file, nodeAttributes, edgeAttributes):
+		'''
+		Writes the supplied graph to file in GraphML format
+		'''
+		file.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+		file.write('<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n')
+		
+		# Declare the keys for each of the requested attributes
+		keys = {}
+		for domain, names in [('node', nodeAttributes), ('edge', edgeAttributes)]:
+			for name in names:
+				keys[(domain, name)] = 'd{}'.format(len(keys))
+				file.write('  <key id="{}" for="{}" attr.name={} attr.type="{}"/>\n'.format(
+					keys[(domain, name)],
+					domain,
+					GraphWriter._quoteXml(name),
+					'long' if name in GraphWriter.INTEGER_ATTRIBUTES else 'string'
+				))
+		
+		# Write the vertices and edges
+		file.write('  <graph edgedefault="{}">\n'.format('directed' if graph.is_directed() == True else 'undirected'))
+		for vertex, data in graph.nodes(data=True):
+			file.write('    <node id={}>{}</node>\n'.format(
+				GraphWriter._quoteXml(GraphWriter._toString(vertex)),
+				GraphWriter._formatGraphMLData(keys, 'node', GraphWriter._attributes(data, nodeAttributes))
+			))
+		for source, target, data in graph.edges(data=True):
+			file.write('    <edge source={} target={}>{}</edge>\n'.format(
+				GraphWriter._quoteXml(GraphWriter._toString(source)),
+				GraphWriter._quoteXml(GraphWriter._toString(target)),
+				GraphWriter._formatGraphMLData(keys, 'edge', GraphWriter._attributes(data, edgeAttributes))
+			))
+		file.write('  </graph>\n</graphml>\n')
+	
+	@staticmethod
+	def _escapeXml(value):
+		'''
+		Escapes a string for use as XML character data
+		(We do this ourselves rather than using `xml.sax.saxutils`, which is surprisingly slow to import)
+		'''
+		return value.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+	
+	@staticmethod
+	def _quoteXml(value):
+		'''
+		Escapes and quotes a string for use as an XML attribute value
+		'''
+		return '"{}"'.format(GraphWriter._escapeXml(value).replace('"', '&quot;').replace('\n', '&#10;').replace('\r', '&#13;').replace('\t', '&#9;'))
+	
+	@staticmethod
+	def _formatGraphMLData(keys, domain, attributes):
+		'''
+		Formats a list of attribute names and values as GraphML data elements
+		'''
+		return ''.join(['<data key="{}">{}</data>'.format(keys[(domain, name)], GraphWriter._escapeXml(GraphWriter._toString(value))) for name, value in attributes])
+	
+	@staticmethod
+	def _writeJSON(graph, file, nodeAttributes, edgeAttributes):
+		'''
+		Writes the supplied graph to file in the node-link JSON format used by `networkx.node_link_data()`
+		'''
+		file.write('{{"directed": {}, "multigraph": {}, "graph": {}, "nodes": ['.format(
+			json.dumps(graph.is_directed()),
+			json.dumps(graph.is_multigraph()),
+			GraphWriter._toJSON(dict(graph.graph))
+		))
+		
+		# Write the vertices
+		separator = '\n'
+		for vertex, data in graph.nodes(data=True):
+			node = dict(GraphWriter._attributes(data, nodeAttributes))
+			node['id'] = vertex
+			file.write(separator + GraphWriter._toJSON(node))
+			separator = ',\n'
+		file.write('\n], "links": [')
+		
+		# Write the edges
+		separator = '\n'
+		edges = graph.edges(keys=True, data=True) if graph.is_multigraph() == True else [(source, target, None, data) for source, target, data in graph.edges(data=True)]
+		for source, target, key, data in edges:
+			link = dict(GraphWriter._attributes(data, edgeAttributes))
+			link['source'] = source
+			link['target'] = target
+			if key is not None:
+				link['key'] = key
+			file.write(separator + GraphWriter._toJSON(link))
+			separator = ',\n'
+		file.write('\n]}\n')
@@ -0,0 +1,253 @@
+import atexit, hashlib, json, os, sys, time
+from os.path import abspath, expanduser, join, normcase
+
+class HeaderCache(object):
+	'''
+	Provides a persistent on-disk cache of the facts parsed from PE module headers, so that unchanged
+	modules (e.g. system DLLs) do not need to be parsed again on every invocation.
+	
+	Header facts and symbol tables are cached in separate tables, since symbol tables are far larger
+	and are only needed when validating imported symbols.
+	'''
+	
+	# The version of the cached data format, which must be incremented whenever the stored facts change
+	SCHEMA_VERSION = 2
+	
+	# The tables that store each kind of cached data
+	TABLES = {'facts': 'headers', 'symbols': 'symbols'}
+	
+	# The default maximum number of cached modules before least-recently used entries are evicted
+	DEFAULT_MAX_ENTRIES = 50000
+	
+	# The number of cache hits whose access times are batched before they are written to the database
+	ACCESS_BATCH_SIZE = 1000
+	
+	# The supported cache modes
+	MODES = ['on', 'off', 'rebuild', 'verify']
+	
+	# The cache mode and instance used by `ModuleHeader` when no explicit cache is specified
+	_defaultMode = os.environ.get('DLLDIAG_CACHE', 'on')
+	_default = None
+	
+	def __init__(self, filename, mode='on', maxEntries=DEFAULT_MAX_ENTRIES):
+		'''
+		Opens (or creates) the cache database stored in the specified file.
+		
+		`mode` specifies the cache mode: "on" reads and writes cache entries, "rebuild" discards all
+		existing entries before writing new ones, and "verify" additionally validates the content hash
+		of each file before treating a cache entry as a hit.
+		`maxEntries` specifies the maximum number of entries to retain when the cache is closed.
+		'''
+		self._mode = mode
+		self._maxEntries = maxEntries
+		self._accessed = []
+		self.hits = 0
+		self.misses = 0
+		
+		# Open the database, allowing concurrent access from multiple processes
+		# (sqlite3 is imported on demand so that it is not loaded when the cache is disabled)
+		import sqlite3
+		os.makedirs(os.path.dirname(filename), exist_ok=True)
+		self._db = sqlite3.connect(filename, timeout=30)
+		self._db.execute('PRAGMA journal_mode=WAL')
+		self._db.execute('PRAGMA synchronous=NORMAL')
+		
+		# Discard the existing entries if the schema has changed or we are rebuilding the cache
+		version = self._db.execute('PRAGMA user_version').fetchone()[0]
+		if version != HeaderCache.SCHEMA_VERSION or mode == 'rebuild':
+			with self._db:
+				for table in HeaderCache.TABLES.values():
+					self._db.execute('DROP TABLE IF EXISTS {}'.format(table))
+				self._db.execute('PRAGMA user_version={}'.format(HeaderCache.SCHEMA_VERSION))
+		
+		# Create the tables for our cache entries if they don't already exist
+		with self._db:
+			for table in HeaderCache.TABLES.values():
+				self._db.execute('CREATE TABLE IF NOT EXISTS {} (path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, hash TEXT, facts TEXT, accessed REAL)'.format(table))
+				self._db.execute('CREATE INDEX IF NOT EXISTS {0}_accessed ON {0} (accessed)'.format(table))
+	
+	@staticmethod
+	def defaultLocation():
+		'''
+		Returns the default path to the cache database for the current user
+		'''
+		if 'DLLDIAG_CACHE_DIR' in os.environ:
+			cacheDir = os.environ['DLLDIAG_CACHE_DIR']
+		elif sys.platform == 'win32':
+			cacheDir = join(os.environ.get('LOCALAPPDATA', expanduser('~')), 'dlldiag')
+		else:
+			cacheDir = join(os.environ.get('XDG_CACHE_HOME', join(expanduser('~'), '.cache')), 'dlldiag')
+		return join(cacheDir, 'headers.db')
+	
+	@staticmethod
+	def getDefault():
+		'''
+		Returns the default cache instance, or `None` if caching is disabled or the cache cannot be opened
+		'''
+		if HeaderCache._default is None and HeaderCache._defaultMode != 'off':
+			import sqlite3
+			try:
+				HeaderCache._default = HeaderCache(HeaderCache.defaultLocation(), HeaderCache._defaultMode)
+				atexit.register(HeaderCache._default.close)
+			except (OSError, sqlite3.Error):
+				HeaderCache._defaultMode = 'off'
+		return HeaderCache._default
+	
+	@staticmethod
+	def getWorkerMode():
+		'''
+		Returns the cache mode that worker processes should use for the default cache, opening the
+		default cache in the current process first so that any rebuild is only performed once
+		'''
+		HeaderCache.getDefault()
+		return 'on' if HeaderCache._defaultMode == 'rebuild' else HeaderCache._defaultMode
+	
+	@staticmethod
+	def resetDefault(mode):
+		'''
+		Discards the default cache instance without closing it (e.g. when inherited by a forked
+		worker process) and sets the mode that will be used to reopen it
+		'''
+		HeaderCache._default = None
+		HeaderCache._defaultMode = mode
+	
+	@staticmethod
+	def addArguments(parser):
+		'''
+		Adds the command-line arguments for controlling the default cache to the supplied `argparse.ArgumentParser`
+		'''
+		parser.add_argument('--cache', choices=HeaderCache.MODES, default=HeaderCache._defaultMode, help='How the persistent module header cache should be used (default is "on", or the value of the DLLDIAG_CACHE environment variable)')
+		parser.add_argument('--cache-stats', action='store_true', help='Print module header cache hit and miss statistics upon completion')
+	
+	@staticmethod
+	def configure(args):
+		'''
+		Configures the default cache based on the command-line arguments parsed by `argparse.ArgumentParser`
+		'''
+		HeaderCache._defaultMode = args.cache
+		if args.cache_stats == True:
+			atexit.register(HeaderCache.printStats)
+	
+	@staticmethod
+	def printStats():
+		'''
+		Prints the hit and miss statistics for the default cache
+		'''
+		cache = HeaderCache._default
+		if cache is not None:
+			print('Module header cache: {} hits, {} misses'.format(cache.hits, cache.misses), flush=True)
+		else:
+			print('Module header cache: disabled', flush=True)
+	
+	def get(self, module, kind='facts'):
+		'''
+		Retrieves the cached facts for the specified module, or `None` if there is no valid cache entry.
+		
+		`kind` specifies the kind of data to retrieve ("facts" for header facts or "symbols" for symbol tables.)
+		'''
+		import sqlite3
+		path, size, mtime = self._identify(module)
+		table = HeaderCache.TABLES[kind]
+		try:
+			row = self._db.execute('SELECT size, mtime, hash, facts FROM {} WHERE path=?'.format(table), (path,)).fetchone() if self._db is not None else None
+		except sqlite3.Error:
+			self._disable()
+			row = None
+		
+		# Verify that the file has not changed since the entry was cached
+		if row is None or row[0] != size or row[1] != mtime or (self._mode == 'verify' and row[2] != HeaderCache.hashFile(module)):
+			self.misses += 1
+			return None
+		
+		# Record the access time for the entry so that eviction is least-recently used
+		# (Access times are written in batches, since a write transaction for every hit would contend with other writers)
+		self._accessed.append((table, time.time(), path))
+		if len(self._accessed) >= HeaderCache.ACCESS_BATCH_SIZE:
+			self._writeAccessTimes()
+		
+		self.hits += 1
+		return json.loads(row[3])
+	
+	def put(self, module, facts, kind='facts'):
+		'''
+		Stores the facts (or other kind of data, as per `get()`) for the specified module in the cache
+		'''
+		import sqlite3
+		if self._db is None:
+			return
+		path, size, mtime = self._identify(module)
+		digest = HeaderCache.hashFile(module) if self._mode == 'verify' else None
+		try:
+			with self._db:
+				self._db.execute(
+					'INSERT OR REPLACE INTO {} (path, size, mtime, hash, facts, accessed) VALUES (?, ?, ?, ?, ?, ?)'.format(HeaderCache.TABLES[kind]),
+					(path, size, mtime, digest, json.dumps(facts), time.time())
+				)
+		except sqlite3.Error:
+			self._disable()
+	
+	def close(self):
+		'''
+		Writes any pending access times, evicts the least-recently used entries that exceed the size cap and closes the database
+		'''
+		import sqlite3
+		self._writeAccessTimes()
+		if self._db is not None:
+			try:
+				with self._db:
+					for table in HeaderCache.TABLES.values():
+						self._db.execute(
+							'DELETE FROM {0} WHERE path IN (SELECT path FROM {0} ORDER BY accessed DESC LIMIT -1 OFFSET ?)'.format(table),
+							(self._maxEntries,)
+						)
+			except sqlite3.Error:
+				pass
+			self._db.close()
+			self._db = None
+	
+	@staticmethod
+	def hashFile(module, chunkSize=1024*1024):
+		'''
+		Computes the SHA-256 hash of the contents of the specified file
+		'''
+		digest = hashlib.sha256()
+		with open(module, 'rb') as f:
+			for chunk in iter(lambda: f.read(chunkSize), b''):
+				digest.update(chunk)
+		return digest.hexdigest()
+	
+	def _writeAccessTimes(self):
+		'''
+		Writes the batched access times for cache hits to the database in a single transaction
+		'''
+		import sqlite3
+		accessed = self._accessed
+		self._accessed = []
+		if self._db is None or len(accessed) == 0:
+			return
+		try:
+			with self._db:
+				for table in HeaderCache.TABLES.values():
+					self._db.executemany('UPDATE {} SET accessed=? WHERE path=?'.format(table), [(when, path) for entryTable, when, path in accessed if entryTable == table])
+		except sqlite3.Error:
+			self._disable()
+	
+	def _disable(self):
+		'''
+		Disables the cache after a database error (e.g. if the database remains locked or its volume is read-only or full),
+		so that modules are parsed rather than failing, just as if the cache could not be opened
+		'''
+		import sqlite3
+		try:
+			self._db.close()
+		except sqlite3.Error:
+			pass
+		self._db = None
+		self._accessed = []
+	
+	def _identify(self, module):
+		'''
+		Returns the normalised path, size and modification time used to identify a cache entry
+		'''
+		stat = os.stat(module)
+		return normcase(abspath(module)), stat.st_size, stat.st_mtime_ns
@@ -0,0 +1,154 @@
+from .CommonErrors import CommonErrors
+from .HelperProcess import HelperProcess
+from .HelperWorker import HelperWorker
+import atexit, threading
+from os.path import abspath, normcase
+
+class HelperPool(object):
+	'''
+	Maintains pools of long-lived library loader helper processes for each architecture and working directory,
+	so that modules can be loaded with a different architecture than the Python interpreter without launching
+	a new helper process for every module
+	'''
+	
+	# The default maximum number of helper processes for each combination of architecture and working directory
+	DEFAULT_MAX_WORKERS = 4
+	
+	# The pool instance used by `WindowsApi` when loading modules externally
+	_default = None
+	_defaultLock = threading.Lock()
+	
+	def __init__(self, commandFactory=None, maxWorkers=DEFAULT_MAX_WORKERS):
+		'''
+		Creates a new, empty pool.
+		
+		`commandFactory` specifies a function that returns the command used to start a helper process in serve
+		mode for the specified architecture (our library loader helper will be used if `None`.)
+		`maxWorkers` specifies the maximum number of helper processes for each architecture and working directory.
+		'''
+		self._commandFactory = commandFactory if commandFactory is not None else HelperPool._helperCommand
+		self._maxWorkers = maxWorkers
+		self._condition = threading.Condition()
+		self._idle = {}
+		self._counts = {}
+		self._closed = False
+	
+	@staticmethod
+	def getDefault():
+		'''
+		Returns the default pool instance, creating it if it does not already exist
+		'''
+		with HelperPool._defaultLock:
+			if HelperPool._default is None:
+				HelperPool._default = HelperPool()
+				atexit.register(HelperPool._default.close)
+			return HelperPool._default
+	
+	def setMaxWorkers(self, maxWorkers):
+		'''
+		Sets the maximum number of helper processes for each architecture and working directory
+		'''
+		with self._condition:
+			self._maxWorkers = maxWorkers
+			self._condition.notify_all()
+	
+	def loadModule(self, architecture, module, cwd):
+		'''
+		Attempts to load the specified module using a helper process for the specified architecture
+		with the specified working directory, and returns the resulting error code
+		'''
+		key = (architecture, normcase(abspath(cwd)))
+		worker = self._acquire(key)
+		healthy = False
+		try:
+			
+			# Send the request to the helper process
+			response = worker.request(module)
+			if response is not None:
+				try:
+					result = int(response)
+					healthy = True
+					return result
+				except ValueError:
+					raise RuntimeError('unexpected response from helper process: "{}"'.format(response))
+			
+			# If the helper process crashed while loading the module then report its exit code, just as if
+			# we had run a separate helper process for the module (the process will be replaced on next use)
+			return worker.close()
+		
+		finally:
+			self._release(key, worker, healthy)
+	
+	def close(self):
+		'''
+		Stops all idle helper processes and prevents any further processes from being started
+		'''
+		with self._condition:
+			self._closed = True
+			workers = [worker for idle in self._idle.values() for worker in idle]
+			self._idle = {}
+			self._condition.notify_all()
+		
+		for worker in workers:
+			worker.close()
+	
+	def _acquire(self, key):
+		'''
+		Retrieves an idle helper process for the specified key, starting a new one if there are none available
+		'''
+		while True:
+			worker = None
+			with self._condition:
+				while True:
+					if self._closed == True:
+						raise RuntimeError('the helper process pool has been closed')
+					
+					# Take an idle helper process if there is one
+					idle = self._idle.get(key, [])
+					if len(idle) > 0:
+						worker = idle.pop()
+						break
+					
+					# Reserve a slot to start a new helper process if we have not yet reached the limit
+					if self._counts.get(key, 0) < self._maxWorkers:
+						self._counts[key] = self._counts.get(key, 0) + 1
+						break
+					
+					# Wait for another thread to release a helper process
+					self._condition.wait()
+			
+			# Start the new helper process outside of the lock, since this can take some time
+			if worker is None:
+				try:
+					return HelperWorker(self._commandFactory(key[0]), cwd=key[1])
+				except RuntimeError:
+					self._release(key, None, False)
+					CommonErrors.cannotRunHelper(key[0])
+			
+			# Check that the idle helper process is still healthy outside of the lock, since this requires a round-trip
+			# to the process, and discard it if it is not (a hung process is killed by the health check)
+			if worker.checkHealth() == True:
+				return worker
+			self._release(key, worker, False)
+	
+	def _release(self, key, worker, healthy):
+		'''
+		Returns a helper process to the pool, or stops it if it is no longer healthy or the pool has been closed
+		'''
+		with self._condition:
+			if worker is not None and healthy == True and self._closed == False:
+				self._idle.setdefault(key, []).append(worker)
+				worker = None
+			else:
+				self._counts[key] -= 1
+			self._condition.notify()
+		
+		if worker is not None:
+			worker.close()
+	
+	@staticmethod
+	def _helperCommand(architecture):
+		'''
+		Returns the command used to start our library loader helper in serve mode for the specified architecture
+		'''
+		return [HelperProcess(architecture, 'loadlibrary').executable, '--serve']
@@ -0,0 +1,133 @@
+import queue, subprocess, threading
+
+class HelperWorker(object):
+	'''
+	Wraps a long-lived helper process that reads requests from stdin and writes responses to stdout, one per line
+	'''
+	
+	# The message that the helper process writes when it starts and in response to health checks
+	READY = 'READY'
+	
+	# The default number of seconds to wait for a response to a health check before treating the helper process as hung
+	HEALTH_CHECK_TIMEOUT = 5
+	
+	# The number of seconds to wait for a new helper process to signal that it is ready before treating it as hung
+	# (This is more generous than the health check timeout, since process creation can be slowed by antivirus scanning)
+	STARTUP_TIMEOUT = 30
+	
+	def __init__(self, command, cwd=None):
+		'''
+		Starts a new helper process and waits for it to signal that it is ready to receive requests.
+		
+		`command` specifies the command to run the helper process in serve mode.
+		`cwd` specifies the working directory for the helper process.
+		
+		Raises `RuntimeError` if the helper process cannot be started or does not signal that it is ready
+		within `STARTUP_TIMEOUT` seconds.
+		'''
+		try:
+			self._process = subprocess.Popen(
+				command,
+				stdin=subprocess.PIPE,
+				stdout=subprocess.PIPE,
+				stderr=subprocess.DEVNULL,
+				encoding='utf-8',
+				bufsize=1,
+				cwd=cwd
+			)
+		except OSError as e:
+			raise RuntimeError('could not start helper process: {}'.format(e))
+		
+		# Read the helper process' stdout on a background thread, so we can wait for responses with a timeout
+		# (We can't use `select()` for this, since it does not support pipes under Windows)
+		self._lines = queue.Queue()
+		self._reader = threading.Thread(target=self._readLines, daemon=True)
+		self._reader.start()
+		
+		# Wait for the ready message, killing the helper process if it hangs during startup
+		try:
+			ready = self._readLine(HelperWorker.STARTUP_TIMEOUT)
+		except queue.Empty:
+			self._process.kill()
+			self.close()
+			raise RuntimeError('the helper process did not signal that it was ready within {} seconds'.format(HelperWorker.STARTUP_TIMEOUT))
+		if ready != HelperWorker.READY:
+			self.close()
+			raise RuntimeError('the helper process did not signal that it was ready')
+	
+	def isAlive(self):
+		'''
+		Determines whether the helper process is still running
+		'''
+		return self._process.poll() is None
+	
+	def checkHealth(self, timeout=HEALTH_CHECK_TIMEOUT):
+		'''
+		Determines whether the helper process is still running and responding to requests, killing
+		the helper process if it does not respond within the specified number of seconds
+		'''
+		if self.isAlive() == False or self._sendLine('') == False:
+			return False
+		try:
+			return self._readLine(timeout) == HelperWorker.READY
+		except queue.Empty:
+			self._process.kill()
+			return False
+	
+	def request(self, line):
+		'''
+		Sends a request to the helper process and returns its response.
+		
+		Returns `None` if the helper process exited before responding, in which case the exit code
+		can be retrieved by calling `close()`.
+		'''
+		if self._sendLine(line) == False:
+			return None
+		return self._readLine()
+	
+	def close(self, timeout=5):
+		'''
+		Stops the helper process by closing its stdin and returns its exit code
+		'''
+		try:
+			self._process.stdin.close()
+		except OSError:
+			pass
+		try:
+			self._process.wait(timeout)
+		except subprocess.TimeoutExpired:
+			self._process.kill()
+			self._process.wait()
+		self._reader.join(timeout)
+		self._process.stdout.close()
+		return self._process.returncode
+	
+	def _sendLine(self, line):
+		'''
+		Writes a single line to the helper process' stdin, returning False if the helper process has exited
+		'''
+		try:
+			self._process.stdin.write(line + '\n')
+			self._process.stdin.flush()
+			return True
+		except (OSError, ValueError):
+			return False
+	
+	def _readLine(self, timeout=None):
+		'''
+		Reads a single line from the helper process' stdout, returning `None` if the helper process has exited.
+		
+		Raises `queue.Empty` if `timeout` is not `None` and no line is received within that number of seconds.
+		'''
+		return self._lines.get(timeout=timeout)
+	
+	def _readLines(self):
+		'''
+		Reads lines from the helper process' stdout until it is closed, queueing each one for `_readLine()`
+		'''
+		try:
+			for line in self._process.stdout:
+				self._lines.put(line.rstrip('\r\n'))
+		except (OSError, ValueError):
+			pass
+		self._lines.put(None)
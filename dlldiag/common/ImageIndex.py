@@ -0,0 +1,230 @@
+from .DirectoryScanner import DirectoryScanner
+from .ModuleHeader import ModuleHeader
+from .SymbolIndex import SymbolIndex
+from pathlib import Path
+import concurrent.futures, hashlib, json, mmap, ntpath, os, struct, time
+
+class ImageIndex(object):
+	'''
+	Provides an indexed manifest of the PE modules in a Windows image, stored in an SQLite database so that it can be
+	opened in milliseconds and queried without loading the whole manifest into memory.
+	
+	The index maps the case-folded filename of each module to its Windows path inside the image, its size, file version,
+	architecture and SHA-256 hash, along with the facts parsed from its header and its imported and exported symbols. It provides the same interface as
+	`ImageManifest`, so it can be used anywhere that a manifest is accepted (e.g. by `DllSearchOrder` and `DependencyClosure`.)
+	'''
+	
+	# The version of the index database format, which must be incremented whenever the stored data changes
+	SCHEMA_VERSION = 2
+	
+	# The header that identifies SQLite database files
+	SQLITE_HEADER = b'SQLite format 3\x00'
+	
+	# The key of the version resource and the signature of the fixed file information structure it contains
+	VERSION_INFO_KEY = 'VS_VERSION_INFO'.encode('utf_16_le')
+	FIXED_FILE_INFO_SIGNATURE = struct.pack('<I', 0xFEEF04BD)
+	
+	def __init__(self, filename):
+		'''
+		Opens an existing index database
+		'''
+		# (sqlite3 is imported on demand, since it is only needed when working with indexes)
+		import sqlite3
+		if os.path.exists(filename) == False:
+			raise RuntimeError('the image index "{}" does not exist'.format(filename))
+		try:
+			self._db = sqlite3.connect('{}?mode=ro'.format(Path(os.path.abspath(filename)).as_uri()), uri=True)
+			version = self._db.execute('PRAGMA user_version').fetchone()[0]
+			if version != ImageIndex.SCHEMA_VERSION:
+				raise RuntimeError('unsupported image index version in "{}"'.format(filename))
+			self.metadata = dict(self._db.execute('SELECT key, value FROM metadata').fetchall())
+		except sqlite3.Error as e:
+			self._db.close()
+			raise RuntimeError('failed to open image index "{}": {}'.format(filename, e))
+		self.filename = filename
+	
+	@staticmethod
+	def isIndex(filename):
+		'''
+		Determines whether the specified file is an index database rather than a manifest in another format
+		'''
+		with open(filename, 'rb') as f:
+			return f.read(len(ImageIndex.SQLITE_HEADER)) == ImageIndex.SQLITE_HEADER
+	
+	@staticmethod
+	def build(root, filename, prefix='C:\\', label=None, workers=None):
+		'''
+		Builds an index from a mounted or extracted image tree and writes it to the specified file, returning the index
+		along with a dictionary that maps the paths of any unparseable modules to error messages.
+		
+		`root` specifies the directory on the host that corresponds to `prefix` inside the image.
+		`label` specifies a descriptive label for the image, such as its tag.
+		`workers` specifies the number of worker processes to use for parsing and the number of threads to use for
+		hashing (the number of CPU cores will be used if `None`.)
+		'''
+		import sqlite3
+		
+		# Parse the module headers and compute the size, version, hash and symbol tables of each module
+		# (The module header cache is not used, since the modules in an image are parsed once and would evict more useful entries)
+		modules = DirectoryScanner.listModules(root)
+		headers = list(DirectoryScanner.scan(modules, workers, useCache=False))
+		with concurrent.futures.ThreadPoolExecutor(workers if workers is not None else (os.cpu_count() or 1)) as executor:
+			details = list(executor.map(ImageIndex._readDetails, modules))
+		
+		# Write the index to a temporary file and move it into place once it is complete, so a failed build never leaves a partial index
+		temp = '{}.tmp'.format(filename)
+		if os.path.exists(temp):
+			os.unlink(temp)
+		db = sqlite3.connect(temp)
+		errors = {}
+		completed = False
+		try:
+			with db:
+				db.execute('PRAGMA user_version={}'.format(ImageIndex.SCHEMA_VERSION))
+				db.execute('CREATE TABLE metadata (key TEXT PRIMARY KEY, value TEXT)')
+				db.execute('CREATE TABLE modules (key TEXT PRIMARY KEY, path TEXT, directory TEXT, name TEXT, size INTEGER, version TEXT, architecture TEXT, hash TEXT, facts TEXT, symbols TEXT)')
+				db.executemany('INSERT INTO metadata (key, value) VALUES (?, ?)', [
+					('label', label if label is not None else os.path.basename(os.path.abspath(root))),
+					('prefix', prefix),
+					('created', time.strftime('%Y-%m-%d %H:%M:%S'))
+				])
+				
+				rows = []
+				for (module, header, error), (size, version, digest, symbols, readError) in zip(headers, details):
+					path = ntpath.normpath(ntpath.join(prefix, *os.path.relpath(module, root).split(os.sep)))
+					if header is None:
+						errors[path] = error
+					elif readError is not None:
+						errors[path] = readError
+					rows.append((
+						path.casefold(),
+						path,
+						ntpath.dirname(path).casefold(),
+						ntpath.basename(path).casefold(),
+						size,
+						version,
+						ImageIndex._architecture(header),
+						digest,
+						json.dumps(header.getFacts()) if header is not None else None,
+						json.dumps(symbols) if symbols is not None else None
+					))
+				db.executemany('INSERT OR REPLACE INTO modules VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+				
+				# Create the indexes after inserting the rows, which is considerably faster than maintaining them during insertion
+				db.execute('CREATE INDEX modules_name ON modules (name)')
+				db.execute('CREATE INDEX modules_directory ON modules (directory)')
+			completed = True
+		except sqlite3.Error as e:
+			raise RuntimeError('failed to write image index "{}": {}'.format(filename, e))
+		finally:
+			
+			# Remove the partial index if the build failed
+			db.close()
+			if completed == False and os.path.exists(temp):
+				os.unlink(temp)
+		
+		os.replace(temp, filename)
+		return ImageIndex(filename), errors
+	
+	def close(self):
+		'''
+		Closes the index database
+		'''
+		if self._db is not None:
+			self._db.close()
+			self._db = None
+	
+	def __len__(self):
+		return self._db.execute('SELECT COUNT(*) FROM modules').fetchone()[0]
+	
+	def lookup(self, name):
+		'''
+		Returns a list of dictionaries describing every module in the image with the specified filename (compared
+		case-insensitively), each of which contains the module's path, size, version, architecture and hash
+		'''
+		rows = self._db.execute('SELECT path, size, version, architecture, hash FROM modules WHERE name=? ORDER BY key', (name.casefold(),))
+		return [
+			{'path': path, 'size': size, 'version': version, 'architecture': architecture, 'hash': digest}
+			for path, size, version, architecture, digest in rows
+		]
+	
+	def contains(self, path):
+		'''
+		Determines whether the index includes the specified path
+		'''
+		return self._db.execute('SELECT 1 FROM modules WHERE key=?', (ntpath.normpath(path).casefold(),)).fetchone() is not None
+	
+	def getHeader(self, path):
+		'''
+		Returns a `ModuleHeader` for the specified module from the facts stored in the index, raising an
+		error if the module is not present in the index or could not be parsed when the index was built
+		'''
+		row = self._db.execute('SELECT path, facts FROM modules WHERE key=?', (ntpath.normpath(path).casefold(),)).fetchone()
+		if row is None or row[1] is None:
+			raise RuntimeError('the image index does not include the header details for "{}"'.format(path))
+		return ModuleHeader.fromFacts(row[0], json.loads(row[1]))
+	
+	def getSymbols(self, path):
+		'''
+		Returns the imported and exported symbols stored in the index for the specified module, in the format
+		returned by `ImportTableReader.readSymbols()`, or `None` if they are not known
+		'''
+		row = self._db.execute('SELECT symbols FROM modules WHERE key=?', (ntpath.normpath(path).casefold(),)).fetchone()
+		return json.loads(row[0]) if row is not None and row[0] is not None else None
+	
+	def listDirectory(self, directory):
+		'''
+		Returns a mapping from case-folded filenames to full paths for the modules in the specified directory,
+		or `None` if the index does not include any modules in the directory
+		'''
+		rows = self._db.execute('SELECT name, path FROM modules WHERE directory=?', (ntpath.normpath(directory).casefold(),)).fetchall()
+		return dict(rows) if len(rows) > 0 else None
+	
+	@staticmethod
+	def _architecture(header):
+		'''
+		Returns the architecture of the module with the supplied header, or `None` if it is unknown
+		'''
+		try:
+			return header.getArchitecture() if header is not None else None
+		except KeyError:
+			return None
+	
+	@staticmethod
+	def _readDetails(module):
+		'''
+		Reads the size, file version, SHA-256 hash and symbol tables of the specified module, memory-mapping the file
+		so that it can be hashed and searched for its version resource without copying its contents.
+		The final element of the returned tuple is an error message if the file could not be read, or `None` otherwise.
+		'''
+		try:
+			size = os.path.getsize(module)
+			if size == 0:
+				return (0, None, hashlib.sha256().hexdigest(), None, None)
+			with open(module, 'rb') as f:
+				with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+					size, version, digest = (size, ImageIndex._readVersion(data), hashlib.sha256(data).hexdigest())
+		except (OSError, ValueError) as e:
+			return (None, None, None, None, 'failed to read the module: {}'.format(e))
+		
+		# Modules whose symbol tables cannot be parsed are still indexed, but their imported symbols cannot be validated
+		try:
+			return (size, version, digest, SymbolIndex.parseSymbols(module), None)
+		except Exception:
+			return (size, version, digest, None, None)
+	
+	@staticmethod
+	def _readVersion(data):
+		'''
+		Extracts the file version from the fixed file information in a module's version resource, if it has one
+		'''
+		key = data.find(ImageIndex.VERSION_INFO_KEY)
+		if key == -1:
+			return None
+		
+		# The fixed file information follows the key, aligned on a 32-bit boundary
+		offset = data.find(ImageIndex.FIXED_FILE_INFO_SIGNATURE, key, key + len(ImageIndex.VERSION_INFO_KEY) + 8)
+		if offset == -1 or offset + 16 > len(data):
+			return None
+		_, _, major, minor = struct.unpack_from('<IIII', data, offset)
+		return '{}.{}.{}.{}'.format(major >> 16, major & 0xffff, minor >> 16, minor & 0xffff)
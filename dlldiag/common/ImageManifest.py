@@ -0,0 +1,128 @@
+from .DirectoryScanner import DirectoryScanner
+from .FileIO import FileIO
+from .ImageIndex import ImageIndex
+from .ModuleHeader import ModuleHeader
+import json, ntpath, os
+
+class ImageManifest(object):
+	'''
+	Describes the PE modules present in a Windows image (e.g. a Windows container image), so that dependencies can be
+	resolved against the image offline without access to its filesystem.
+	
+	Manifests can be loaded from JSON files generated by `build()` and `save()`, which include the facts parsed from the
+	header of every module, or from plain text files that list one path per line (e.g. the output of `dir /s /b`), which
+	only record which files are present. Paths are Windows paths inside the image and are compared case-insensitively.
+	'''
+	
+	# The version of the JSON manifest format
+	FORMAT_VERSION = 1
+	
+	def __init__(self):
+		'''
+		Creates an empty manifest
+		'''
+		self._files = {}
+		self._directories = {}
+	
+	def add(self, path, facts=None):
+		'''
+		Adds a module to the manifest.
+		
+		`path` specifies the Windows path of the module inside the image.
+		`facts` specifies the facts parsed from the module's header, or `None` if they are not known.
+		'''
+		path = ntpath.normpath(path)
+		key = path.casefold()
+		self._files[key] = (path, facts)
+		self._directories.setdefault(ntpath.dirname(key), {})[ntpath.basename(key)] = path
+	
+	@staticmethod
+	def build(root, prefix='C:\\', workers=None):
+		'''
+		Builds a manifest from a mounted or extracted image tree by parsing the header of every PE module in the tree,
+		returning the manifest along with a dictionary that maps the paths of any unparseable modules to error messages.
+		
+		`root` specifies the directory on the host that corresponds to `prefix` inside the image.
+		`workers` specifies the number of worker processes to use for parsing (the number of CPU cores will be used if `None`.)
+		(The module header cache is not used, since the modules in an image are parsed once and would evict more useful entries)
+		'''
+		manifest = ImageManifest()
+		errors = {}
+		for module, header, error in DirectoryScanner.scan(DirectoryScanner.listModules(root), workers, useCache=False):
+			path = ntpath.join(prefix, *os.path.relpath(module, root).split(os.sep))
+			manifest.add(path, header.getFacts() if header is not None else None)
+			if header is None:
+				errors[path] = error
+		return manifest, errors
+	
+	@staticmethod
+	def load(filename):
+		'''
+		Loads a manifest from a JSON file generated by `save()` or a plain text file listing one path per line.
+		If the file is an index database built by `ImageIndex.build()` then the opened `ImageIndex` is returned instead,
+		which provides the same interface without loading the whole manifest into memory.
+		'''
+		if os.path.exists(filename) == False:
+			raise RuntimeError('the image manifest "{}" does not exist'.format(filename))
+		if ImageIndex.isIndex(filename) == True:
+			return ImageIndex(filename)
+		
+		data = FileIO.readFile(filename, encoding='utf-8-sig')
+		manifest = ImageManifest()
+		
+		# Treat anything that doesn't look like a JSON object as a plain text list of paths
+		if data.lstrip().startswith('{') == False:
+			for line in data.splitlines():
+				if len(line.strip()) > 0:
+					manifest.add(line.strip())
+			return manifest
+		
+		try:
+			parsed = json.loads(data)
+		except ValueError as e:
+			raise RuntimeError('failed to parse image manifest "{}": {}'.format(filename, e))
+		if parsed.get('version', None) != ImageManifest.FORMAT_VERSION:
+			raise RuntimeError('unsupported image manifest version in "{}"'.format(filename))
+		for path, facts in parsed['modules'].items():
+			manifest.add(path, facts)
+		return manifest
+	
+	def save(self, filename):
+		'''
+		Saves the manifest to a JSON file
+		'''
+		modules = {path: facts for path, facts in sorted(self._files.values(), key=lambda module: module[0].casefold())}
+		FileIO.writeFile(filename, json.dumps({'version': ImageManifest.FORMAT_VERSION, 'modules': modules}))
+	
+	def __len__(self):
+		return len(self._files)
+	
+	def contains(self, path):
+		'''
+		Determines whether the manifest includes the specified path
+		'''
+		return ntpath.normpath(path).casefold() in self._files
+	
+	def getHeader(self, path):
+		'''
+		Returns a `ModuleHeader` for the specified module from the facts stored in the manifest, raising an
+		error if the module is not present in the manifest or its facts are not known
+		'''
+		path, facts = self._files.get(ntpath.normpath(path).casefold(), (path, None))
+		if facts is None:
+			raise RuntimeError('the image manifest does not include the header details for "{}"'.format(path))
+		return ModuleHeader.fromFacts(path, facts)
+	
+	def getSymbols(self, path):
+		'''
+		Returns the symbol tables for the specified module, which manifests do not record, so this always returns `None`
+		(Use an `ImageIndex` to validate imported symbols against an image)
+		'''
+		return None
+	
+	def listDirectory(self, directory):
+		'''
+		Returns a mapping from case-folded filenames to full paths for the modules in the specified directory,
+		or `None` if the manifest does not include any modules in the directory
+		'''
+		return self._directories.get(ntpath.normpath(directory).casefold(), None)
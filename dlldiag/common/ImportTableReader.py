@@ -0,0 +1,381 @@
+import mmap, struct
+
+class ImportTableReader(object):
+	'''
+	Provides a minimal memory-mapped reader for PE headers, import tables and export tables.
+	
+	The reader only touches the DOS, COFF and optional headers, the section table and the import,
+	delay-load import, bound import and export directories, reading values directly from the mapped file
+	rather than constructing objects for the whole image. Any module with characteristics that
+	the reader does not handle identically to pefile is rejected so the caller can fall back to pefile.
+	'''
+	
+	# The machine types that we recognise, using the same names as pefile
+	MACHINE_TYPES = {
+		0x014c: 'IMAGE_FILE_MACHINE_I386',
+		0x8664: 'IMAGE_FILE_MACHINE_AMD64',
+		0xaa64: 'IMAGE_FILE_MACHINE_ARM64'
+	}
+	
+	# The indices of the data directory entries that we read
+	DIRECTORY_EXPORT = 0
+	DIRECTORY_IMPORT = 1
+	DIRECTORY_BOUND_IMPORT = 11
+	DIRECTORY_DELAY_IMPORT = 13
+	
+	# The characters that pefile accepts in DLL names
+	VALID_NAME_CHARS = frozenset(b'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789!#$%&\'()-@^_`{}~+,.;=[]:\\/')
+	
+	# The imports that pefile uses to identify kernel-mode drivers
+	DRIVER_IMPORTS = frozenset(['ntoskrnl.exe', 'hal.dll', 'ndis.sys', 'bootvid.dll', 'kdcom.dll'])
+	
+	# The maximum lengths for DLL names, symbol names, the number of sections and the number of exports, beyond which we defer to pefile
+	MAX_NAME_LENGTH = 0x200
+	MAX_SYMBOL_LENGTH = 0x1000
+	MAX_SECTIONS = 96
+	MAX_EXPORTS = 0x10000
+	
+	class Unsupported(Exception):
+		'''
+		Raised internally when a module requires the full generality of pefile to parse
+		'''
+		pass
+	
+	@staticmethod
+	def readFacts(module):
+		'''
+		Reads the module facts exposed by `ModuleHeader` for the specified file,
+		returning `None` if the module should be parsed using pefile instead
+		'''
+		try:
+			with open(module, 'rb') as f:
+				with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+					return ImportTableReader(data)._readFacts()
+		except (ImportTableReader.Unsupported, ValueError, struct.error):
+			return None
+	
+	@staticmethod
+	def readSymbols(module):
+		'''
+		Reads the symbols that the specified file imports from each DLL and the symbols that it exports,
+		returning `None` if the module should be parsed using pefile instead.
+		
+		Imported symbols are listed as [DLL name, [symbols]] pairs under "imports" and "delayImports", where each symbol is
+		either a name or an integer ordinal. Exported names and ordinals are listed separately under "exports" and "ordinals".
+		'''
+		try:
+			with open(module, 'rb') as f:
+				with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+					return ImportTableReader(data)._readSymbols()
+		except (ImportTableReader.Unsupported, ValueError, struct.error):
+			return None
+	
+	def __init__(self, data):
+		'''
+		Wraps the supplied buffer (typically a memory-mapped file) containing the module's contents
+		'''
+		self._data = data
+		self._sections = []
+	
+	def _readFacts(self):
+		'''
+		Parses the module headers and import tables and returns the extracted facts
+		'''
+		machine, characteristics, subsystem, is64, directories, sectionNames = self._readHeaders()
+		
+		# Read the DLL names from each of the import directories
+		facts = {
+			'machine': ImportTableReader.MACHINE_TYPES[machine],
+			'imports': self._readImports(directories),
+			'delayImports': self._readDelayImports(directories, is64),
+			'boundImports': self._readBoundImports(directories)
+		}
+		
+		# Determine the module type using the same logic as pefile
+		isDll = characteristics & 0x2000 != 0
+		isDriver = len(ImportTableReader.DRIVER_IMPORTS.intersection([dll.lower() for dll in facts['imports']])) > 0 or (
+			len(set([b'page', b'paged']).intersection(sectionNames)) > 0 and subsystem in [1, 8]
+		)
+		if isDll == True:
+			facts['type'] = 'Dynamic-Link Library'
+		elif isDriver == True:
+			facts['type'] = 'Driver'
+		elif characteristics & 0x0002 != 0:
+			facts['type'] = 'Executable'
+		else:
+			facts['type'] = None
+		
+		return facts
+	
+	def _readSymbols(self):
+		'''
+		Parses the module headers, import tables and export table and returns the imported and exported symbols
+		'''
+		_, _, _, is64, directories, _ = self._readHeaders()
+		exports, ordinals = self._readExports(directories)
+		return {
+			'imports': self._readImportSymbols(directories, is64),
+			'delayImports': self._readDelayImportSymbols(directories, is64),
+			'exports': exports,
+			'ordinals': ordinals
+		}
+	
+	def _readHeaders(self):
+		'''
+		Parses the DOS, COFF and optional headers and the section table, returning the machine type, characteristics,
+		subsystem, whether the module is PE32+, the data directory entries and the list of section names
+		'''
+		data = self._data
+		
+		# Validate the DOS header and locate the PE signature
+		if data[0:2] != b'MZ':
+			raise ImportTableReader.Unsupported()
+		peOffset = struct.unpack_from('<I', data, 0x3c)[0]
+		if data[peOffset:peOffset+4] != b'PE\0\0':
+			raise ImportTableReader.Unsupported()
+		
+		# Parse the COFF file header
+		machine, numSections, _, _, _, optionalSize, characteristics = struct.unpack_from('<HHIIIHH', data, peOffset + 4)
+		if machine not in ImportTableReader.MACHINE_TYPES or numSections == 0 or numSections > ImportTableReader.MAX_SECTIONS:
+			raise ImportTableReader.Unsupported()
+		
+		# Parse the fields we need from the optional header, whose layout differs between PE32 and PE32+
+		optional = peOffset + 24
+		magic = struct.unpack_from('<H', data, optional)[0]
+		if magic == 0x10b:
+			directoriesOffset = 96
+		elif magic == 0x20b:
+			directoriesOffset = 112
+		else:
+			raise ImportTableReader.Unsupported()
+		sectionAlignment, fileAlignment = struct.unpack_from('<II', data, optional + 32)
+		subsystem = struct.unpack_from('<H', data, optional + 68)[0]
+		numDirectories = struct.unpack_from('<I', data, optional + directoriesOffset - 4)[0]
+		if numDirectories > 16 or optionalSize < directoriesOffset + (numDirectories * 8):
+			raise ImportTableReader.Unsupported()
+		directories = [struct.unpack_from('<II', data, optional + directoriesOffset + (index * 8)) for index in range(numDirectories)]
+		
+		# Parse the section table, rejecting any layouts that pefile would adjust for alignment
+		alignment = sectionAlignment if sectionAlignment >= 0x1000 else fileAlignment
+		sectionNames = []
+		for index in range(numSections):
+			section = optional + optionalSize + (index * 40)
+			name, virtualSize, virtualAddress, rawSize, rawPointer = struct.unpack_from('<8sIIII', data, section)
+			if (alignment != 0 and virtualAddress % alignment != 0) or rawPointer % 0x200 != 0 or rawPointer + rawSize > len(data):
+				raise ImportTableReader.Unsupported()
+			if len(self._sections) > 0 and virtualAddress <= self._sections[-1][0]:
+				raise ImportTableReader.Unsupported()
+			self._sections.append([virtualAddress, virtualAddress + max(virtualSize, rawSize), rawPointer, rawSize])
+			sectionNames.append(name.rstrip(b'\0').lower())
+		
+		# Truncate each section's virtual extent at the start of the next section
+		for current, following in zip(self._sections, self._sections[1:]):
+			current[1] = min(current[1], following[0])
+		
+		return machine, characteristics, subsystem, magic == 0x20b, directories, sectionNames
+	
+	def _readImports(self, directories):
+		'''
+		Reads the DLL names from the standard import directory
+		'''
+		rva = self._getDirectory(directories, ImportTableReader.DIRECTORY_IMPORT)
+		if rva is None:
+			return []
+		
+		# Walk the array of IMAGE_IMPORT_DESCRIPTOR structures until we reach the null terminator
+		imports = []
+		while True:
+			originalFirstThunk, timestamp, forwarderChain, nameRva, firstThunk = struct.unpack_from('<IIIII', self._data, self._mapRva(rva, 20))
+			if originalFirstThunk == 0 and timestamp == 0 and forwarderChain == 0 and nameRva == 0 and firstThunk == 0:
+				return imports
+			imports.append(self._readName(nameRva))
+			rva += 20
+	
+	def _readDelayImports(self, directories, is64):
+		'''
+		Reads the DLL names from the delay-load import directory
+		'''
+		rva = self._getDirectory(directories, ImportTableReader.DIRECTORY_DELAY_IMPORT)
+		if rva is None:
+			return []
+		
+		# Walk the array of IMAGE_DELAYLOAD_DESCRIPTOR structures until we reach the null terminator
+		imports = []
+		while True:
+			fields = struct.unpack_from('<IIIIIIII', self._data, self._mapRva(rva, 32))
+			if max(fields) == 0:
+				return imports
+			
+			# Descriptors that use virtual addresses rather than RVAs predate Visual C++ 6.0, so we let pefile deal with them
+			attributes, nameRva, _, _, nameTable = fields[:5]
+			if attributes & 1 == 0:
+				raise ImportTableReader.Unsupported()
+			
+			# pefile skips descriptors with an empty import name table, so verify the first thunk is populated
+			thunkSize = 8 if is64 == True else 4
+			thunk = struct.unpack_from('<Q' if is64 == True else '<I', self._data, self._mapRva(nameTable, thunkSize))[0]
+			if thunk == 0:
+				raise ImportTableReader.Unsupported()
+			
+			imports.append(self._readName(nameRva))
+			rva += 32
+	
+	def _readBoundImports(self, directories):
+		'''
+		Reads the DLL names from the bound import directory, which is addressed by file offset rather than RVA
+		'''
+		start = self._getDirectory(directories, ImportTableReader.DIRECTORY_BOUND_IMPORT)
+		if start is None:
+			return []
+		
+		# Bound import descriptors normally live in the headers, before the first section
+		if start >= min([section[2] for section in self._sections if section[3] > 0] + [len(self._data)]):
+			raise ImportTableReader.Unsupported()
+		
+		# Walk the IMAGE_BOUND_IMPORT_DESCRIPTOR structures, skipping over the forwarder references that follow each one
+		imports = []
+		offset = start
+		while True:
+			timestamp, nameOffset, numForwarders = struct.unpack_from('<IHH', self._data, offset)
+			if timestamp == 0 and nameOffset == 0 and numForwarders == 0:
+				return imports
+			offset += 8
+			for _ in range(numForwarders):
+				self._readBoundName(start + struct.unpack_from('<IH', self._data, offset)[1])
+				offset += 8
+			
+			# pefile stops at the first descriptor without a name
+			name = self._readBoundName(start + nameOffset)
+			if len(name) == 0:
+				return imports
+			imports.append(name)
+	
+	def _readImportSymbols(self, directories, is64):
+		'''
+		Reads the symbols imported from each DLL in the standard import directory
+		'''
+		rva = self._getDirectory(directories, ImportTableReader.DIRECTORY_IMPORT)
+		if rva is None:
+			return []
+		
+		imports = []
+		while True:
+			originalFirstThunk, timestamp, forwarderChain, nameRva, firstThunk = struct.unpack_from('<IIIII', self._data, self._mapRva(rva, 20))
+			if originalFirstThunk == 0 and timestamp == 0 and forwarderChain == 0 and nameRva == 0 and firstThunk == 0:
+				return imports
+			
+			# The import address table of a bound module holds addresses rather than symbols, so we need the import name table
+			if originalFirstThunk == 0 and timestamp != 0:
+				raise ImportTableReader.Unsupported()
+			imports.append([self._readName(nameRva), self._readThunks(originalFirstThunk if originalFirstThunk != 0 else firstThunk, is64)])
+			rva += 20
+	
+	def _readDelayImportSymbols(self, directories, is64):
+		'''
+		Reads the symbols imported from each DLL in the delay-load import directory
+		'''
+		rva = self._getDirectory(directories, ImportTableReader.DIRECTORY_DELAY_IMPORT)
+		if rva is None:
+			return []
+		
+		imports = []
+		while True:
+			fields = struct.unpack_from('<IIIIIIII', self._data, self._mapRva(rva, 32))
+			if max(fields) == 0:
+				return imports
+			attributes, nameRva, _, _, nameTable = fields[:5]
+			if attributes & 1 == 0:
+				raise ImportTableReader.Unsupported()
+			imports.append([self._readName(nameRva), self._readThunks(nameTable, is64)])
+			rva += 32
+	
+	def _readThunks(self, rva, is64):
+		'''
+		Reads the symbols from the null-terminated array of thunks at the specified RVA, representing
+		symbols imported by ordinal as integers and symbols imported by name as strings
+		'''
+		thunkSize, thunkFormat, ordinalFlag = (8, '<Q', 1 << 63) if is64 == True else (4, '<I', 1 << 31)
+		symbols = []
+		while True:
+			thunk = struct.unpack_from(thunkFormat, self._data, self._mapRva(rva, thunkSize))[0]
+			if thunk == 0:
+				return symbols
+			elif thunk & ordinalFlag != 0:
+				symbols.append(thunk & 0xffff)
+			else:
+				
+				# Skip over the hint that precedes the name in the IMAGE_IMPORT_BY_NAME structure
+				symbols.append(self._readSymbolName((thunk & 0x7fffffff) + 2))
+			rva += thunkSize
+	
+	def _readExports(self, directories):
+		'''
+		Reads the names and ordinals of the symbols in the export directory, including forwarded symbols
+		'''
+		rva = self._getDirectory(directories, ImportTableReader.DIRECTORY_EXPORT)
+		if rva is None:
+			return [], []
+		
+		# Parse the IMAGE_EXPORT_DIRECTORY structure
+		base, numFunctions, numNames, functions, names = struct.unpack_from('<IIIII', self._data, self._mapRva(rva, 40) + 16)
+		if numFunctions > ImportTableReader.MAX_EXPORTS or numNames > numFunctions:
+			raise ImportTableReader.Unsupported()
+		
+		# Unused slots in the export address table are zero, and do not correspond to exported ordinals
+		addresses = struct.unpack_from('<{}I'.format(numFunctions), self._data, self._mapRva(functions, numFunctions * 4)) if numFunctions > 0 else []
+		ordinals = [base + index for index, address in enumerate(addresses) if address != 0]
+		
+		# Read the name of each symbol that is exported by name
+		nameRvas = struct.unpack_from('<{}I'.format(numNames), self._data, self._mapRva(names, numNames * 4)) if numNames > 0 else []
+		return [self._readSymbolName(nameRva) for nameRva in nameRvas], ordinals
+	
+	def _getDirectory(self, directories, index):
+		'''
+		Returns the RVA for the specified data directory entry, or `None` if the entry is not present
+		'''
+		if index >= len(directories) or directories[index][0] == 0:
+			return None
+		return directories[index][0]
+	
+	def _mapRva(self, rva, length):
+		'''
+		Converts an RVA to a file offset, verifying that `length` bytes are present in the file
+		'''
+		for virtualStart, virtualEnd, rawPointer, rawSize in self._sections:
+			if virtualStart <= rva < virtualEnd:
+				offset = rva - virtualStart
+				if offset + length > rawSize:
+					raise ImportTableReader.Unsupported()
+				return rawPointer + offset
+		
+		# Data outside of any section is treated differently by different tools, so we defer to pefile
+		raise ImportTableReader.Unsupported()
+	
+	def _readName(self, rva):
+		'''
+		Reads a null-terminated DLL name from the specified RVA
+		'''
+		offset = self._mapRva(rva, 1)
+		end = self._data.find(b'\0', offset, offset + ImportTableReader.MAX_NAME_LENGTH)
+		if end <= offset or not ImportTableReader.VALID_NAME_CHARS.issuperset(self._data[offset:end]):
+			raise ImportTableReader.Unsupported()
+		return self._data[offset:end].decode('utf-8')
+	
+	def _readSymbolName(self, rva):
+		'''
+		Reads a null-terminated symbol name from the specified RVA
+		'''
+		offset = self._mapRva(rva, 1)
+		end = self._data.find(b'\0', offset, offset + ImportTableReader.MAX_SYMBOL_LENGTH)
+		if end <= offset:
+			raise ImportTableReader.Unsupported()
+		return self._data[offset:end].decode('utf-8')
+	
+	def _readBoundName(self, offset):
+		'''
+		Reads a null-terminated DLL name from the specified file offset in the bound import directory
+		'''
+		end = self._data.find(b'\0', offset, offset + 256)
+		if end < offset or any([c < 0x20 or c > 0x7e for c in self._data[offset:end]]):
+			raise ImportTableReader.Unsupported()
+		return self._data[offset:end].decode('utf-8')
@@ -0,0 +1,70 @@
+class InternTable(object):
+	'''
+	Maps repeated values (e.g. module paths, function names and lists of flags) to compact integer IDs,
+	so that each unique value is only stored once no matter how many times it is referenced
+	'''
+	
+	# The markers used to distinguish frozen dictionaries from frozen lists, and booleans from the integers they compare equal to
+	_DICT = object()
+	_BOOL = object()
+	
+	def __init__(self):
+		'''
+		Creates an empty table
+		'''
+		self._ids = {}
+		self._values = []
+	
+	def __len__(self):
+		'''
+		Returns the number of unique values in the table
+		'''
+		return len(self._values)
+	
+	def intern(self, value):
+		'''
+		Returns the ID for the supplied JSON-compatible value, adding it to the table if it is not already present
+		'''
+		frozen = value if isinstance(value, str) else InternTable.freeze(value)
+		index = self._ids.get(frozen, None)
+		if index is None:
+			index = len(self._values)
+			self._ids[frozen] = index
+			self._values.append(frozen)
+		return index
+	
+	def lookup(self, index):
+		'''
+		Returns the value for the specified ID (lists and dictionaries are returned as new copies that can be safely modified)
+		'''
+		return InternTable._thaw(self._values[index])
+	
+	@staticmethod
+	def freeze(value):
+		'''
+		Converts a JSON-compatible value into an equivalent hashable value
+		'''
+		if isinstance(value, str):
+			return value
+		elif isinstance(value, list):
+			return tuple([InternTable.freeze(item) for item in value])
+		elif isinstance(value, dict):
+			return (InternTable._DICT,) + tuple([(key, InternTable.freeze(item)) for key, item in value.items()])
+		elif isinstance(value, bool):
+			return (InternTable._BOOL, value)
+		else:
+			return value
+	
+	@staticmethod
+	def _thaw(frozen):
+		'''
+		Converts a hashable value produced by `freeze()` back into its original form
+		'''
+		if isinstance(frozen, tuple):
+			if len(frozen) > 0 and frozen[0] is InternTable._DICT:
+				return {key: InternTable._thaw(item) for key, item in frozen[1:]}
+			elif len(frozen) > 0 and frozen[0] is InternTable._BOOL:
+				return frozen[1]
+			return [InternTable._thaw(item) for item in frozen]
+		else:
+			return frozen
@@ -0,0 +1,154 @@
+class LogRecord(object):
+	'''
+	Provides a compact representation of an individual log entry from our Detours-based instrumentation DLLs.
+	
+	Repeated values (module paths, function names, arguments, results and errors) are stored as IDs in a shared
+	`InternTable`, stack traces are stored as tuples of IDs, and only numeric fields are stored directly. Fields
+	are decoded on demand when accessed using the same subscript syntax as the dictionary the entry was parsed from.
+	'''
+	
+	# The fields whose values are stored as IDs in the intern table
+	INTERNED_FIELDS = frozenset(['arguments', 'error', 'function', 'module', 'result', 'status', 'type'])
+	
+	# The fields whose integer values are stored directly
+	NUMERIC_FIELDS = frozenset(['random', 'thread', 'timestamp_end', 'timestamp_start'])
+	
+	# The fields that identify a function call in both its "enter" and "return" log entries
+	KEY_FIELDS = ['random', 'timestamp_start', 'module', 'thread', 'function', 'arguments']
+	
+	__slots__ = [
+		'_table',
+		'_keys',
+		'_arguments',
+		'_error',
+		'_function',
+		'_module',
+		'_random',
+		'_result',
+		'_stack',
+		'_status',
+		'_thread',
+		'_timestamp_end',
+		'_timestamp_start',
+		'_type',
+		'_extra'
+	]
+	
+	def __init__(self, entry, table):
+		'''
+		Creates a compact record from the supplied log entry dictionary, interning repeated values in the supplied `InternTable`
+		'''
+		self._table = table
+		self._keys = table.intern(tuple(entry.keys()))
+		self._arguments = self._error = self._function = self._module = self._random = self._result = None
+		self._stack = self._status = self._thread = self._timestamp_end = self._timestamp_start = self._type = None
+		self._extra = None
+		for key, value in entry.items():
+			self._set(key, value)
+	
+	def __getitem__(self, key):
+		'''
+		Decodes and returns the value of the specified field
+		'''
+		if key in LogRecord.INTERNED_FIELDS:
+			value = getattr(self, '_' + key)
+			if value is not None:
+				return self._table.lookup(value)
+		elif key in LogRecord.NUMERIC_FIELDS:
+			value = getattr(self, '_' + key)
+			if value is not None:
+				return value
+		elif key == 'stack':
+			if self._stack is not None:
+				return [self._table.lookup(module) for module in self._stack]
+		
+		# The field is either stored in our dictionary of uncommon fields or is not present
+		if self._extra is not None and key in self._extra:
+			return self._extra[key]
+		raise KeyError(key)
+	
+	def __setitem__(self, key, value):
+		'''
+		Sets the value of the specified field
+		'''
+		keys = self._table.lookup(self._keys)
+		if key not in keys:
+			self._keys = self._table.intern(tuple(keys + [key]))
+		self._set(key, value)
+	
+	def __contains__(self, key):
+		'''
+		Determines whether the specified field is present
+		'''
+		return key in self._table.lookup(self._keys)
+	
+	def __str__(self):
+		'''
+		Formats the record in the same way as the dictionary it was parsed from
+		'''
+		return str(self.toDict())
+	
+	def __repr__(self):
+		return str(self)
+	
+	def get(self, key, default=None):
+		'''
+		Returns the value of the specified field, or the supplied default value if the field is not present
+		'''
+		return self[key] if key in self else default
+	
+	def getTable(self):
+		'''
+		Returns the intern table that the record's values are stored in
+		'''
+		return self._table
+	
+	def keys(self):
+		'''
+		Returns the list of fields that are present, in their original order
+		'''
+		return self._table.lookup(self._keys)
+	
+	def key(self):
+		'''
+		Returns a hashable key identifying the function call that the record relates to, which is identical
+		for the "enter" and "return" log entries of a call so long as they share the same intern table
+		'''
+		return tuple([self._encoded(field) for field in LogRecord.KEY_FIELDS])
+	
+	def toDict(self):
+		'''
+		Decodes the record into a dictionary equivalent to the one it was parsed from
+		'''
+		return {key: self[key] for key in self.keys()}
+	
+	def _encoded(self, key):
+		'''
+		Returns the encoded representation of the specified field, which is suitable for comparisons between records
+		'''
+		if key in LogRecord.INTERNED_FIELDS or key in LogRecord.NUMERIC_FIELDS or key == 'stack':
+			value = getattr(self, '_' + key)
+			if value is not None:
+				return value
+		return ('extra', self._table.intern(self._extra.get(key, None) if self._extra is not None else None))
+	
+	def _set(self, key, value):
+		'''
+		Encodes and stores the value of the specified field
+		'''
+		if key in LogRecord.INTERNED_FIELDS:
+			setattr(self, '_' + key, self._table.intern(value))
+			return
+		elif key in LogRecord.NUMERIC_FIELDS and isinstance(value, int) and not isinstance(value, bool):
+			setattr(self, '_' + key, value)
+			return
+		elif key == 'stack' and isinstance(value, list) and all([isinstance(module, str) for module in value]):
+			self._stack = tuple(map(self._table.intern, value))
+			return
+		
+		# Store any uncommon fields (or fields with unexpected value types) in a separate dictionary
+		if key in LogRecord.NUMERIC_FIELDS or key == 'stack':
+			setattr(self, '_' + key, None)
+		if self._extra is None:
+			self._extra = {}
+		self._extra[key] = value
@@ -1,28 +1,62 @@
-from .HelperProcess import HelperProcess
-import os, pefile, platform, win32api
+from .HeaderCache import HeaderCache
+from .ImportTableReader import ImportTableReader
+import copy
 
 class ModuleHeader(object):
 	'''
 	Provides functionality for retrieving information about PE modules
 	'''
 	
-	def __init__(self, module):
+	def __init__(self, module, cache=None):
 		'''
-		Parses the header for the specified module
+		Parses the header for the specified module.
+		
+		`cache` specifies the `HeaderCache` to read through (the default cache will be used if `None`, and
+		the header will always be parsed without caching the result if `False`.)
 		'''
 		self._filename = module
-		self._pe = pefile.PE(module, fast_load=True)
-		self._parsedImports = False
+		
+		# Attempt to retrieve the parsed facts for the module from the cache, parsing the header if there is a cache miss
+		cache = (cache if cache is not None else HeaderCache.getDefault()) if cache is not False else None
+		self._facts = cache.get(module) if cache is not None else None
+		if self._facts is None:
+			self._facts = ModuleHeader._parseFacts(module)
+			if cache is not None:
+				cache.put(module, self._facts)
+	
+	@staticmethod
+	def fromFacts(module, facts):
+		'''
+		Creates a header for the specified module from facts that were previously parsed from it (e.g. those stored
+		in an image manifest), without accessing the module file itself
+		'''
+		header = ModuleHeader.__new__(ModuleHeader)
+		header._filename = module
+		header._facts = facts
+		return header
+	
+	def withFilename(self, module):
+		'''
+		Returns a header for a module with identical contents at a different path, which shares our parsed facts
+		'''
+		header = copy.copy(self)
+		header._filename = module
+		return header
 	
 	def getArchitecture(self):
 		'''
 		Returns the architecture of the module ("x86" or "x64")
 		'''
-		machine = pefile.MACHINE_TYPE[self._pe.FILE_HEADER.Machine]
 		return {
 			'IMAGE_FILE_MACHINE_AMD64': 'x64',
 			'IMAGE_FILE_MACHINE_I386': 'x86',
-		}[machine]
+		}[self._facts['machine']]
+	
+	def getFacts(self):
+		'''
+		Returns the facts parsed from the module's header, which can be passed to `fromFacts()` to recreate the header
+		'''
+		return self._facts
 	
 	def getFilename(self):
 		'''
@@ -34,14 +68,9 @@ class ModuleHeader(object):
 		'''
 		Returns the module type ("Dynamic-Link Library", "Driver", or "Executable")
 		'''
-		if self._pe.is_dll():
-			return 'Dynamic-Link Library'
-		elif self._pe.is_driver():
-			return 'Driver'
-		elif self._pe.is_exe():
-			return 'Executable'
-		else:
+		if self._facts['type'] is None:
 			raise RuntimeError('unrecognised PE module type')
+		return self._facts['type']
 	
 	def listAllImports(self):
 		'''
@@ -53,29 +82,66 @@ class ModuleHeader(object):
 		'''
 		Returns a list of the standard imports for the module
 		'''
-		return self._getImportsForDirectory('DIRECTORY_ENTRY_IMPORT')
+		return list(self._facts['imports'])
 	
 	def listDelayLoadedImports(self):
 		'''
 		Returns a list of the delay-loaded imports for the module
 		'''
-		return self._getImportsForDirectory('DIRECTORY_ENTRY_DELAY_IMPORT')
+		return list(self._facts['delayImports'])
 	
 	def listBoundImports(self):
 		'''
 		Returns a list of the bound imports for the module
 		'''
-		return self._getImportsForDirectory('DIRECTORY_ENTRY_BOUND_IMPORT', attribute='name')
+		return list(self._facts['boundImports'])
 	
-	def _getImportsForDirectory(self, directory, attribute='dll'):
+	@staticmethod
+	def _parseFacts(module):
 		'''
-		Retrieves the list of imports for a specific directory entry
+		Parses the header for the specified module and extracts the facts that we expose
+		'''
+		
+		# Use our minimal import table reader where possible, since it is far faster than pefile for large modules,
+		# and fall back to using pefile for any modules with unusual characteristics
+		facts = ImportTableReader.readFacts(module)
+		return facts if facts is not None else ModuleHeader._parsePefile(module)
+	
+	@staticmethod
+	def _parsePefile(module):
+		'''
+		Parses the header for the specified module using pefile and extracts the facts that we expose
 		'''
 		
-		# If we haven't already parsed the imports, do so now
-		if self._parsedImports == False:
-			self._pe.parse_data_directories(import_dllnames_only=True)
-			self._parsedImports = True
+		# pefile is imported on demand, since it is slow to import and most modules are parsed by our own reader
+		import pefile
+		pe = pefile.PE(module, fast_load=True)
+		pe.parse_data_directories(import_dllnames_only=True)
+		
+		# Determine the module type
+		moduleType = None
+		if pe.is_dll():
+			moduleType = 'Dynamic-Link Library'
+		elif pe.is_driver():
+			moduleType = 'Driver'
+		elif pe.is_exe():
+			moduleType = 'Executable'
 		
-		# Retrieve the imports for the specified directory entry
-		return [getattr(imported, attribute).decode('utf-8') for imported in getattr(self._pe, directory, [])]
+		# Retrieve the machine type and the imports for each of the import directory entries
+		facts = {
+			'machine': pefile.MACHINE_TYPE.get(pe.FILE_HEADER.Machine, None),
+			'type': moduleType,
+			'imports': ModuleHeader._getImportsForDirectory(pe, 'DIRECTORY_ENTRY_IMPORT'),
+			'delayImports': ModuleHeader._getImportsForDirectory(pe, 'DIRECTORY_ENTRY_DELAY_IMPORT'),
+			'boundImports': ModuleHeader._getImportsForDirectory(pe, 'DIRECTORY_ENTRY_BOUND_IMPORT', attribute='name')
+		}
+		
+		pe.close()
+		return facts
+	
+	@staticmethod
+	def _getImportsForDirectory(pe, directory, attribute='dll'):
+		'''
+		Retrieves the list of imports for a specific directory entry
+		'''
+		return [getattr(imported, attribute).decode('utf-8') for imported in getattr(pe, directory, [])]
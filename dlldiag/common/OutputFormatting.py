@@ -1,5 +1,5 @@
-from .WindowsApi import WindowsApi
 from termcolor import colored
+import os
 
 class OutputFormatting(object):
 	'''
@@ -11,6 +11,9 @@ class OutputFormatting(object):
 		'''
 		Formats a Windows API return value, colouring the output green for success and red for failure
 		'''
+		
+		# (WindowsApi is imported on demand, since it pulls in the helper process machinery that most callers don't need)
+		from .WindowsApi import WindowsApi
 		message = success if result == 0 else 'Error {}: {}'.format(result, WindowsApi.formatError(result, inserts))
 		return colored(message, color = 'green' if result == 0 else 'red')
 	
@@ -25,6 +28,28 @@ class OutputFormatting(object):
 			('Architecture:', module.getArchitecture())
 		], spacing=spacing)
 	
+	@staticmethod
+	def supportsColour(stream):
+		'''
+		Determines whether coloured output should be written to the specified stream, which is only the case for
+		interactive terminals unless overridden by the `NO_COLOR` or `FORCE_COLOR` environment variables
+		'''
+		if os.environ.get('NO_COLOR', '') != '' or os.environ.get('ANSI_COLORS_DISABLED', '') != '':
+			return False
+		elif os.environ.get('FORCE_COLOR', '') != '':
+			return True
+		try:
+			return stream.isatty()
+		except (AttributeError, ValueError):
+			return False
+	
+	@staticmethod
+	def uncoloured(text, color=None, on_color=None, attrs=None):
+		'''
+		A drop-in replacement for `termcolor.colored()` that returns the supplied text without any colour
+		'''
+		return str(text)
+	
 	@staticmethod
 	def printWarning(message):
 		'''
@@ -0,0 +1,106 @@
+from .LogRecord import LogRecord
+import json, sys
+
+class RecordWriter(object):
+	'''
+	Writes machine-readable records to stdout as they are produced, either as a JSON array or as newline-delimited JSON
+	(one record per line.) Every record is a dictionary whose "record" field identifies the type of record.
+	
+	Records are written and flushed individually, so consumers can process them as a stream without waiting for the run to complete.
+	'''
+	
+	# The supported output formats, the first of which is the human-readable text output
+	FORMATS = ['text', 'json', 'ndjson']
+	
+	def __init__(self, format, stream):
+		'''
+		Creates a new record writer and writes the start of the document.
+		
+		`format` specifies the output format, which must be either "json" or "ndjson".
+		`stream` specifies the stream that the records should be written to.
+		'''
+		if format not in RecordWriter.FORMATS[1:]:
+			raise RuntimeError('unsupported structured output format "{}"'.format(format))
+		self._format = format
+		self._stream = stream
+		self._first = True
+		if self._format == 'json':
+			self._stream.write('[\n')
+			self._stream.flush()
+	
+	@staticmethod
+	def addArguments(parser):
+		'''
+		Adds the command-line argument for selecting the output format to the supplied `argparse.ArgumentParser`
+		'''
+		parser.add_argument('--format', choices=RecordWriter.FORMATS, default='text', help='Output format, where "json" and "ndjson" write machine-readable records to stdout as they are produced and all other output to stderr (default is "text")')
+	
+	@staticmethod
+	def configure(args):
+		'''
+		Creates a record writer for the output format specified by the command-line arguments parsed by `argparse.ArgumentParser`,
+		or returns `None` if the human-readable text output was requested.
+		
+		When a structured format is requested, records are written to stdout and all other output is redirected to stderr for
+		the remainder of the run, so stdout contains nothing but records.
+		'''
+		if args.format == 'text':
+			return None
+		writer = RecordWriter(args.format, sys.stdout)
+		sys.stdout = sys.stderr
+		return writer
+	
+	@staticmethod
+	def isRequested(argv):
+		'''
+		Determines whether the supplied command-line arguments request a structured output format, without parsing them
+		(This allows us to keep stdout free of anything other than records before a subcommand has parsed its arguments)
+		'''
+		for index, arg in enumerate(argv):
+			if arg.startswith('--format='):
+				return arg[len('--format='):] in RecordWriter.FORMATS[1:]
+			elif arg == '--format':
+				return index + 1 < len(argv) and argv[index + 1] in RecordWriter.FORMATS[1:]
+		return False
+	
+	@staticmethod
+	def moduleRecord(header, **fields):
+		'''
+		Creates a record containing key details about the PE module wrapped in the supplied ModuleHeader object, along with any additional fields
+		'''
+		record = {
+			'record': 'module',
+			'module': header.getFilename(),
+			'type': header.getType(),
+			'architecture': header.getArchitecture()
+		}
+		record.update(fields)
+		return record
+	
+	def write(self, record):
+		'''
+		Writes a single record to the output stream
+		'''
+		if self._format == 'json':
+			self._stream.write(('' if self._first == True else ',\n') + json.dumps(record, default=RecordWriter._encode))
+		else:
+			self._stream.write(json.dumps(record, default=RecordWriter._encode) + '\n')
+		self._stream.flush()
+		self._first = False
+	
+	def close(self):
+		'''
+		Writes the end of the document, if the output format requires it
+		'''
+		if self._stream is not None:
+			if self._format == 'json':
+				self._stream.write('\n]\n' if self._first == False else ']\n')
+			self._stream.flush()
+			self._stream = None
+	
+	@staticmethod
+	def _encode(value):
+		'''
+		Encodes the values that the JSON encoder does not support natively, such as compact log records
+		'''
+		return value.toDict() if isinstance(value, LogRecord) else str(value)
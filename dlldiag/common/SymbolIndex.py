@@ -0,0 +1,157 @@
+from .HeaderCache import HeaderCache
+from .ImportTableReader import ImportTableReader
+from collections import OrderedDict
+
+class SymbolIndex(object):
+	'''
+	Validates the symbols that modules import against the symbols exported by the DLLs that their imports resolve to,
+	detecting the missing entry points that cause the loader to fail with ERROR_PROC_NOT_FOUND.
+	
+	The symbol tables of each module are parsed once and persisted in the `HeaderCache` (or retrieved from an image index),
+	and the exports of each DLL are loaded into a hash index at most once, which is then shared by every module that imports from it.
+	'''
+	
+	def __init__(self, cache=None, manifest=None):
+		'''
+		Creates a new symbol index.
+		
+		`cache` specifies the `HeaderCache` to read through (the default cache will be used if `None`.)
+		`manifest` specifies an `ImageManifest` or `ImageIndex` from which the symbol tables of any modules it includes
+		should be retrieved, rather than parsing them from the filesystem.
+		'''
+		self._cache = cache if cache is not None else HeaderCache.getDefault()
+		self._manifest = manifest
+		self._symbols = {}
+		self._exports = {}
+		
+		# Maps the paths of any modules whose symbol tables could not be read to error messages
+		self.errors = OrderedDict()
+	
+	@staticmethod
+	def formatSymbol(symbol):
+		'''
+		Formats an imported symbol for display, representing ordinals in the same form as dumpbin
+		'''
+		return 'Ordinal {}'.format(symbol) if isinstance(symbol, int) else symbol
+	
+	@staticmethod
+	def parseSymbols(module):
+		'''
+		Parses the imported and exported symbols for the specified module, in the format returned by `ImportTableReader.readSymbols()`
+		'''
+		
+		# Use our minimal reader where possible and fall back to using pefile for any modules with unusual characteristics
+		symbols = ImportTableReader.readSymbols(module)
+		return symbols if symbols is not None else SymbolIndex._parsePefile(module)
+	
+	def getSymbols(self, module):
+		'''
+		Returns the imported and exported symbols for the specified module, or `None` if they could not be read
+		'''
+		if module not in self._symbols:
+			try:
+				self._symbols[module] = self._readSymbols(module)
+			except Exception as e:
+				self._symbols[module] = None
+				self.errors[module] = str(e)
+		
+		return self._symbols[module]
+	
+	def getExports(self, module):
+		'''
+		Returns a tuple containing the set of names and the set of ordinals exported by the specified module,
+		or `None` if its symbols could not be read
+		'''
+		if module not in self._exports:
+			symbols = self.getSymbols(module)
+			self._exports[module] = (frozenset(symbols['exports']), frozenset(symbols['ordinals'])) if symbols is not None else None
+		
+		return self._exports[module]
+	
+	def findUnresolved(self, module, dependencies, delayLoad=True):
+		'''
+		Validates the symbols that the specified module imports from each of its resolved dependencies.
+		
+		`dependencies` specifies a list of (imported name, resolved path) tuples, as produced by `DependencyClosure`.
+		`delayLoad` specifies whether the symbols imported by delay-loaded imports should be validated.
+		
+		Returns a list of (imported name, resolved path, unresolved symbols) tuples for each dependency that does not export
+		all of the symbols imported from it. Modules whose symbols could not be read are recorded in `errors` and skipped.
+		'''
+		symbols = self.getSymbols(module)
+		if symbols is None:
+			return []
+		
+		# Gather the symbols imported from each DLL, since the same DLL can appear in more than one import descriptor
+		imported = OrderedDict()
+		for dll, names in symbols['imports'] + (symbols['delayImports'] if delayLoad == True else []):
+			imported.setdefault(dll.casefold(), []).extend(names)
+		
+		unresolved = []
+		for dll, resolved in dependencies:
+			if resolved is None or dll.casefold() not in imported:
+				continue
+			exports = self.getExports(resolved)
+			if exports is None:
+				continue
+			names, ordinals = exports
+			missing = [
+				symbol for symbol in imported[dll.casefold()]
+				if (symbol not in ordinals if isinstance(symbol, int) else symbol not in names)
+			]
+			if len(missing) > 0:
+				unresolved.append((dll, resolved, missing))
+		
+		return unresolved
+	
+	def _readSymbols(self, module):
+		'''
+		Retrieves the symbols for the specified module from the image index or the cache, parsing them if there is a cache miss
+		'''
+		if self._manifest is not None and self._manifest.contains(module):
+			symbols = self._manifest.getSymbols(module)
+			if symbols is None:
+				raise RuntimeError('the image manifest does not include the symbol tables for "{}"'.format(module))
+			return symbols
+		
+		symbols = self._cache.get(module, kind='symbols') if self._cache is not None else None
+		if symbols is None:
+			symbols = SymbolIndex.parseSymbols(module)
+			if self._cache is not None:
+				self._cache.put(module, symbols, kind='symbols')
+		return symbols
+	
+	@staticmethod
+	def _parsePefile(module):
+		'''
+		Parses the imported and exported symbols for the specified module using pefile
+		'''
+		import pefile
+		pe = pefile.PE(module, fast_load=True)
+		pe.parse_data_directories(directories=[
+			pefile.DIRECTORY_ENTRY['IMAGE_DIRECTORY_ENTRY_EXPORT'],
+			pefile.DIRECTORY_ENTRY['IMAGE_DIRECTORY_ENTRY_IMPORT'],
+			pefile.DIRECTORY_ENTRY['IMAGE_DIRECTORY_ENTRY_DELAY_IMPORT']
+		])
+		
+		exported = getattr(pe, 'DIRECTORY_ENTRY_EXPORT', None)
+		symbols = {
+			'imports': SymbolIndex._getImportsForDirectory(pe, 'DIRECTORY_ENTRY_IMPORT'),
+			'delayImports': SymbolIndex._getImportsForDirectory(pe, 'DIRECTORY_ENTRY_DELAY_IMPORT'),
+			'exports': [symbol.name.decode('utf-8') for symbol in exported.symbols if symbol.name is not None] if exported is not None else [],
+			'ordinals': [symbol.ordinal for symbol in exported.symbols] if exported is not None else []
+		}
+		
+		pe.close()
+		return symbols
+	
+	@staticmethod
+	def _getImportsForDirectory(pe, directory):
+		'''
+		Retrieves the symbols imported from each DLL for a specific directory entry
+		(pefile substitutes names for some well-known ordinals, so we check how each symbol is actually imported)
+		'''
+		return [
+			[entry.dll.decode('utf-8'), [imported.ordinal if imported.import_by_ordinal == True else imported.name.decode('utf-8') for imported in entry.imports]]
+			for entry in getattr(pe, directory, [])
+		]
@@ -0,0 +1,82 @@
+from .DetourLibrary import DetourLibrary
+import json, ntpath
+
+class TraceEventWriter(object):
+	'''
+	Writes completed function calls from our Detours-based instrumentation DLLs to a file in the Chrome trace event
+	JSON format, which can be opened in trace viewers such as Perfetto (https://ui.perfetto.dev) or chrome://tracing.
+	
+	Events are written to the file as soon as they are received, so the document is never held in memory.
+	'''
+	
+	# The process ID used for all events, since the log entries do not record the process that made each call
+	PROCESS_ID = 1
+	
+	def __init__(self, outfile, processName=None):
+		'''
+		Creates the output file and writes the start of the document.
+		
+		`outfile` specifies the file that the trace events should be written to.
+		`processName` specifies the name that should be displayed for the process in trace viewers, if any.
+		'''
+		self._file = open(outfile, 'w', encoding='utf-8')
+		self._file.write('{"displayTimeUnit": "ms", "traceEvents": [\n')
+		self._first = True
+		self._threads = set()
+		if processName is not None:
+			self._writeEvent({'name': 'process_name', 'ph': 'M', 'pid': TraceEventWriter.PROCESS_ID, 'args': {'name': processName}})
+	
+	def addCall(self, entry):
+		'''
+		Writes a complete event for the supplied "return" log entry, which must include both the start and end timestamps of the call
+		'''
+		if 'timestamp_start' not in entry or 'timestamp_end' not in entry:
+			return
+		
+		# Write a metadata event to name the track for the thread the first time we encounter it
+		thread = entry['thread']
+		if thread not in self._threads:
+			self._threads.add(thread)
+			self._writeEvent({'name': 'thread_name', 'ph': 'M', 'pid': TraceEventWriter.PROCESS_ID, 'tid': thread, 'args': {'name': 'Thread {}'.format(thread)}})
+		
+		# Write the complete event for the call, labelled with the name of the requested module for LoadLibrary() calls
+		function = entry['function']
+		isLoad = function.startswith('LoadLibrary') or function == 'LdrLoadDll'
+		args = {'module': entry['module'], 'arguments': entry['arguments'], 'result': entry['result']}
+		error = entry.get('status' if function == 'LdrLoadDll' else 'error', None)
+		if error is not None and error['code'] != 0:
+			args['error'] = error['message'].strip()
+		self._writeEvent({
+			'name': '{} {}'.format(function, ntpath.basename(str(entry['arguments'][0]))) if isLoad == True else function,
+			'cat': 'loadlibrary' if isLoad == True else 'dlldirectory',
+			'ph': 'X',
+			'ts': TraceEventWriter._microseconds(entry['timestamp_start'] - DetourLibrary.FILETIME_EPOCH_OFFSET),
+			'dur': TraceEventWriter._microseconds(max(0, entry['timestamp_end'] - entry['timestamp_start'])),
+			'pid': TraceEventWriter.PROCESS_ID,
+			'tid': thread,
+			'args': args
+		})
+	
+	def close(self):
+		'''
+		Writes the end of the document and closes the output file
+		'''
+		if self._file is not None:
+			self._file.write('\n]}\n')
+			self._file.close()
+			self._file = None
+	
+	def _writeEvent(self, event):
+		'''
+		Writes a single event to the output file
+		'''
+		self._file.write(('' if self._first == True else ',\n') + json.dumps(event))
+		self._first = False
+	
+	@staticmethod
+	def _microseconds(ticks):
+		'''
+		Converts a timestamp or duration in 100-nanosecond intervals into microseconds, which is the unit used by trace events
+		(timestamps are made relative to the Unix epoch, which keeps them small enough to be represented precisely as doubles)
+		'''
+		return ticks / 10
@@ -1,11 +1,12 @@
-from .CommonErrors import CommonErrors
-from .HelperProcess import HelperProcess
+from .HelperPool import HelperPool
 from .ModuleHeader import ModuleHeader
-import os, platform, win32api
+import os, platform
 
 class WindowsApi(object):
 	'''
 	Convenience functionality for interacting with the Windows API
+	
+	(Note that pywin32 is imported on demand so that our offline functionality can run on non-Windows hosts)
 	'''
 	
 	@staticmethod
@@ -13,6 +14,7 @@ class WindowsApi(object):
 		'''
 		Formats a Windows API error code with the specified values for placeholder tokens
 		'''
+		import win32api
 		message = win32api.FormatMessage(error).strip()
 		for index, value in enumerate(inserts):
 			message = message.replace('%{}'.format(index+1), value)
@@ -49,6 +51,7 @@ class WindowsApi(object):
 		'''
 		Loads a module by calling `LoadLibrary()` directly inside the Python interpreter
 		'''
+		import win32api
 		origCwd = os.getcwd()
 		os.chdir(cwd)
 		try:
@@ -66,11 +69,7 @@ class WindowsApi(object):
 		Loads a module using our helper executable for the specified architecture
 		'''
 		
-		# Verify that the helper executable can actually be run without any arguments to ensure we
-		# don't inadvertently report execution failures as though they were `LoadLibrary()` failures
-		helper = HelperProcess(architecture, 'loadlibrary')
-		if helper.canRun() == False:
-			CommonErrors.cannotRunHelper(architecture)
-		
-		# Run the helper and propagate the exit code
-		return helper.run([module], cwd=cwd).returncode
+		# Use a long-lived helper process from the pool for the specified architecture and working directory
+		# (The pool verifies that each helper process starts successfully, so we don't inadvertently report
+		# execution failures as though they were `LoadLibrary()` failures)
+		return HelperPool.getDefault().loadModule(architecture, module, cwd)
@@ -1,9 +1,54 @@
-from .CommonErrors import CommonErrors
-from .DetourLibrary import DetourLibrary
-from.FileIO import FileIO
-from .HelperProcess import HelperProcess
-from .ModuleHeader import ModuleHeader
-from .OutputFormatting import OutputFormatting
-from .StringUtils import StringUtils
-from .WindowsApi import WindowsApi
-from .WindowsDebugger import WindowsDebugger
+import importlib, sys, types
+
+# The classes exported by this package, each of which is implemented in the submodule of the same name
+__all__ = [
+	'CommonErrors',
+	'DependencyClosure',
+	'DetourLibrary',
+	'DirectoryScanner',
+	'DllSearchOrder',
+	'FileIO',
+	'GraphWriter',
+	'HeaderCache',
+	'HelperPool',
+	'HelperProcess',
+	'HelperWorker',
+	'ImageIndex',
+	'ImageManifest',
+	'ImportTableReader',
+	'InternTable',
+	'LogRecord',
+	'ModuleHeader',
+	'OutputFormatting',
+	'RecordWriter',
+	'StringUtils',
+	'SymbolIndex',
+	'TraceEventWriter',
+	'WindowsApi',
+	'WindowsDebugger'
+]
+
+class _LazyPackage(types.ModuleType):
+	'''
+	Imports the submodule for each exported class when the class is first accessed, so that importing the package doesn't
+	pay the cost of importing the dependencies of every submodule (most of which are only needed by a single subcommand)
+	'''
+	
+	def __getattr__(self, name):
+		if name not in __all__:
+			raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+		importlib.import_module('.{}'.format(name), __name__)
+		return self.__dict__[name]
+	
+	def __setattr__(self, name, value):
+		
+		# The import system binds each submodule to the package once it has been imported (including submodules imported
+		# by their siblings), which would shadow the class of the same name, so we bind the class instead
+		if name in __all__ and isinstance(value, types.ModuleType):
+			value = getattr(value, name)
+		super().__setattr__(name, value)
+	
+	def __dir__(self):
+		return sorted(set(super().__dir__()) | set(__all__))
+
+sys.modules[__name__].__class__ = _LazyPackage
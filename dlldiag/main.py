@@ -1,13 +1,14 @@
-from .common import OutputFormatting
-from .subcommands import subcommands
+from .common import OutputFormatting, RecordWriter
+from .subcommands import loadSubcommand, subcommands
 from .version import __version__
 import colorama, os, sys
 
 def main():
 	
-	# Print the version number and copyright notice
-	print('DLL Diagnostic Tools version {}'.format(__version__))
-	print('Copyright (c) 2019-2023 Adam Rehn\n', flush=True)
+	# Print the version number and copyright notice (to stderr if stdout is reserved for machine-readable records)
+	banner = sys.stderr if RecordWriter.isRequested(sys.argv) == True else sys.stdout
+	print('DLL Diagnostic Tools version {}'.format(__version__), file=banner)
+	print('Copyright (c) 2019-2023 Adam Rehn\n', file=banner, flush=True)
 	
 	# Initialise colour output
 	colorama.init()
@@ -24,9 +25,9 @@ def main():
 			print('Error: unrecognised subcommand "{}".'.format(subcommand), file=sys.stderr)
 			sys.exit(1)
 		
-		# Invoke the subcommand
+		# Import and invoke the subcommand
 		sys.argv = [sys.argv[0]] + sys.argv[2:]
-		subcommands[subcommand]['function']()
+		loadSubcommand(subcommand)()
 		
 	else:
 		
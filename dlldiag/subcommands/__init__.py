@@ -1,13 +1,50 @@
-# Import the descriptors for each of our subcommands
-from .deps import DESCRIPTOR as deps
-from .docker import DESCRIPTOR as docker
-from .graph import DESCRIPTOR as graph
-from .trace import DESCRIPTOR as trace
+import importlib
 
-# Expose the list of descriptors as a dictionary keyed by subcommand name
+# The descriptors for each of our subcommands, keyed by subcommand name
+# (Each descriptor specifies the module and function that implement the subcommand, and the module is only imported
+# when the subcommand is run, so we don't pay the cost of importing the dependencies of all of the other subcommands)
 subcommands = {
-	'deps': deps,
-	'docker': docker,
-	'graph': graph,
-	'trace': trace
+	'closure': {
+		'module': 'closure',
+		'function': 'closure',
+		'description': 'Computes the transitive dependency closure for a module offline by emulating the DLL search order'
+	},
+	'deps': {
+		'module': 'deps',
+		'function': 'deps',
+		'description': 'Lists the direct dependencies for a module and checks if they can be loaded'
+	},
+	'docker': {
+		'module': 'docker',
+		'function': 'docker',
+		'description': 'Generates a Dockerfile suitable for using dlldiag inside a Windows container'
+	},
+	'graph': {
+		'module': 'graph',
+		'function': 'graph',
+		'description': 'Executes a module with instrumentation to log LoadLibrary() calls and reconstructs the call hierarchy'
+	},
+	'graph-diff': {
+		'module': 'graphdiff',
+		'function': 'graphdiff',
+		'description': 'Compares the LoadLibrary() call hierarchies from two saved instrumentation logs'
+	},
+	'index': {
+		'module': 'index',
+		'function': 'index',
+		'description': 'Builds and queries indexes of the DLLs shipped in Windows images for offline dependency resolution'
+	},
+	'trace': {
+		'module': 'trace',
+		'function': 'trace',
+		'description': 'Traces a LoadLibrary() call for a module and reports detailed results'
+	}
 }
+
+def loadSubcommand(subcommand):
+	'''
+	Imports the module for the specified subcommand and returns the function that implements it
+	'''
+	descriptor = subcommands[subcommand]
+	module = importlib.import_module('.{}'.format(descriptor['module']), __name__)
+	return getattr(module, descriptor['function'])
@@ -0,0 +1,146 @@
+from ..common import DependencyClosure, DllSearchOrder, FileIO, HeaderCache, ImageManifest, OutputFormatting, StringUtils, SymbolIndex
+from termcolor import colored
+import argparse, ntpath, os, sys
+
+
+def closure():
+	
+	# Our supported command-line arguments
+	parser = argparse.ArgumentParser(prog='{} closure'.format(sys.argv[0]))
+	parser.add_argument('module', help='DLL or EXE file for which the transitive dependency closure will be computed')
+	parser.add_argument('--system32', default=None, help='Directory to treat as the System32 directory (e.g. from a mounted or extracted Windows image)')
+	parser.add_argument('--syswow64', default=None, help='Directory to treat as the SysWOW64 directory when resolving dependencies for x86 modules')
+	parser.add_argument('--dir', action='append', default=[], help='Additional directory to search after the system directory (can be specified multiple times)')
+	parser.add_argument('--manifest', default=None, help='Image manifest or index to resolve the system directory against instead of the filesystem, in which case --system32 and --syswow64 are paths inside the image (default is C:\\Windows\\System32 and C:\\Windows\\SysWOW64)')
+	parser.add_argument('--path', default=None, help='Semicolon-separated list of directories to search last, as per the PATH environment variable')
+	parser.add_argument('--known-dlls', default=None, help='File containing the list of KnownDLLs (one per line) to use instead of the default list')
+	parser.add_argument('--no-delay-load', action='store_true', help='Don\'t follow delay-loaded dependencies')
+	parser.add_argument('--symbols', action='store_true', help='Validate the symbols that each module imports against the exports of the DLLs that its imports resolve to')
+	parser.add_argument('--verbose', action='store_true', help='Print the resolved direct dependencies of every module in the closure')
+	HeaderCache.addArguments(parser)
+	
+	# If no command-line arguments were supplied, display the help message and exit
+	if len(sys.argv) < 2:
+		parser.print_help()
+		sys.exit(0)
+	
+	# Parse the supplied command-line arguments
+	args = parser.parse_args()
+	HeaderCache.configure(args)
+	
+	try:
+		
+		# Ensure the module path is an absolute path
+		args.module = os.path.abspath(args.module)
+		
+		# Load the image manifest or index, if one was specified, and default to the standard system directories inside the image
+		manifest = ImageManifest.load(args.manifest) if args.manifest is not None else None
+		if manifest is not None:
+			args.system32 = args.system32 if args.system32 is not None else 'C:\\Windows\\System32'
+			args.syswow64 = args.syswow64 if args.syswow64 is not None else 'C:\\Windows\\SysWOW64'
+		
+		# Parse the PE header for the module
+		print('Parsing module header and detecting architecture... ', end='')
+		calculator = DependencyClosure(delayLoad = not args.no_delay_load, manifest=manifest)
+		header = calculator.getHeader(args.module)
+		architecture = header.getArchitecture()
+		print('done.\n')
+		
+		# Display the module details
+		print('Parsed module details:')
+		OutputFormatting.printModuleDetails(header)
+		print()
+		
+		# Select the system directory that matches the module's architecture
+		systemDir = args.syswow64 if architecture == 'x86' and args.syswow64 is not None else args.system32
+		if systemDir is None:
+			OutputFormatting.printWarning('no system directory was specified, so system DLLs will only be resolved if they are found elsewhere')
+		
+		# Gather the additional search directories and the list of KnownDLLs
+		extraDirs = args.dir + ([d for d in args.path.split(';') if d != ''] if args.path is not None else [])
+		knownDlls = FileIO.readFile(args.known_dlls).split() if args.known_dlls is not None else None
+		
+		# Compute the dependency closure
+		print('Computing the transitive dependency closure... ', end='', flush=True)
+		# (Directories inside an image are used as-is, since they are not paths on the host)
+		searchOrder = DllSearchOrder(
+			os.path.dirname(args.module),
+			(os.path.abspath(systemDir) if manifest is None else systemDir) if systemDir is not None else None,
+			[os.path.abspath(d) for d in extraDirs],
+			knownDlls,
+			manifest
+		)
+		calculator.compute(args.module, searchOrder)
+		print('done.\n')
+		
+		# Print the direct dependencies of each module if requested
+		if args.verbose == True:
+			for module, dependencies in calculator.dependencies.items():
+				print('{}:'.format(colored(module, color='cyan', attrs=['bold'])))
+				rows = []
+				for dll, resolved in dependencies:
+					if resolved is not None:
+						rows.append((dll, resolved))
+					elif DllSearchOrder.isApiSet(dll):
+						rows.append((dll, colored('API set', color='yellow')))
+					else:
+						rows.append((dll, colored('Not found', color='red')))
+				OutputFormatting.printRows(rows, spacing=4, indent=4)
+				print()
+		
+		# Print the list of modules in the closure
+		modules = list(calculator.modules.keys())[1:]
+		print('The dependency closure contains {} modules:'.format(len(modules)))
+		OutputFormatting.printRows([(ntpath.basename(m), m) for m in StringUtils.sortCaseInsensitive(modules)], spacing=4)
+		print()
+		
+		# Print the number of API sets, which are not resolved against the filesystem
+		if len(calculator.apiSets) > 0:
+			print('{} API sets are imported, which are resolved by the loader rather than the search order.\n'.format(len(calculator.apiSets)))
+		
+		# Print any modules that could not be parsed
+		if len(calculator.errors) > 0:
+			OutputFormatting.printWarning('the following modules could not be parsed:')
+			OutputFormatting.printRows(list(calculator.errors.items()), spacing=4, indent=2)
+			print()
+		
+		# Print the list of missing dependencies and the modules that import them
+		if len(calculator.missing) > 0:
+			print(colored('{} dependencies could not be resolved:'.format(len(calculator.missing)), color='red'))
+			OutputFormatting.printRows([
+				(dll, 'imported by {}'.format(', '.join([ntpath.basename(m) for m in importers])))
+				for dll, importers in sorted(calculator.missing.items())
+			], spacing=4, indent=2)
+		else:
+			print(colored('All dependencies were resolved successfully.', color='green'))
+		
+		# Validate the imported symbols of each module in the closure if requested
+		if args.symbols == True:
+			print('\nValidating imported symbols... ', end='', flush=True)
+			symbols = SymbolIndex(manifest=manifest)
+			unresolved = []
+			for module, dependencies in calculator.dependencies.items():
+				for dll, resolved, missing in symbols.findUnresolved(module, dependencies, delayLoad = not args.no_delay_load):
+					unresolved.append(('{} -> {}'.format(ntpath.basename(module), dll), ', '.join([SymbolIndex.formatSymbol(s) for s in missing])))
+			print('done.\n')
+			
+			# Print any modules whose symbol tables could not be read
+			if len(symbols.errors) > 0:
+				OutputFormatting.printWarning('the symbols of the following modules could not be read, so their imports and exports were not validated:')
+				OutputFormatting.printRows(list(symbols.errors.items()), spacing=4, indent=2)
+				print()
+			
+			# Print the symbols that each module imports but the resolved DLL does not export
+			if len(unresolved) > 0:
+				print(colored('{} imports reference symbols that the resolved DLL does not export:'.format(len(unresolved)), color='red'))
+				OutputFormatting.printRows(unresolved, spacing=4, indent=2)
+			elif len(symbols.errors) > 0:
+				print(colored('All of the imported symbols that could be validated were resolved successfully.', color='yellow'))
+			else:
+				print(colored('All imported symbols were resolved successfully.', color='green'))
+		
+		sys.stdout.flush()
+	
+	except RuntimeError as e:
+		print('Error: {}'.format(e))
+		sys.exit(1)
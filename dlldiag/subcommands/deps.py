@@ -1,13 +1,197 @@
-from ..common import ModuleHeader, OutputFormatting, StringUtils, WindowsApi
+from ..common import DirectoryScanner, DllSearchOrder, HeaderCache, HelperPool, ModuleHeader, OutputFormatting, RecordWriter, StringUtils, WindowsApi
 from termcolor import colored
-import argparse, os, sys
+import argparse, concurrent.futures, os, sys
+
+
+class DepsHelpers(object):
+	'''
+	Helper functionality for listing module dependencies
+	'''
+	
+	@staticmethod
+	def selectImports(header, show):
+		'''
+		Returns the unique, sorted list of dependencies for the specified module of the type specified by the `--show` argument
+		'''
+		if show == 'all':
+			imports = header.listAllImports()
+		elif show == 'delayload':
+			imports = header.listDelayLoadedImports()
+		elif show == 'no-delayload':
+			imports = header.listImports() + header.listBoundImports()
+		return StringUtils.uniqueCaseInsensitive(imports, sort=True)
+	
+	@staticmethod
+	def checkDependencies(dependencies, load, jobs=1):
+		'''
+		Attempts to load each of the specified dependencies using the supplied function, yielding (dll, result) tuples
+		in the same order as the supplied list as soon as each result and all of the results that precede it are available.
+		
+		`jobs` specifies the maximum number of dependencies to load concurrently.
+		'''
+		
+		# Don't bother spinning up worker threads if we are loading the dependencies one at a time
+		if jobs <= 1:
+			for dll in dependencies:
+				yield (dll, load(dll))
+			return
+		
+		# Start loading all of the dependencies and wait for the results in order
+		with concurrent.futures.ThreadPoolExecutor(jobs) as executor:
+			futures = [executor.submit(load, dll) for dll in dependencies]
+			try:
+				for dll, future in zip(dependencies, futures):
+					yield (dll, future.result())
+			finally:
+				for future in futures:
+					future.cancel()
+	
+	@staticmethod
+	def dependencyRecord(module, dll, result):
+		'''
+		Creates a machine-readable record for the result of attempting to load one of a module's dependencies
+		'''
+		return {
+			'record': 'dependency',
+			'module': module,
+			'dependency': dll,
+			'loaded': result == 0,
+			'error': result,
+			'message': WindowsApi.formatError(result, [dll]) if result != 0 else None
+		}
+	
+	@staticmethod
+	def reportDuplicates(duplicates, writer=None):
+		'''
+		Prints the groups of modules with identical contents returned by `DirectoryScanner.findDuplicates()`, along with
+		the space consumed by the redundant copies, or writes a machine-readable record for each group to `writer` if specified
+		'''
+		
+		# Sort the groups by the name of the first module in each group and retrieve the size of each module
+		groups = []
+		for digest, group in sorted(duplicates.items(), key=lambda item: item[1][0].casefold()):
+			try:
+				groups.append((digest, os.path.getsize(group[0]), group))
+			except OSError:
+				groups.append((digest, None, group))
+		
+		# Write the records if we are producing machine-readable output
+		if writer is not None:
+			for digest, size, group in groups:
+				writer.write({'record': 'duplicates', 'hash': digest, 'size': size, 'modules': group})
+			return
+		
+		# Print the groups, along with the total size of the copies that could be eliminated
+		if len(groups) > 0:
+			redundant = sum([(size if size is not None else 0) * (len(group) - 1) for _, size, group in groups])
+			print(colored('Modules with identical contents ({} redundant copies totalling {:.1f} MiB):'.format(
+				sum([len(group) - 1 for _, _, group in groups]),
+				redundant / (1024 * 1024)
+			), color='cyan'))
+			for digest, size, group in groups:
+				OutputFormatting.printRows([(os.path.basename(group[0]), '{} copies of {} bytes (SHA-256 {})'.format(len(group), size, digest))], spacing=4, indent=2)
+				print('\n'.join(['    ' + module for module in group]))
+			print()
+		else:
+			print(colored('No modules with identical contents were found.', color='green'))
+			print()
+	
+	@staticmethod
+	def scanDirectory(directory, show, jobs, writer=None, dedupe=False):
+		'''
+		Parses the headers for every module in a directory tree in parallel and cross-references their dependencies
+		against the modules that are present in the tree.
+		
+		`writer` specifies the `RecordWriter` that machine-readable records should be written to instead of printing the results, if any.
+		`dedupe` specifies whether modules with identical contents should only be parsed once and reported as duplicates.
+		'''
+		
+		# Identify the modules in the directory tree
+		modules = DirectoryScanner.listModules(directory)
+		print('Found {} modules in directory {}\n'.format(len(modules), directory), flush=True)
+		
+		# Identify the modules with identical contents, if requested
+		duplicates = None
+		if dedupe == True:
+			print('Identifying modules with identical contents... ', end='', flush=True)
+			duplicates = DirectoryScanner.findDuplicates(modules, jobs)
+			print('found {} groups of identical modules.\n'.format(len(duplicates)), flush=True)
+		
+		# Print the details for each module as soon as it is parsed, keeping track of the architecture of each module in the tree
+		available = {}
+		imported = []
+		for module, header, error in DirectoryScanner.scan(modules, jobs, duplicates):
+			try:
+				if header is None:
+					raise RuntimeError(error)
+				dependencies = DepsHelpers.selectImports(header, show)
+				architecture = header.getArchitecture()
+				if writer is not None:
+					writer.write(RecordWriter.moduleRecord(header, dependencies=dependencies))
+				else:
+					OutputFormatting.printModuleDetails(header)
+					OutputFormatting.printRows([('Dependencies:', ', '.join(dependencies) if len(dependencies) > 0 else 'None')], spacing=4)
+				available.setdefault(os.path.basename(module).casefold(), set()).add(architecture)
+				imported.append((module, architecture, dependencies))
+			except Exception as e:
+				if writer is not None:
+					writer.write({'record': 'error', 'module': module, 'message': str(e)})
+				else:
+					OutputFormatting.printRows([('Module:', module), ('Error:', colored(str(e), color='red'))], spacing=4)
+			if writer is None:
+				print(flush=True)
+		
+		# Report the groups of modules with identical contents, if any
+		if duplicates is not None:
+			DepsHelpers.reportDuplicates(duplicates, writer)
+		
+		# Identify the dependencies that are not satisfied by any module in the tree with a matching architecture
+		external = {}
+		mismatched = {}
+		for module, architecture, dependencies in imported:
+			for dll in dependencies:
+				architectures = available.get(dll.casefold(), set())
+				if architecture in architectures or DllSearchOrder.isApiSet(dll):
+					continue
+				target = mismatched if len(architectures) > 0 else external
+				target.setdefault(dll.casefold(), []).append(os.path.basename(module))
+		
+		# If we are writing machine-readable records then write a record for each unsatisfied dependency rather than printing the results
+		if writer is not None:
+			for reason, results in [('architecture', mismatched), ('missing', external)]:
+				for dll, importers in sorted(results.items()):
+					writer.write({'record': 'unsatisfied', 'dependency': dll, 'reason': reason, 'importers': importers})
+			return
+		
+		# Print the results of the cross-referencing
+		for title, results, colour in [
+			('Dependencies present in the tree only with a different architecture:', mismatched, 'red'),
+			('Dependencies not present in the tree:', external, 'yellow')
+		]:
+			if len(results) > 0:
+				print(colored(title, color=colour))
+				OutputFormatting.printRows([
+					(dll, 'imported by {} modules: {}'.format(len(importers), ', '.join(importers)))
+					for dll, importers in sorted(results.items())
+				], spacing=4, indent=2)
+				print()
+		if len(external) + len(mismatched) == 0:
+			print(colored('All dependencies are satisfied by modules in the tree.', color='green'))
+		sys.stdout.flush()
+
 
 def deps():
 	
 	# Our supported command-line arguments
 	parser = argparse.ArgumentParser(prog='{} deps'.format(sys.argv[0]))
-	parser.add_argument('module', help='DLL or EXE file for which direct dependencies will be loaded')
+	parser.add_argument('module', nargs='?', default=None, help='DLL or EXE file for which direct dependencies will be loaded')
 	parser.add_argument('--show', choices=['all', 'delayload', 'no-delayload'], default='all', help='Which type of dependencies to show')
+	parser.add_argument('--recursive-dir', default=None, help='Parse every module in the specified directory tree instead of loading the dependencies for a single module')
+	parser.add_argument('--jobs', default=None, type=int, help='Number of worker processes to use with --recursive-dir (default is the number of CPU cores)')
+	parser.add_argument('--dedupe', action='store_true', help='With --recursive-dir, only parse one copy of each set of modules with identical contents and report the duplicates')
+	parser.add_argument('--load-jobs', default=1, type=int, help='Number of dependencies to load concurrently, each in a separate helper process (default is 1)')
+	HeaderCache.addArguments(parser)
+	RecordWriter.addArguments(parser)
 	
 	# If no command-line arguments were supplied, display the help message and exit
 	if len(sys.argv) < 2:
@@ -16,9 +200,20 @@ def deps():
 	
 	# Parse the supplied command-line arguments
 	args = parser.parse_args()
+	HeaderCache.configure(args)
+	if args.module is None and args.recursive_dir is None:
+		parser.error('either a module or --recursive-dir must be specified')
+	
+	# If a machine-readable output format was requested then write records to stdout and everything else to stderr
+	writer = RecordWriter.configure(args)
 	
 	try:
 		
+		# If a directory was specified then scan every module in the tree rather than loading dependencies
+		if args.recursive_dir is not None:
+			DepsHelpers.scanDirectory(os.path.abspath(args.recursive_dir), args.show, args.jobs, writer, args.dedupe)
+			return
+		
 		# Ensure the module path is an absolute path
 		args.module = os.path.abspath(args.module)
 		
@@ -26,19 +221,16 @@ def deps():
 		print('Parsing module header and identifying direct dependencies... ', end='')
 		header = ModuleHeader(args.module)
 		architecture = header.getArchitecture()
-		if args.show == 'all':
-			imports = header.listAllImports()
-		elif args.show == 'delayload':
-			imports = header.listDelayLoadedImports()
-		elif args.show == 'no-delayload':
-			imports = header.listImports() + header.listBoundImports()
-		dependencies = StringUtils.uniqueCaseInsensitive(imports, sort=True)
+		dependencies = DepsHelpers.selectImports(header, args.show)
 		print('done.\n')
 		
 		# Display the module details
-		print('Parsed module details:')
-		OutputFormatting.printModuleDetails(header)
-		print()
+		if writer is not None:
+			writer.write(RecordWriter.moduleRecord(header, dependencies=dependencies))
+		else:
+			print('Parsed module details:')
+			OutputFormatting.printModuleDetails(header)
+			print()
 		
 		# Verify that the module has at least one dependency
 		if len(dependencies) > 0:
@@ -47,10 +239,21 @@ def deps():
 			cwd = os.path.dirname(args.module)
 			columnWidth = max([len(dll) for dll in dependencies]) + 4
 			print('Attempting to load the module\'s direct dependencies:\n', flush=True)
-			for dll in dependencies:
-				result = WindowsApi.loadModule(dll, cwd, architecture)
-				OutputFormatting.printRow(dll, OutputFormatting.formatColouredResult(result, [dll], 'Loaded successfully'), width=columnWidth)
-				sys.stdout.flush()
+			
+			# When loading dependencies concurrently, isolate each load in a helper process with its own working directory
+			if args.load_jobs > 1:
+				HelperPool.getDefault().setMaxWorkers(args.load_jobs)
+				load = lambda dll: WindowsApi.loadModule(dll, cwd, architecture, force_external=True)
+			else:
+				load = lambda dll: WindowsApi.loadModule(dll, cwd, architecture)
+			
+			# Print the results in order as soon as they are available
+			for dll, result in DepsHelpers.checkDependencies(dependencies, load, args.load_jobs):
+				if writer is not None:
+					writer.write(DepsHelpers.dependencyRecord(args.module, dll, result))
+				else:
+					OutputFormatting.printRow(dll, OutputFormatting.formatColouredResult(result, [dll], 'Loaded successfully'), width=columnWidth)
+					sys.stdout.flush()
 			
 			# Display the error propagation notice
 			print(colored('\n\nImportant note regarding errors:\n', color='yellow'))
@@ -66,10 +269,12 @@ def deps():
 		
 	except RuntimeError as e:
 		print('Error: {}'.format(e))
+		if writer is not None:
+			writer.write({'record': 'error', 'message': str(e)})
 		sys.exit(1)
-
-
-DESCRIPTOR = {
-	'function': deps,
-	'description': 'Lists the direct dependencies for a module and checks if they can be loaded'
-}
+	
+	finally:
+		
+		# Ensure the machine-readable output is always a complete document, even if an error occurred
+		if writer is not None:
+			writer.close()
@@ -1,6 +1,7 @@
 from ..version import __version__
-from ..common import FileIO
-import argparse, os, sys
+from ..common import DependencyClosure, DllSearchOrder, FileIO, HeaderCache, ImageManifest, OutputFormatting, StringUtils
+from termcolor import colored
+import argparse, ntpath, os, sys
 
 
 # Our template Dockerfile code
@@ -24,18 +25,159 @@ LABEL DLLDIAG_VERSION={}
 RUN pip install dll-diagnostics=={}
 '''
 
+# Our template Dockerfile code for copying the DLLs required by an application from a source image
+COPY_DOCKERFILE_TEMPLATE = '''# escape=`
+
+# Generated by dll-diagnostics version {} for {}
+# Copies the {} DLLs required by the application that are missing from {}
+FROM {} AS source
+
+FROM {}
+{}
+'''
+
+
+class DockerHelpers(object):
+	'''
+	Helper functionality for generating Dockerfiles
+	'''
+	
+	@staticmethod
+	def computeCopySet(calculator, sourceManifest, baseManifest):
+		'''
+		Determines which of the modules in a computed `DependencyClosure` are provided by the source image but are
+		missing from the base image, returning the sorted list of paths that need to be copied into the base image
+		(Since the closure is transitive, this includes the dependencies of any missing DLLs that are also missing)
+		'''
+		return StringUtils.sortCaseInsensitive([
+			module for module in list(calculator.modules.keys())[1:]
+			if sourceManifest.contains(module) and not baseManifest.contains(module)
+		])
+	
+	@staticmethod
+	def formatCopyInstructions(modules):
+		'''
+		Formats `COPY --from` instructions that copy the specified modules from the source image, with a single
+		instruction for each destination directory
+		'''
+		directories = {}
+		for module in modules:
+			directories.setdefault(ntpath.dirname(module), []).append(module)
+		if len(directories) == 0:
+			return '\n# All of the DLLs required by the application that the source image provides are already present in the base image'
+		
+		return '\n' + '\n\n'.join([
+			'COPY --from=source `\n{}\t{}\\'.format(''.join(['\t{} `\n'.format(module) for module in files]), directory)
+			for directory, files in sorted(directories.items(), key=lambda item: item[0].casefold())
+		])
+	
+	@staticmethod
+	def buildManifest(root, outfile, prefix, jobs):
+		'''
+		Builds an image manifest from a mounted or extracted image tree and saves it to the specified file
+		'''
+		print('Parsing the headers of the modules in {}... '.format(root), end='', flush=True)
+		manifest, errors = ImageManifest.build(root, prefix, jobs)
+		print('done.\n')
+		
+		# Report any modules that could not be parsed, since their dependencies will be unknown
+		if len(errors) > 0:
+			OutputFormatting.printWarning('the following modules could not be parsed:')
+			OutputFormatting.printRows(sorted(errors.items()), spacing=4, indent=2)
+			print()
+		
+		manifest.save(outfile)
+		print('Wrote manifest of {} modules to {}'.format(len(manifest), outfile), flush=True)
+	
+	@staticmethod
+	def generateCopyDockerfile(args, outfile):
+		'''
+		Computes the dependency closure of an application against the manifest of the source image and writes a
+		Dockerfile that copies the DLLs that are missing from the base image
+		'''
+		
+		# Load the manifests for the source image and the base image
+		sourceManifest = ImageManifest.load(args.source_manifest)
+		baseManifest = ImageManifest.load(args.base_manifest)
+		
+		# Parse the PE header for the application module
+		module = os.path.abspath(args.module)
+		calculator = DependencyClosure(delayLoad = not args.no_delay_load, manifest=sourceManifest)
+		header = calculator.getHeader(module)
+		architecture = header.getArchitecture()
+		print('Parsed module details:')
+		OutputFormatting.printModuleDetails(header)
+		print()
+		
+		# Compute the dependency closure, resolving system DLLs against the source image's system directory for the module's architecture
+		print('Computing the transitive dependency closure against the source image manifest... ', end='', flush=True)
+		knownDlls = FileIO.readFile(args.known_dlls).split() if args.known_dlls is not None else None
+		searchOrder = DllSearchOrder(
+			os.path.dirname(module),
+			args.syswow64 if architecture == 'x86' else args.system32,
+			knownDlls=knownDlls,
+			manifest=sourceManifest
+		)
+		calculator.compute(module, searchOrder)
+		print('done.\n')
+		
+		# Report any modules whose dependencies could not be determined, since they may require further DLLs
+		# (Modules that are present in the source manifest without header details are still copied if they are missing from the base image)
+		if len(calculator.errors) > 0:
+			OutputFormatting.printWarning('the dependencies of the following modules could not be determined, so any DLLs that they require may be missing from the generated Dockerfile:')
+			OutputFormatting.printRows(list(calculator.errors.items()), spacing=4, indent=2)
+			print()
+		
+		# Report any dependencies that are not present in the source image either
+		if len(calculator.missing) > 0:
+			OutputFormatting.printWarning('the following dependencies are not present in the source image and cannot be copied:')
+			OutputFormatting.printRows([
+				(dll, 'imported by {}'.format(', '.join([ntpath.basename(m) for m in importers])))
+				for dll, importers in sorted(calculator.missing.items())
+			], spacing=4, indent=2)
+			print()
+		
+		# Determine which DLLs need to be copied and generate the Dockerfile
+		copies = DockerHelpers.computeCopySet(calculator, sourceManifest, baseManifest)
+		FileIO.writeFile(outfile, COPY_DOCKERFILE_TEMPLATE.format(
+			__version__,
+			ntpath.basename(module),
+			len(copies),
+			args.base,
+			args.source,
+			args.base,
+			DockerHelpers.formatCopyInstructions(copies)
+		))
+		
+		# Print the list of DLLs that will be copied
+		print('{} of the {} modules in the dependency closure need to be copied from {}:'.format(len(copies), len(calculator.modules) - 1, args.source))
+		OutputFormatting.printRows([(ntpath.basename(m), m) for m in copies], spacing=4, indent=2)
+		print(flush=True)
+
 
 def docker():
 	
 	# Our supported command-line arguments
 	parser = argparse.ArgumentParser(prog='{} docker'.format(sys.argv[0]))
-	parser.add_argument('dockerfile', help='Output filename for the generated Dockerfile')
+	parser.add_argument('dockerfile', help='Output filename for the generated Dockerfile (or the generated manifest when using --build-manifest)')
 	parser.add_argument(
 		'base',
 		nargs='?',
 		default='mcr.microsoft.com/windows/servercore:1809',
 		help='Base image tag to use in the Dockerfile\'s FROM clause (default is Windows Server Core 2019)'
 	)
+	parser.add_argument('--module', default=None, help='Instead of installing dlldiag, generate a Dockerfile that copies the DLLs required by the specified application module from the source image into the base image')
+	parser.add_argument('--source', default='mcr.microsoft.com/windows:1809', help='Tag of the image to copy DLLs from when using --module (default is Windows 2019)')
+	parser.add_argument('--source-manifest', default=None, help='Manifest for the source image generated by --build-manifest, which is required when using --module')
+	parser.add_argument('--base-manifest', default=None, help='Manifest for the base image, which is required when using --module (either generated by --build-manifest or a text file listing one path per line, such as the output of `dir /s /b`)')
+	parser.add_argument('--system32', default='C:\\Windows\\System32', help='System32 directory inside the source image (default is C:\\Windows\\System32)')
+	parser.add_argument('--syswow64', default='C:\\Windows\\SysWOW64', help='SysWOW64 directory inside the source image, used for x86 modules (default is C:\\Windows\\SysWOW64)')
+	parser.add_argument('--known-dlls', default=None, help='File containing the list of KnownDLLs (one per line) to use instead of the default list')
+	parser.add_argument('--no-delay-load', action='store_true', help='Don\'t follow delay-loaded dependencies when using --module')
+	parser.add_argument('--build-manifest', default=None, metavar='ROOT', help='Instead of generating a Dockerfile, build a manifest from the mounted or extracted image tree in the specified directory')
+	parser.add_argument('--prefix', default='C:\\', help='Path inside the image that corresponds to the directory specified by --build-manifest (default is C:\\)')
+	parser.add_argument('--jobs', default=None, type=int, help='Number of worker processes to use with --build-manifest (default is the number of CPU cores)')
+	HeaderCache.addArguments(parser)
 	
 	# If no command-line arguments were supplied, display the help message and exit
 	if len(sys.argv) < 2:
@@ -44,16 +186,29 @@ def docker():
 	
 	# Parse the supplied command-line arguments
 	args = parser.parse_args()
+	HeaderCache.configure(args)
+	if args.module is not None and args.build_manifest is not None:
+		parser.error('--module and --build-manifest cannot be used together')
+	if args.module is not None and (args.source_manifest is None or args.base_manifest is None):
+		parser.error('--source-manifest and --base-manifest must be specified when using --module')
 	
-	# Fill in the template Dockerfile code and write it to the specified output file
-	outfile = os.path.abspath(args.dockerfile)
-	FileIO.writeFile(outfile, DOCKERFILE_TEMPLATE.format(args.base, __version__, __version__))
+	try:
+		
+		# If requested, build a manifest for an image rather than generating a Dockerfile
+		outfile = os.path.abspath(args.dockerfile)
+		if args.build_manifest is not None:
+			DockerHelpers.buildManifest(os.path.abspath(args.build_manifest), outfile, args.prefix, args.jobs)
+			return
+		
+		# Generate a Dockerfile that copies an application's DLLs if requested, otherwise fill in the template Dockerfile code
+		if args.module is not None:
+			DockerHelpers.generateCopyDockerfile(args, outfile)
+		else:
+			FileIO.writeFile(outfile, DOCKERFILE_TEMPLATE.format(args.base, __version__, __version__))
+		
+		# Print the absolute path to the output file
+		print('Wrote generated Dockerfile to {}'.format(outfile), flush=True)
 	
-	# Print the absolute path to the output file
-	print('Wrote generated Dockerfile to {}'.format(outfile), flush=True)
-
-
-DESCRIPTOR = {
-	'function': docker,
-	'description': 'Generates a Dockerfile suitable for using dlldiag inside a Windows container'
-}
+	except RuntimeError as e:
+		print('Error: {}'.format(e))
+		sys.exit(1)
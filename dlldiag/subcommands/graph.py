@@ -1,6 +1,5 @@
-from ..common import DetourLibrary, FileIO, ModuleHeader, OutputFormatting
-import argparse, hashlib, json, os, re, sys
-from collections import OrderedDict
+from ..common import DetourLibrary, GraphWriter, HeaderCache, InternTable, LogRecord, ModuleHeader, OutputFormatting, RecordWriter, TraceEventWriter
+import argparse, os, sys, time
 from termcolor import colored
 import networkx as nx
 
@@ -11,164 +10,135 @@ class GraphHelpers(object):
 	'''
 	
 	@staticmethod
-	def entryHash(entry):
+	def entryKey(entry):
 		'''
-		Computes a hash of the fields common to both "enter" and "return" log entries
+		Computes an identity key from the fields common to both "enter" and "return" log entries
+		(This is the equivalent of `LogRecord.key()` for log entries that are plain dictionaries, converting
+		the values to hashable form directly rather than serialising them)
 		'''
-		
-		# Extract the common fields and copy them into a new dictionary
-		subset = {}
-		for field in ['random', 'timestamp_start', 'module', 'thread', 'function', 'arguments']:
-			subset[field] = entry[field]
-		
-		# Dump the dictionary to a JSON string and hash it
-		return hashlib.sha256(json.dumps(subset, sort_keys=True).encode('utf-8')).hexdigest()
-	
-	@staticmethod
-	def entriesMatch(lhs, rhs):
-		'''
-		Determines whether the supplied log entries are for the same function call
-		'''
-		return GraphHelpers.entryHash(lhs) == GraphHelpers.entryHash(rhs)
-	
-	@staticmethod
-	def findMatch(candidates, entry):
-		'''
-		Attempts to find the last entry in the supplied list that matches the hash of the specified entry
-		'''
-		for index in range(len(candidates) - 1, -1, -1):
-			candidate = candidates[index]
-			if GraphHelpers.entriesMatch(candidate, entry):
-				return candidates.pop(index)
-		
-		# No match found
-		return None
+		return tuple([InternTable.freeze(entry[field]) for field in LogRecord.KEY_FIELDS])
 	
 	@staticmethod
-	def formatFunctionName(entry):
+	def formatFunctionName(entry, colour=colored):
 		'''
 		Formats a function name for pretty-printing
+		
+		(All of our formatting functions accept the function used to colour text, so that `OutputFormatting.uncoloured` can be
+		specified to produce plain text without any of the overheads of colouring it)
 		'''
-		return colored(entry['function'], color='yellow')
+		return colour(entry['function'], color='yellow')
 	
 	@staticmethod
-	def formatReturnValue(entry, successCondition=None):
+	def formatReturnValue(entry, successCondition=None, colour=colored):
 		'''
 		Formats a function call's return value for pretty-printing
 		'''
 		
-		# Evaluate the success condition (if supplied) and retrieve the appropriate error field for the function
+		# Evaluate the success condition (if supplied) and pretty-print the result if it is satisfied
 		success = successCondition(entry) if successCondition is not None else False
-		error = entry['status'] if entry['function'] == 'LdrLoadDll' else entry['error']
+		if success == True:
+			return colour(entry['result'], color='green')
 		
-		# Pretty-print the result upon success or the error upon failure
-		if success == True or error['code'] == 0:
-			return colored(entry['result'], color='green')
+		# Otherwise, retrieve the appropriate error field for the function and pretty-print the result or the error
+		error = entry['status'] if entry['function'] == 'LdrLoadDll' else entry['error']
+		if error['code'] == 0:
+			return colour(entry['result'], color='green')
 		else:
-			return colored(error['message'].strip(), color='red')
+			return colour(error['message'].strip(), color='red')
 	
 	@staticmethod
-	def formatFlags(flags):
+	def formatFlags(flags, colour=colored):
 		'''
 		Formats a set of flags for pretty-printing
 		'''
-		return ' | '.join([colored(f, color='yellow') for f in flags])
+		return ' | '.join([colour(f, color='yellow') for f in flags])
 	
 	@staticmethod
-	def formatAnnotations(annotations):
+	def formatAnnotations(annotations, colour=colored):
 		'''
 		Formats a set of annotations for pretty-printing
 		'''
-		return ' '.join([colored('[{}]'.format(a), color='magenta', attrs=['bold']) for a in annotations])
+		return ' '.join([colour('[{}]'.format(a), color='magenta', attrs=['bold']) for a in annotations])
 	
 	@staticmethod
-	def constructGraph(logEntries):
+	def formatLoadLibraryCall(details, extendedDetails, colour=colored):
 		'''
-		Constructs a directed graph from the supplied list of log entries
+		Formats the details of a LoadLibrary() or LdrLoadDll() call for pretty-printing
 		'''
 		
-		# Create a new directed graph with support for parallel edges
-		graph = nx.MultiDiGraph()
+		# Retrieve the fields that we use more than once, since fields may need to be decoded each time they are accessed
+		function = details['function']
+		arguments = details['arguments']
 		
-		# Maintain a list of function calls for which we've not yet seen a return value
-		pending = []
+		# Determine if we are annotating the call with any special information
+		annotations = []
+		if extendedDetails == True:
+			if function == 'LdrLoadDll' and details['module'].upper() in ['C:\WINDOWS\SYSTEM32\DXGI.DLL', 'C:\WINDOWS\SYSTEM32\D3D12CORE.DLL'] and 'DriverStore' in details['result']:
+				annotations.append('DirectX UMD')
 		
-		# Gather all LdrLoadDll() calls and process them last
-		loadDllEntries = list([e for e in logEntries if e['function'] == 'LdrLoadDll'])
-		logEntries = list([e for e in logEntries if e['function'] != 'LdrLoadDll']) + loadDllEntries
+		# Determine if we are printing the search flags for the call
+		flags = ''
+		if extendedDetails == True and (function.startswith('LoadLibraryEx') or function == 'LdrLoadDll'):
+			flags = ' [{}]'.format(GraphHelpers.formatFlags(
+				arguments[1] if function == 'LdrLoadDll' else arguments[2],
+				colour
+			))
 		
-		# Process each log entry in turn
+		# Format the call details with pretty formatting
+		return '{}{} "{}"{} -> {}'.format(
+			(GraphHelpers.formatAnnotations(annotations, colour) + ' ') if len(annotations) > 0 else '',
+			colour(function, color='yellow'),
+			arguments[0],
+			flags,
+			GraphHelpers.formatReturnValue(details, successCondition = lambda e: e['result'] != 'NULL', colour=colour)
+		)
+	
+	@staticmethod
+	def formatCallCounts(edge, colour=colored):
+		'''
+		Formats the call counts for an edge in an aggregate graph for pretty-printing
+		'''
+		return colour('[{} calls: {} succeeded, {} failed]'.format(edge['calls'], edge['succeeded'], edge['failed']), color='magenta')
+	
+	@staticmethod
+	def constructGraph(logEntries):
+		'''
+		Constructs a directed graph from the supplied iterable of log entries
+		'''
+		builder = GraphBuilder()
 		for entry in logEntries:
-			
-			# Determine if the log entry is for the start of a function call or its return value
-			if entry['type'] == 'enter':
-				
-				# Add the entry to our stack of pending function calls
-				pending.append(entry)
-				
-			elif entry['type'] == 'return':
-				
-				# Identify which pending function call this entry represents the return value for
-				match = GraphHelpers.findMatch(pending, entry)
-				if match is None:
-					OutputFormatting.printWarning('encountered a return value before the function call!')
-					continue
-				
-				# If this is a LdrLoadDll() call then examine the stack trace to determine the appropriate module to treat as the caller
-				# (Note that we filter out the resolved module in addition to KERNELBASE.DLL and NTDLL.DLL, to help prevent self-loops that provide little valuable information)
-				if entry['function'] == 'LdrLoadDll':
-					candidates = [m for m in entry['stack'] if m != entry['result'] and m.upper() not in ['C:\\WINDOWS\\SYSTEM32\\KERNELBASE.DLL', 'C:\\WINDOWS\\SYSTEM32\\NTDLL.DLL']]
-					if len(candidates) > 0:
-						entry['module'] = candidates[0]
-				
-				# Create a vertex for the calling module if we don't already have one
-				if entry['module'] not in graph:
-					graph.add_node(entry['module'], non_loadlibrary_calls=[])
-				
-				# Determine if this is a LoadLibrary function call
-				if entry['function'].startswith('LoadLibrary') or entry['function'] == 'LdrLoadDll':
-					
-					# Create a vertex for the module resolved by the LoadLibrary() call if we don't already have one
-					# (Note that this will create a vertex called "NULL" that all failed calls will have outbound edges pointing to)
-					if entry['result'] not in graph:
-						graph.add_node(entry['result'], non_loadlibrary_calls=[])
-					
-					# Create an edge between the calling module vertex and the resolved module vertex, annotated with the call details
-					graph.add_edge(entry['module'], entry['result'], details=entry)
-					
-				else:
-					
-					# For all other function calls, just add an entry to the list in the metadata for the vertex
-					nx.get_node_attributes(graph, 'non_loadlibrary_calls')[entry['module']].append(entry)
-				
-			else:
-				raise RuntimeError('unsupported log entry type "{}"!'.format(entry['type']))
-		
-		# Print a warning if there were any function calls for which we did not encounter a return value
-		if len(pending) > 0:
-			for entry in pending:
-				OutputFormatting.printWarning('return value not found for function call: {}'.format(entry))
-		
-		return graph
+			builder.addEntry(entry)
+		return builder.finish()
 	
 	@staticmethod
-	def printSummary(graph, extendedDetails):
+	def printSummary(graph, extendedDetails, stream=None, colour=None):
 		'''
-		Prints a summary of the supplied call hierarchy graph
+		Prints a summary of the supplied call hierarchy graph.
+		
+		`stream` specifies the stream to write the summary to (stdout will be used if `None`.)
+		`colour` specifies whether the output should be coloured (this will be auto-detected from the stream if `None`.)
 		'''
+		stream = stream if stream is not None else sys.stdout
+		colour = colored if (colour if colour is not None else OutputFormatting.supportsColour(stream)) == True else OutputFormatting.uncoloured
 		
-		# Iterate over each module
-		for vertex in graph:
+		# Gather the output for each module into a single buffer that we write in batches, rather than printing each line
+		buffer = []
+		buffered = 0
+		
+		# Walk the graph once, retrieving the list of non-LoadLibrary calls for each module along with its outbound edges
+		adjacency = graph.adj
+		for vertex, calls in graph.nodes(data='non_loadlibrary_calls'):
 			
 			# Ignore the "NULL" vertex that is used to represent failed LoadLibrary() calls
 			if vertex == 'NULL':
 				continue
 			
 			# Print the module name
-			print('{}:'.format(colored(vertex, color='cyan', attrs=['bold'])))
+			buffer.append('{}:\n'.format(colour(vertex, color='cyan', attrs=['bold'])))
 			
 			# Gather the list of pretty-printed function calls so we can filter out duplicates
-			printed = []
+			# (Dictionaries preserve insertion order, so we use one as an ordered set)
+			printed = {}
 			
 			# If we are displaying extended details then print the details of the module's calls that are not LoadLibrary() calls
 			if extendedDetails == True:
@@ -177,115 +147,765 @@ class GraphHelpers(object):
 				cookies = {}
 				
 				# Iterate over the non-LoadLibrary calls
-				calls = nx.get_node_attributes(graph, 'non_loadlibrary_calls')[vertex]
-				for call in calls:
+				for call in calls if calls is not None else []:
 					
 					# Determine which function we are dealing with, since we pretty print them with different formats
-					if call['function'] == 'SetDefaultDllDirectories':
-						printed.append('    {} [{}] -> {}'.format(
-							GraphHelpers.formatFunctionName(call),
-							GraphHelpers.formatFlags(call['arguments'][0]),
-							GraphHelpers.formatReturnValue(call)
-						))
+					function = call['function']
+					if function == 'SetDefaultDllDirectories':
+						printed['    {} [{}] -> {}'.format(
+							GraphHelpers.formatFunctionName(call, colour),
+							GraphHelpers.formatFlags(call['arguments'][0], colour),
+							GraphHelpers.formatReturnValue(call, colour=colour)
+						)] = None
 					
-					elif call['function'] in ['SetDllDirectoryA', 'SetDllDirectoryW']:
-						printed.append('    {} "{}" -> {}'.format(
-							GraphHelpers.formatFunctionName(call),
+					elif function in ['SetDllDirectoryA', 'SetDllDirectoryW']:
+						printed['    {} "{}" -> {}'.format(
+							GraphHelpers.formatFunctionName(call, colour),
 							call['arguments'][0],
-							GraphHelpers.formatReturnValue(call)
-						))
-						
-					elif call['function'] == 'AddDllDirectory':
+							GraphHelpers.formatReturnValue(call, colour=colour)
+						)] = None
+					
+					elif function == 'AddDllDirectory':
 						
 						# Add the returned cookie to our list
 						cookies[call['result']] = call['arguments'][0]
 						
-						printed.append('    {} "{}" -> {}'.format(
-							GraphHelpers.formatFunctionName(call),
+						printed['    {} "{}" -> {}'.format(
+							GraphHelpers.formatFunctionName(call, colour),
 							call['arguments'][0],
-							GraphHelpers.formatReturnValue(call)
-						))
+							GraphHelpers.formatReturnValue(call, colour=colour)
+						)] = None
 					
-					elif call['function'] == 'RemoveDllDirectory':
+					elif function == 'RemoveDllDirectory':
 						
 						# Retrieve the passed cookie from our list
 						cookie = cookies.get(call['arguments'][0], '<UNKNOWN>')
 						
-						printed.append('    {} {} ("{}") -> {}'.format(
-							GraphHelpers.formatFunctionName(call),
+						printed['    {} {} ("{}") -> {}'.format(
+							GraphHelpers.formatFunctionName(call, colour),
 							call['arguments'][0],
 							cookie,
-							GraphHelpers.formatReturnValue(call)
-						))
+							GraphHelpers.formatReturnValue(call, colour=colour)
+						)] = None
 			
 			# Iterate over the edges for the module's LoadLibrary() and LdrLoadDll() calls
-			neighbours = graph[vertex]
+			neighbours = adjacency[vertex]
 			if len(neighbours) == 0:
-				printed.append('    This module did not load any libraries.')
+				printed['    This module did not load any libraries.'] = None
 			else:
-				for _, edges in neighbours.items():
-					for _, edge in edges.items():
-						
-						# Determine if we are annotating the call with any special information
-						details = edge['details']
-						annotations = []
-						if extendedDetails == True:
-							if details['function'] == 'LdrLoadDll' and details['module'].upper() in ['C:\WINDOWS\SYSTEM32\DXGI.DLL', 'C:\WINDOWS\SYSTEM32\D3D12CORE.DLL'] and 'DriverStore' in details['result']:
-								annotations.append('DirectX UMD')
-						
-						# Determine if we are printing the search flags for the call
-						flags = ''
-						if extendedDetails == True and (details['function'].startswith('LoadLibraryEx') or details['function'] == 'LdrLoadDll'):
-							flags = ' [{}]'.format(GraphHelpers.formatFlags(
-								details['arguments'][1] if details['function'] == 'LdrLoadDll' else details['arguments'][2]
-							))
-						
-						# Print the call details with pretty formatting
-						printed.append('    {}{} "{}"{} -> {}'.format(
-							(GraphHelpers.formatAnnotations(annotations) + ' ') if len(annotations) > 0 else '',
-							GraphHelpers.formatFunctionName(details),
-							details['arguments'][0],
-							flags,
-							GraphHelpers.formatReturnValue(details, successCondition = lambda e: e['result'] != 'NULL')
-						))
+				for edges in neighbours.values():
+					for edge in edges.values():
+						line = '    ' + GraphHelpers.formatLoadLibraryCall(edge['details'], extendedDetails, colour)
+						if 'calls' in edge:
+							line += ' ' + GraphHelpers.formatCallCounts(edge, colour)
+						printed[line] = None
+			
+			# Add all unique output lines, preserving their ordering, followed by a blank line after the module's call list
+			buffer.append('\n'.join(printed))
+			buffer.append('\n\n')
+			
+			# Write the buffered output once it grows large enough
+			buffered += len(printed) + 1
+			if buffered >= 4096:
+				stream.write(''.join(buffer))
+				buffer = []
+				buffered = 0
+		
+		# Write any remaining output
+		stream.write(''.join(buffer))
+		stream.flush()
+	
+	@staticmethod
+	def writeToFile(graph, outfile, format=None, edgeAttributes=None):
+		'''
+		Writes the supplied graph to file in GraphViz DOT, GraphML or node-link JSON format
+		(the format is inferred from the file extension if not specified, defaulting to DOT)
+		'''
+		GraphWriter.write(graph, outfile, format=format, edgeAttributes=edgeAttributes)
+	
+	@staticmethod
+	def vertexRecord(vertex):
+		'''
+		Creates a machine-readable record for the vertex representing the specified module
+		'''
+		return {'record': 'vertex', 'module': vertex}
+	
+	@staticmethod
+	def callRecord(vertex, entry):
+		'''
+		Creates a machine-readable record for a non-LoadLibrary() call made by the specified module
+		'''
+		return {'record': 'call', 'module': vertex, 'details': entry}
+	
+	@staticmethod
+	def edgeRecord(caller, target, edge):
+		'''
+		Creates a machine-readable record for an edge, including the call statistics if it is an aggregate edge
+		'''
+		record = {'record': 'edge', 'caller': caller, 'target': target, 'function': edge['details']['function']}
+		record.update(edge)
+		return record
+	
+	@staticmethod
+	def writeRecords(graph, writer):
+		'''
+		Writes machine-readable records for all of the vertices and edges of the supplied graph to the supplied `RecordWriter`
+		'''
+		for vertex, calls in graph.nodes(data='non_loadlibrary_calls'):
+			writer.write(GraphHelpers.vertexRecord(vertex))
+			for call in calls if calls is not None else []:
+				writer.write(GraphHelpers.callRecord(vertex, call))
+		for caller, target, edge in graph.edges(data=True):
+			writer.write(GraphHelpers.edgeRecord(caller, target, edge))
+
+
+class GraphBuilder(object):
+	'''
+	Incrementally constructs a `LoadLibrary()` call hierarchy graph from log entries as they are received
+	'''
+	
+	def __init__(self, deferLoadDll=True, trackChanges=False, compact=True, aggregator=None, callback=None):
+		'''
+		Creates a new graph builder.
+		
+		`compact` specifies whether log entry dictionaries should be converted to compact `LogRecord` objects
+		that share a single intern table, which drastically reduces memory usage for long-running processes.
+		`deferLoadDll` specifies whether LdrLoadDll() calls should be held back and processed after all
+		other calls when `finish()` is called, which is the ordering used for complete logs.
+		`trackChanges` specifies whether newly-created vertices and edges should be recorded so they can
+		be retrieved by calling `takeChanges()`.
+		`aggregator` specifies a `GraphAggregator` whose graph the completed function calls should be merged
+		into, rather than adding a separate edge for every call to a new graph.
+		`callback` specifies a function to call with the "return" log entry for each completed function call.
+		'''
+		
+		# Create a new directed graph with support for parallel edges, or use the aggregator's graph if we have one
+		self._aggregator = aggregator
+		self.graph = aggregator.graph if aggregator is not None else nx.MultiDiGraph()
+		
+		# Create the intern table for the repeated values in compact log records, or share the aggregator's table if we have one
+		self.table = aggregator.table if aggregator is not None else InternTable()
+		self._compact = compact
+		
+		# Maintain an index of the function calls for which we've not yet seen a return value, keyed by identity
+		# (Each key maps to a stack of calls, since we always match a return value with the most recent matching call)
+		self._pending = {}
+		self._index = 0
+		
+		# Gather all LdrLoadDll() calls so we can process them last, if requested
+		self._deferLoadDll = deferLoadDll
+		self._deferred = []
+		
+		# Keep track of the vertices and edges that have been created since changes were last retrieved, if requested
+		self._trackChanges = trackChanges
+		self._changes = []
+		
+		# Keep track of the function to call for each completed function call, if any
+		self._callback = callback
+	
+	def addEntry(self, entry):
+		'''
+		Adds the supplied log entry to the graph
+		'''
+		if self._compact == True and isinstance(entry, dict):
+			entry = LogRecord(entry, self.table)
+		
+		if self._deferLoadDll == True and entry['function'] == 'LdrLoadDll':
+			self._deferred.append(entry)
+		else:
+			self._processEntry(entry)
+	
+	def finish(self):
+		'''
+		Processes any deferred log entries, reports any unmatched function calls and returns the completed graph
+		'''
+		
+		# Process the deferred LdrLoadDll() calls
+		for entry in self._deferred:
+			self._processEntry(entry)
+		self._deferred = []
+		
+		# Print a warning if there were any function calls for which we did not encounter a return value
+		if len(self._pending) > 0:
+			for _, entry in sorted([call for calls in self._pending.values() for call in calls], key=lambda call: call[0]):
+				OutputFormatting.printWarning('return value not found for function call: {}'.format(entry))
+		
+		return self.graph
+	
+	@staticmethod
+	def entryKey(entry):
+		'''
+		Computes an identity key from the fields common to both "enter" and "return" log entries
+		'''
+		return entry.key() if isinstance(entry, LogRecord) else GraphHelpers.entryKey(entry)
+	
+	def takeChanges(self):
+		'''
+		Returns the list of ("vertex", name), ("edge", details) and ("call", details) tuples for the vertices, edges
+		and non-LoadLibrary() calls that have been created since this method was last called
+		'''
+		changes = self._changes
+		self._changes = []
+		return changes
+	
+	def _addVertex(self, vertex):
+		'''
+		Creates a vertex for the specified module if we don't already have one
+		'''
+		if vertex not in self.graph:
+			self.graph.add_node(vertex, non_loadlibrary_calls=[])
+			if self._trackChanges == True:
+				self._changes.append(('vertex', vertex))
+	
+	def _processEntry(self, entry):
+		'''
+		Processes a single log entry, pairing return values with their function calls and updating the graph
+		'''
+		graph = self.graph
+		index = self._index
+		self._index += 1
+		
+		# Determine if the log entry is for the start of a function call or its return value
+		if entry['type'] == 'enter':
+			
+			# Add the entry to our index of pending function calls, along with its position so we can preserve ordering
+			self._pending.setdefault(GraphBuilder.entryKey(entry), []).append((index, entry))
+		
+		elif entry['type'] == 'return':
+			
+			# Identify which pending function call this entry represents the return value for
+			key = GraphBuilder.entryKey(entry)
+			matches = self._pending.get(key, [])
+			if len(matches) == 0:
+				OutputFormatting.printWarning('encountered a return value before the function call!')
+				return
+			
+			# Remove the matched function call from the index
+			matches.pop()
+			if len(matches) == 0:
+				del self._pending[key]
+			
+			# If this is a LdrLoadDll() call then examine the stack trace to determine the appropriate module to treat as the caller
+			# (Note that we filter out the resolved module in addition to KERNELBASE.DLL and NTDLL.DLL, to help prevent self-loops that provide little valuable information)
+			if entry['function'] == 'LdrLoadDll':
+				candidates = [m for m in entry['stack'] if m != entry['result'] and m.upper() not in ['C:\\WINDOWS\\SYSTEM32\\KERNELBASE.DLL', 'C:\\WINDOWS\\SYSTEM32\\NTDLL.DLL']]
+				if len(candidates) > 0:
+					entry['module'] = candidates[0]
+			
+			# Create a vertex for the calling module if we don't already have one
+			self._addVertex(entry['module'])
 			
-			# Print all unique output lines, preserving their ordering
-			print('\n'.join(list(OrderedDict.fromkeys(printed))))
+			# Report the completed function call, if requested
+			if self._callback is not None:
+				self._callback(entry)
 			
-			# Print a blank line after each module's call list
+			# Determine if this is a LoadLibrary function call
+			if entry['function'].startswith('LoadLibrary') or entry['function'] == 'LdrLoadDll':
+				
+				# Create a vertex for the module resolved by the LoadLibrary() call if we don't already have one
+				# (Note that this will create a vertex called "NULL" that all failed calls will have outbound edges pointing to)
+				self._addVertex(entry['result'])
+				
+				# Create an edge between the calling module vertex and the resolved module vertex, annotated with the call details
+				# (If we are aggregating calls then the call is merged into the existing edge for the same function, if any)
+				if self._aggregator is not None:
+					self._aggregator.addCall(entry['module'], entry['result'], entry)
+				else:
+					graph.add_edge(entry['module'], entry['result'], details=entry)
+				if self._trackChanges == True:
+					self._changes.append(('edge', entry))
+			
+			elif self._aggregator is not None:
+				
+				# If we are aggregating calls then only retain one copy of each distinct call
+				self._aggregator.addNonLoadLibraryCall(entry['module'], entry)
+			
+			else:
+				
+				# For all other function calls, just add an entry to the list in the metadata for the vertex
+				graph.nodes[entry['module']]['non_loadlibrary_calls'].append(entry)
+				if self._trackChanges == True:
+					self._changes.append(('call', entry))
+		
+		else:
+			raise RuntimeError('unsupported log entry type "{}"!'.format(entry['type']))
+
+
+class GraphAggregator(object):
+	'''
+	Constructs a collapsed `LoadLibrary()` call hierarchy graph that merges the calls from any number of logs, with a
+	single edge for each combination of calling module, resolved module and function that is annotated with statistics
+	about the calls it represents rather than the details of every individual call
+	'''
+	
+	# The default maximum number of log entries retained as samples for each edge
+	DEFAULT_SAMPLE_SIZE = 5
+	
+	def __init__(self, sampleSize=DEFAULT_SAMPLE_SIZE, callback=None):
+		'''
+		Creates a new, empty aggregate graph.
+		
+		`sampleSize` specifies the maximum number of log entries retained as samples for each edge.
+		`callback` specifies a function to call with the "return" log entry for each completed function call.
+		
+		Each edge is keyed by the name of the function and has the following attributes:
+		- `details`: the first call that was encountered, which is used when displaying the edge
+		- `calls`, `succeeded`, `failed`: the number of calls, successful calls and failed calls
+		- `first_timestamp`, `last_timestamp`: the earliest start timestamp and latest end timestamp of the calls
+		- `samples`: the list of the first calls that were encountered, up to the sample size
+		'''
+		self.graph = nx.MultiDiGraph(runs=0)
+		self.table = InternTable()
+		self._sampleSize = sampleSize
+		self._callback = callback
+		self._builder = None
+		
+		# Keep track of the distinct non-LoadLibrary calls for each vertex so we can filter out duplicates
+		self._seenCalls = {}
+	
+	def addEntry(self, entry):
+		'''
+		Adds the supplied log entry from the current log to the graph
+		'''
+		if self._builder is None:
+			self._builder = GraphBuilder(aggregator=self, callback=self._callback)
+		self._builder.addEntry(entry)
+	
+	def addLog(self, logEntries):
+		'''
+		Adds all of the entries from the supplied iterable of log entries to the graph, as a separate log
+		'''
+		for entry in logEntries:
+			self.addEntry(entry)
+		self.finishLog()
+	
+	def finishLog(self):
+		'''
+		Processes any deferred log entries from the current log and reports any unmatched function calls,
+		so that subsequent log entries are treated as belonging to a separate log
+		'''
+		if self._builder is not None:
+			self._builder.finish()
+			self._builder = None
+			self.graph.graph['runs'] += 1
+	
+	def finish(self):
+		'''
+		Finishes the current log (if any) and returns the aggregate graph
+		'''
+		self.finishLog()
+		return self.graph
+	
+	def addGraph(self, graph):
+		'''
+		Merges the supplied graph into the aggregate graph, which can be either a graph returned by
+		`GraphHelpers.constructGraph()` or another aggregate graph
+		'''
+		for vertex, calls in graph.nodes(data='non_loadlibrary_calls'):
+			self._addVertex(vertex)
+			for call in calls if calls is not None else []:
+				self.addNonLoadLibraryCall(vertex, call)
+		
+		for caller, target, edge in graph.edges(data=True):
+			if 'calls' in edge:
+				self._mergeEdge(caller, target, edge)
+			else:
+				self.addCall(caller, target, edge['details'])
+		
+		self.graph.graph['runs'] += graph.graph.get('runs', 1)
+	
+	def addCall(self, caller, target, entry):
+		'''
+		Merges a single completed LoadLibrary() call into the edge between the specified modules
+		'''
+		succeeded = 1 if entry['result'] != 'NULL' else 0
+		timestamps = [entry.get('timestamp_start', None), entry.get('timestamp_end', entry.get('timestamp_start', None))]
+		self._mergeEdge(caller, target, {
+			'details': entry,
+			'calls': 1,
+			'succeeded': succeeded,
+			'failed': 1 - succeeded,
+			'first_timestamp': timestamps[0],
+			'last_timestamp': timestamps[1],
+			'samples': [entry]
+		})
+	
+	def addNonLoadLibraryCall(self, vertex, entry):
+		'''
+		Adds a single completed non-LoadLibrary() call to the metadata for the specified vertex, unless an identical call has already been added
+		'''
+		self._addVertex(vertex)
+		key = (self.table.intern(entry['function']), self.table.intern(entry['arguments']), self.table.intern(entry['result']))
+		seen = self._seenCalls.setdefault(vertex, set())
+		if key not in seen:
+			seen.add(key)
+			self.graph.nodes[vertex]['non_loadlibrary_calls'].append(self._retain(entry))
+	
+	def _addVertex(self, vertex):
+		'''
+		Creates a vertex for the specified module if we don't already have one
+		'''
+		if vertex not in self.graph:
+			self.graph.add_node(vertex, non_loadlibrary_calls=[])
+	
+	def _mergeEdge(self, caller, target, statistics):
+		'''
+		Merges the supplied edge statistics into the edge between the specified modules, creating the edge if it does not already exist
+		'''
+		self._addVertex(caller)
+		self._addVertex(target)
+		
+		# Create the edge if we don't already have one for the function
+		function = statistics['details']['function']
+		edges = self.graph.get_edge_data(caller, target)
+		if edges is None or function not in edges:
+			self.graph.add_edge(
+				caller,
+				target,
+				key=function,
+				details=self._retain(statistics['details']),
+				calls=0,
+				succeeded=0,
+				failed=0,
+				first_timestamp=None,
+				last_timestamp=None,
+				samples=[]
+			)
+		edge = self.graph[caller][target][function]
+		
+		# Update the counts and timestamps
+		for field in ['calls', 'succeeded', 'failed']:
+			edge[field] += statistics[field]
+		if statistics['first_timestamp'] is not None:
+			edge['first_timestamp'] = statistics['first_timestamp'] if edge['first_timestamp'] is None else min(edge['first_timestamp'], statistics['first_timestamp'])
+		if statistics['last_timestamp'] is not None:
+			edge['last_timestamp'] = statistics['last_timestamp'] if edge['last_timestamp'] is None else max(edge['last_timestamp'], statistics['last_timestamp'])
+		
+		# Retain samples until we reach the sample size
+		for sample in statistics['samples'][:max(0, self._sampleSize - len(edge['samples']))]:
+			edge['samples'].append(self._retain(sample))
+	
+	def _retain(self, entry):
+		'''
+		Converts a log entry into a compact record that shares our intern table (if it does not already), so the entry
+		does not keep alive the intern table of the graph it came from and repeated values are only stored once
+		'''
+		if isinstance(entry, LogRecord):
+			if entry.getTable() is self.table:
+				return entry
+			entry = entry.toDict()
+		return LogRecord(entry, self.table)
+
+
+class GraphProfiler(object):
+	'''
+	Computes the time spent in `LoadLibrary()` and `LdrLoadDll()` calls from the timestamps in a call hierarchy graph
+	'''
+	
+	def __init__(self, graph, startTimestamp=None):
+		'''
+		Profiles the LoadLibrary() calls in the supplied graph, which must not be an aggregate graph.
+		
+		`startTimestamp` specifies the time at which the process was started, if known (otherwise the
+		start of the earliest call is used as the start of the process.)
+		
+		Calls are nested based on their timestamps within each thread, so the inclusive time for a call includes
+		the time spent in any LoadLibrary() calls made while it was in progress (e.g. from DllMain, or the
+		LdrLoadDll() call made by a LoadLibrary() call) and the exclusive time for a call does not.
+		'''
+		
+		# Gather the LoadLibrary() calls for each thread, ignoring any calls without timestamps
+		threads = {}
+		for caller, _, details in graph.edges(data='details'):
+			if details is None or 'timestamp_start' not in details or 'timestamp_end' not in details:
+				continue
+			threads.setdefault(details['thread'], []).append({
+				'caller': caller,
+				'module': GraphProfiler._moduleName(details),
+				'start': details['timestamp_start'],
+				'end': details['timestamp_end']
+			})
+		
+		# Keep track of the totals for each module and each caller, along with the overall totals
+		self.modules = {}
+		self.callers = {}
+		self.calls = 0
+		self.threadTime = 0
+		self.loaderTime = 0
+		self.start = startTimestamp
+		self.end = None
+		self._startKnown = startTimestamp is not None
+		intervals = []
+		
+		for calls in threads.values():
+			
+			# Sort the calls for the thread so that each call is preceded by any calls it is nested within
+			calls.sort(key=lambda call: (call['start'], -call['end']))
+			
+			# Walk the calls while maintaining the stack of calls that are in progress
+			stack = []
+			for call in calls:
+				while len(stack) > 0 and call['end'] > stack[-1]['end']:
+					stack.pop()
+				
+				# Attribute the call's time to the call it is nested within, if any, or treat it as a top-level call
+				call['inclusive'] = call['end'] - call['start']
+				call['children'] = 0
+				if len(stack) > 0:
+					stack[-1]['children'] += call['inclusive']
+				else:
+					self.threadTime += call['inclusive']
+					intervals.append((call['start'], call['end']))
+				
+				# Only count the inclusive time for a module or caller once when calls for the same module or caller
+				# are nested, so that (for example) the LdrLoadDll() call made by a LoadLibrary() call is not counted twice
+				call['outermostModule'] = all([parent['module'] != call['module'] for parent in stack])
+				call['outermostCaller'] = all([parent['caller'] != call['caller'] for parent in stack])
+				stack.append(call)
+			
+			# Accumulate the totals now that the nested time for each call is known
+			for call in calls:
+				exclusive = max(0, call['inclusive'] - call['children'])
+				GraphProfiler._accumulate(self.modules, call['module'], call['inclusive'] if call['outermostModule'] == True else 0, exclusive)
+				GraphProfiler._accumulate(self.callers, call['caller'], call['inclusive'] if call['outermostCaller'] == True else 0, exclusive)
+				self.start = call['start'] if self.start is None else min(self.start, call['start'])
+				self.end = call['end'] if self.end is None else max(self.end, call['end'])
+				self.calls += 1
+		
+		# Compute the wall clock time during which at least one thread was in a LoadLibrary() call
+		current = None
+		for start, end in sorted(intervals):
+			if current is None or start > current[1]:
+				if current is not None:
+					self.loaderTime += current[1] - current[0]
+				current = [start, end]
+			else:
+				current[1] = max(current[1], end)
+		if current is not None:
+			self.loaderTime += current[1] - current[0]
+	
+	def printReport(self, limit):
+		'''
+		Prints the profiling results, listing the specified number of most expensive modules and callers
+		'''
+		print(colored('LoadLibrary() call profile:', color='cyan', attrs=['bold']))
+		if self.calls == 0:
+			print('    No timestamped LoadLibrary() calls were found.\n')
+			return
+		
+		# Print the overall totals
+		elapsed = self.end - self.start
+		OutputFormatting.printRows([
+			('LoadLibrary() calls:', str(self.calls)),
+			('Time from {} to final call:'.format('process start' if self._startKnown == True else 'first call'), GraphProfiler._formatTime(elapsed)),
+			('Wall clock time in loader:', '{} ({:.1f}% of the time until the final call completed)'.format(
+				GraphProfiler._formatTime(self.loaderTime),
+				(100.0 * self.loaderTime / elapsed) if elapsed > 0 else 100.0
+			)),
+			('Time in loader across all threads:', GraphProfiler._formatTime(self.threadTime))
+		], indent=4)
+		print()
+		
+		# Print the most expensive modules and callers
+		for title, column, totals in [('Most expensive modules to load', 'Module', self.modules), ('Callers that spent the most time in the loader', 'Caller', self.callers)]:
+			print(colored('{} (top {} by exclusive time):'.format(title, limit), color='cyan', attrs=['bold']))
+			print('    {:>12} {:>12} {:>8}  {}'.format('Exclusive', 'Inclusive', 'Calls', column))
+			ranked = sorted(totals.items(), key=lambda item: (-item[1]['exclusive'], item[0]))
+			for module, total in ranked[:limit]:
+				print('    {:>12} {:>12} {:>8}  {}'.format(
+					GraphProfiler._formatTime(total['exclusive']),
+					GraphProfiler._formatTime(total['inclusive']),
+					total['calls'],
+					colored(module, color='yellow')
+				))
 			print()
 	
 	@staticmethod
-	def writeToFile(graph, outfile):
+	def _accumulate(totals, key, inclusive, exclusive):
+		'''
+		Adds the time for a single call to the totals for the specified key
+		'''
+		total = totals.setdefault(key, {'calls': 0, 'inclusive': 0, 'exclusive': 0})
+		total['calls'] += 1
+		total['inclusive'] += inclusive
+		total['exclusive'] += exclusive
+	
+	@staticmethod
+	def _formatTime(ticks):
 		'''
-		Writes the supplied graph to file in GraphViz DOT format
+		Formats a duration in timestamp units as milliseconds
 		'''
+		return '{:.3f}ms'.format(ticks / DetourLibrary.TICKS_PER_MILLISECOND)
+	
+	@staticmethod
+	def _moduleName(details):
+		'''
+		Returns the name of the module loaded by a LoadLibrary() call, or the requested name if the call failed
+		'''
+		return details['result'] if details['result'] != 'NULL' else '{} (failed)'.format(details['arguments'][0])
+
+class GraphFollower(object):
+	'''
+	Displays a live view of a `LoadLibrary()` call hierarchy graph as it is constructed from a running process
+	'''
+	
+	def __init__(self, extendedDetails, refreshInterval, outfile=None, snapshotInterval=None, callback=None, outformat=None, edgeAttributes=None):
+		'''
+		Creates a new graph follower.
 		
-		# Use pydot to convert the graph to DOT format
-		dot = nx.drawing.nx_pydot.to_pydot(graph).to_string()
+		`extendedDetails` specifies whether extended information about DLL search parameters should be displayed.
+		`refreshInterval` specifies the minimum number of seconds between printing batches of new vertices and edges.
+		`outfile` specifies the file that snapshots of the graph should be written to, if any.
+		`snapshotInterval` specifies the minimum number of seconds between writing snapshots.
+		`callback` specifies a function to call with the "return" log entry for each completed function call.
+		`outformat` and `edgeAttributes` specify the format of the snapshots and the edge attributes they include.
+		'''
 		
-		# Clean up extraneous vertices
-		# (These are presumably caused by using Windows file paths as vertex names)
-		dot = re.sub('^C;$', '', dot, flags = re.MULTILINE)
-		while '\n\n' in dot:
-			dot = dot.replace('\n\n', '\n')
+		# LdrLoadDll() calls are processed as soon as they are received, since there is no end of the log to wait for
+		self.builder = GraphBuilder(deferLoadDll=False, trackChanges=True, callback=callback)
+		self._extendedDetails = extendedDetails
+		self._refreshInterval = refreshInterval
+		self._outfile = outfile
+		self._outformat = outformat if outformat is not None or outfile is None else GraphWriter.formatForFile(outfile)
+		self._edgeAttributes = edgeAttributes
+		self._snapshotInterval = snapshotInterval
+		self._lastRefresh = time.monotonic()
+		self._lastSnapshot = time.monotonic()
+		self._modified = False
+	
+	def addEntry(self, entry):
+		'''
+		Adds the supplied log entry to the graph and refreshes the display if the refresh interval has elapsed
+		'''
+		self.builder.addEntry(entry)
+		self.update()
+	
+	def update(self, force=False):
+		'''
+		Prints any new vertices and edges and writes a snapshot of the graph if the relevant intervals have elapsed
+		'''
+		now = time.monotonic()
 		
-		# Convert backslashes to forward slashes to avoid confusing GraphViz
-		dot = dot.replace('\\\\', '/').replace('\\', '/')
+		# Print the vertices and edges that have been created since the last refresh
+		if force == True or now - self._lastRefresh >= self._refreshInterval:
+			self._lastRefresh = now
+			changes = self.builder.takeChanges()
+			if len(changes) > 0:
+				self._modified = True
+				self._printChanges(changes)
 		
-		# Write the DOT to the specified output file
-		FileIO.writeFile(outfile, dot)
+		# Write a snapshot of the graph if it has changed since the last snapshot
+		if self._outfile is not None and self._modified == True and (force == True or now - self._lastSnapshot >= self._snapshotInterval):
+			self._lastSnapshot = now
+			self._modified = False
+			self._writeSnapshot()
+	
+	def finish(self):
+		'''
+		Reports any unmatched function calls, prints any remaining changes and returns the completed graph
+		'''
+		graph = self.builder.finish()
+		self.update(force=True)
+		print(flush=True)
+		return graph
+	
+	def _printChanges(self, changes):
+		'''
+		Prints the supplied list of new vertices and edges
+		'''
+		lines = []
+		for change, details in changes:
+			if change == 'vertex':
+				
+				# Ignore the "NULL" vertex that is used to represent failed LoadLibrary() calls
+				if details != 'NULL':
+					lines.append('{} {}'.format(colored('+', color='green', attrs=['bold']), colored(details, color='cyan', attrs=['bold'])))
+			
+			elif change == 'edge':
+				lines.append('    {}: {}'.format(
+					colored(details['module'], color='cyan'),
+					GraphHelpers.formatLoadLibraryCall(details, self._extendedDetails)
+				))
+		
+		print('\n'.join(lines), flush=True)
+	
+	def _writeSnapshot(self):
+		'''
+		Writes a snapshot of the graph to the output file, replacing the previous snapshot atomically
+		so that anything monitoring the file never observes a partially-written snapshot
+		'''
+		temp = '{}.tmp'.format(self._outfile)
+		GraphHelpers.writeToFile(self.builder.graph, temp, self._outformat, self._edgeAttributes)
+		os.replace(temp, self._outfile)
+
+
+class GraphStreamer(object):
+	'''
+	Writes machine-readable records for the vertices, edges and non-LoadLibrary() calls of a `LoadLibrary()` call
+	hierarchy graph as soon as they are created
+	'''
+	
+	def __init__(self, writer, callback=None):
+		'''
+		Creates a new graph streamer.
+		
+		`writer` specifies the `RecordWriter` that the records should be written to.
+		`callback` specifies a function to call with the "return" log entry for each completed function call.
+		'''
+		self.builder = GraphBuilder(trackChanges=True, callback=callback)
+		self._writer = writer
+	
+	def addEntry(self, entry):
+		'''
+		Adds the supplied log entry to the graph and writes the records for any resulting changes
+		'''
+		self.builder.addEntry(entry)
+		self._writeChanges()
+	
+	def finish(self):
+		'''
+		Processes any deferred log entries, writes the records for any remaining changes and returns the completed graph
+		'''
+		graph = self.builder.finish()
+		self._writeChanges()
+		return graph
+	
+	def _writeChanges(self):
+		'''
+		Writes the records for the vertices, edges and non-LoadLibrary() calls that have been created since the last update
+		'''
+		for change, details in self.builder.takeChanges():
+			if change == 'vertex':
+				self._writer.write(GraphHelpers.vertexRecord(details))
+			elif change == 'edge':
+				self._writer.write(GraphHelpers.edgeRecord(details['module'], details['result'], {'details': details}))
+			else:
+				self._writer.write(GraphHelpers.callRecord(details['module'], details))
 
 
 def graph():
 	
 	# Our supported command-line arguments
 	parser = argparse.ArgumentParser(prog='{} trace'.format(sys.argv[0]), prefix_chars='-/')
-	parser.add_argument('module', help='EXE file for which the LoadLibrary() call hierarchy should be inspected')
-	parser.add_argument('-outfile', default=None, help='Generate a GraphViz DOT file representing the call graph')
+	parser.add_argument('module', nargs='?', default=None, help='EXE file for which the LoadLibrary() call hierarchy should be inspected')
+	parser.add_argument('-outfile', default=None, help='Generate a GraphViz DOT, GraphML (.graphml) or node-link JSON (.json) file representing the call graph')
+	parser.add_argument('-outformat', default=None, choices=GraphWriter.FORMATS, help='Format for the file specified by -outfile (default is to infer the format from the file extension, or DOT if unrecognised)')
+	parser.add_argument('-attributes', default=None, help='Comma-separated list of edge attributes to include in the file specified by -outfile (default is "{}")'.format(','.join(GraphWriter.DEFAULT_EDGE_ATTRIBUTES)))
 	parser.add_argument('-timeout', default=None, type=int, help='Forcibly terminate the inspected process after the specified number of seconds')
 	parser.add_argument('--output', '/OUTPUT', action='store_true', help='Print the stdout and stderr output generated by running the EXE file')
 	parser.add_argument('--extended', '/EXTENDED', action='store_true', help='Display extended information about DLL search parameters')
+	parser.add_argument('--follow', '/FOLLOW', action='store_true', help='Print new modules and LoadLibrary() calls as they occur and periodically write the DOT file while the EXE file is running')
+	parser.add_argument('-refresh', default=1.0, type=float, help='Minimum number of seconds between printing updates in follow mode (default is 1 second)')
+	parser.add_argument('-snapshot', default=10.0, type=float, help='Minimum number of seconds between writing DOT file snapshots in follow mode (default is 10 seconds)')
+	parser.add_argument('--save-log', '/SAVELOG', default=None, help='Save the raw instrumentation log to the specified file so it can be replayed later')
+	parser.add_argument('--from-log', '/FROMLOG', default=None, action='append', help='Reconstruct the call hierarchy from a previously-saved instrumentation log instead of running an EXE file (can be specified multiple times with --aggregate)')
+	parser.add_argument('--aggregate', '/AGGREGATE', action='store_true', help='Collapse repeated LoadLibrary() calls into a single edge annotated with call counts, merging the calls from all logs')
+	parser.add_argument('-tracefile', default=None, help='Write each function call to a Chrome trace event JSON file that can be opened in trace viewers such as Perfetto')
+	parser.add_argument('--profile', '/PROFILE', action='store_true', help='Print a profile of the time spent in LoadLibrary() calls, ranking the most expensive modules and callers')
+	parser.add_argument('-top', default=10, type=int, help='Number of modules and callers to list in the profile (default is 10)')
+	parser.add_argument('-samples', default=GraphAggregator.DEFAULT_SAMPLE_SIZE, type=int, help='Maximum number of calls retained as samples for each edge when aggregating (default is {})'.format(GraphAggregator.DEFAULT_SAMPLE_SIZE))
+	HeaderCache.addArguments(parser)
+	RecordWriter.addArguments(parser)
 	
 	# If no command-line arguments were supplied, display the help message and exit
 	if len(sys.argv) < 2:
@@ -294,65 +914,148 @@ def graph():
 	
 	# Parse the supplied command-line arguments
 	args, run_args = parser.parse_known_args()
+	HeaderCache.configure(args)
+	if args.module is None and args.from_log is None:
+		parser.error('either a module or --from-log must be specified')
+	if args.module is not None and args.from_log is not None:
+		parser.error('a module cannot be specified when replaying a log with --from-log')
+	if args.from_log is not None and len(args.from_log) > 1 and args.aggregate == False:
+		parser.error('--aggregate must be specified when replaying multiple logs')
+	if args.aggregate == True and args.follow == True:
+		parser.error('--aggregate cannot be used in combination with --follow')
+	if args.aggregate == True and args.profile == True:
+		parser.error('--profile requires the timestamps of individual calls and cannot be used in combination with --aggregate')
+	if args.format != 'text' and args.follow == True:
+		parser.error('--follow cannot be used in combination with --format {}, since records are already written as they are produced'.format(args.format))
+	
+	# If a machine-readable output format was requested then write records to stdout and everything else to stderr
+	writer = RecordWriter.configure(args)
 	
+	traceWriter = None
 	try:
 		
-		# Ensure the module path is an absolute path
-		args.module = os.path.abspath(args.module)
+		# Parse the list of edge attributes to include in the output file, if specified
+		edgeAttributes = [a.strip() for a in args.attributes.split(',') if len(a.strip()) > 0] if args.attributes is not None else None
 		
-		# Determine the architecture of the module
-		print('Parsing module header and detecting architecture... ', end='')
-		header = ModuleHeader(args.module)
-		architecture = header.getArchitecture()
-		print('done.\n')
+		# If requested, stream each completed function call to a trace event file as soon as it is paired with its return value
+		callback = None
+		if args.tracefile is not None:
+			traceWriter = TraceEventWriter(args.tracefile, os.path.basename(args.module) if args.module is not None else None)
+			callback = traceWriter.addCall
 		
-		# Display the module details
-		print('Parsed module details:')
-		OutputFormatting.printModuleDetails(header)
-		print()
+		# Construct the call hierarchy graph from the instrumentation log entries as they are received
+		if args.follow == True:
+			builder = GraphFollower(args.extended, args.refresh, args.outfile, args.snapshot, callback=callback, outformat=args.outformat, edgeAttributes=edgeAttributes)
+		elif args.aggregate == True:
+			builder = GraphAggregator(args.samples, callback=callback)
+		elif writer is not None:
+			builder = GraphStreamer(writer, callback=callback)
+		else:
+			builder = GraphBuilder(callback=callback)
 		
-		# Verify that the module is an executable
-		if header.getType() != 'Executable':
-			raise RuntimeError('the module file "{}" is not an executable!'.format(args.module))
-		
-		# Attempt to run the executable with our instrumentation DLL injected to log LoadLibrary() calls
-		logEntries = []
-		try:
-			print('Running executable {} with arguments {}{} and instrumenting all LoadLibrary() calls...\n'.format(
-				args.module,
-				run_args,
-				', {} second timeout'.format(args.timeout) if args.timeout is not None else ''
-			), flush=True)
-			detour = DetourLibrary(architecture, 'loadlibrary')
-			result = detour.run(args.module, run_args, timeout=args.timeout)
-			logEntries = result.log
-		except:
-			raise RuntimeError('failed to run instrumented executable!')
-		
-		# Construct the call hierarchy graph from the instrumentation log entries
-		graph = GraphHelpers.constructGraph(logEntries)
-		
-		# Print a pretty summary
-		GraphHelpers.printSummary(graph, args.extended)
-		
-		# Dump the graph to a GraphViz DOT file if an output filename was specified
+		# Determine if we are replaying previously-saved instrumentation logs rather than running the executable
+		if args.from_log is not None:
+			for logFile in args.from_log:
+				print('Reading instrumentation log entries from "{}"...\n'.format(logFile), flush=True)
+				try:
+					for entry in DetourLibrary.readLog(logFile):
+						builder.addEntry(entry)
+				except ValueError as e:
+					raise RuntimeError('failed to parse instrumentation log "{}": {}'.format(logFile, e))
+				
+				# Treat the entries from each log separately when aggregating
+				if args.aggregate == True:
+					builder.finishLog()
+			result = None
+			
+		else:
+			
+			# Ensure the module path is an absolute path
+			args.module = os.path.abspath(args.module)
+			
+			# Determine the architecture of the module
+			print('Parsing module header and detecting architecture... ', end='')
+			header = ModuleHeader(args.module)
+			architecture = header.getArchitecture()
+			print('done.\n')
+			
+			# Display the module details
+			if writer is not None:
+				writer.write(RecordWriter.moduleRecord(header))
+			else:
+				print('Parsed module details:')
+				OutputFormatting.printModuleDetails(header)
+				print()
+			
+			# Verify that the module is an executable
+			if header.getType() != 'Executable':
+				raise RuntimeError('the module file "{}" is not an executable!'.format(args.module))
+			
+			# Attempt to run the executable with our instrumentation DLL injected to log LoadLibrary() calls
+			try:
+				print('Running executable {} with arguments {}{} and instrumenting all LoadLibrary() calls...\n'.format(
+					args.module,
+					run_args,
+					', {} second timeout'.format(args.timeout) if args.timeout is not None else ''
+				), flush=True)
+				detour = DetourLibrary(architecture, 'loadlibrary')
+				result = detour.run(
+					args.module,
+					run_args,
+					timeout=args.timeout,
+					callback=builder.addEntry,
+					idleCallback=builder.update if args.follow == True else None,
+					saveLog=args.save_log
+				)
+			except KeyboardInterrupt:
+				
+				# If we were interrupted (e.g. with Ctrl-C) then stop following and report the calls that were logged before the process was stopped
+				print('\nInterrupted, the instrumented executable has been stopped.\n', flush=True)
+				result = None
+			except Exception as e:
+				raise RuntimeError('failed to run instrumented executable: {}'.format(e))
+		
+		# Process any deferred log entries and retrieve the completed graph
+		graph = builder.finish()
+		
+		# Finish writing the trace event file, if any
+		if traceWriter is not None:
+			print('Wrote trace events to "{}".\n'.format(args.tracefile), flush=True)
+			traceWriter.close()
+		
+		# Print a pretty summary, or write the records for the aggregate graph, which can only be written once all logs have been merged
+		if writer is None:
+			GraphHelpers.printSummary(graph, args.extended)
+		elif args.aggregate == True:
+			GraphHelpers.writeRecords(graph, writer)
+		
+		# Print the profile of the time spent in LoadLibrary() calls if requested
+		if args.profile == True:
+			GraphProfiler(graph, result.timestamp if result is not None else None).printReport(args.top)
+		
+		# Dump the graph to a file if an output filename was specified
 		if args.outfile is not None:
-			print('Writing GraphViz DOT representation to "{}"...'.format(args.outfile), flush=True)
-			GraphHelpers.writeToFile(graph, args.outfile)
+			outformat = args.outformat if args.outformat is not None else GraphWriter.formatForFile(args.outfile)
+			print('Writing {} representation to "{}"...'.format({'dot': 'GraphViz DOT', 'graphml': 'GraphML', 'json': 'node-link JSON'}[outformat], args.outfile), flush=True)
+			GraphHelpers.writeToFile(graph, args.outfile, outformat, edgeAttributes)
 		
 		# Print the stdout and stderr from the executable if requested
-		if args.output == True:
+		if args.output == True and result is not None:
 			print(colored('\nApplication stdout:', color='cyan'))
 			print(result.stdout)
 			print(colored('\nApplication stderr:', color='cyan'))
 			print(result.stderr)
-		
+	
 	except RuntimeError as e:
 		print('Error: {}'.format(e))
+		if writer is not None:
+			writer.write({'record': 'error', 'message': str(e)})
 		sys.exit(1)
-
-
-DESCRIPTOR = {
-	'function': graph,
-	'description': 'Executes a module with instrumentation to log LoadLibrary() calls and reconstructs the call hierarchy'
-}
+	
+	finally:
+		
+		# Ensure the trace event file and the machine-readable output are always complete documents, even if an error occurred
+		if traceWriter is not None:
+			traceWriter.close()
+		if writer is not None:
+			writer.close()
@@ -0,0 +1,244 @@
+from ..common import DetourLibrary, FileIO, OutputFormatting, RecordWriter
+from .graph import GraphHelpers
+from termcolor import colored
+import argparse, contextlib, io, json, os, re, sys
+
+
+class GraphDiffHelpers(object):
+	'''
+	Helper functionality for comparing `LoadLibrary()` call hierarchy graphs
+	'''
+	
+	# Matches the start of a graph file in node-link JSON format, as distinct from an instrumentation log
+	NODE_LINK_PATTERN = re.compile(r'\s*\{\s*"directed"\s*:')
+	
+	@staticmethod
+	def canonicalEdges(graph):
+		'''
+		Reduces the edges of a call hierarchy graph to a dictionary mapping canonical (caller, target, function)
+		keys to the set of outcomes observed for each call, where the caller and target are case-normalised
+		and the target is the name of the module that was requested rather than the module it resolved to
+		'''
+		edges = {}
+		for caller, _, details in graph.edges(data='details'):
+			key = (caller.casefold(), str(details['arguments'][0]).casefold(), details['function'])
+			edges.setdefault(key, set()).add(details['result'] != 'NULL')
+		return edges
+	
+	@staticmethod
+	def canonicalLinks(data, graphFile):
+		'''
+		Reduces the links of a call hierarchy graph in node-link JSON format to canonical edges, as per `canonicalEdges()`.
+		
+		The requested module and the outcome of each call are taken from the "arguments" and "result" attributes if the
+		graph includes them (e.g. when written by `graph -attributes function,arguments,result`), otherwise the target is
+		the resolved module and the outcome is taken from the call counts of aggregate edges or from the "NULL" vertex
+		that failed calls point to.
+		'''
+		edges = {}
+		for link in data.get('links', []):
+			details = link.get('details', link)
+			if 'function' not in details:
+				raise RuntimeError('the links in graph file "{}" do not include the "function" attribute'.format(graphFile))
+			target = details['arguments'][0] if 'arguments' in details else link['target']
+			key = (str(link['source']).casefold(), str(target).casefold(), details['function'])
+			outcomes = edges.setdefault(key, set())
+			if 'result' in details:
+				outcomes.add(details['result'] != 'NULL')
+			elif 'succeeded' in link or 'failed' in link:
+				outcomes.update([outcome for outcome, count in [(True, link.get('succeeded', 0)), (False, link.get('failed', 0))] if count > 0])
+			else:
+				outcomes.add(link['target'] != 'NULL')
+		return edges
+	
+	@staticmethod
+	def compare(before, after):
+		'''
+		Compares the canonical edges of two call hierarchy graphs and returns a dictionary containing the sorted lists
+		of edges that were added, removed, or whose outcome changed between the baseline graph and the current graph
+		'''
+		
+		# Identify the edges that are only present in one of the graphs or whose outcomes differ
+		added = [key + (after[key],) for key in after.keys() - before.keys()]
+		removed = [key + (before[key],) for key in before.keys() - after.keys()]
+		changed = [key + (before[key], after[key]) for key in after.keys() & before.keys() if before[key] != after[key]]
+		
+		return {
+			'added': [GraphDiffHelpers._formatEdge(edge) for edge in sorted(added, key=lambda e: e[:3])],
+			'removed': [GraphDiffHelpers._formatEdge(edge) for edge in sorted(removed, key=lambda e: e[:3])],
+			'changed': [GraphDiffHelpers._formatEdge(edge) for edge in sorted(changed, key=lambda e: e[:3])]
+		}
+	
+	@staticmethod
+	def formatOutcome(outcomes):
+		'''
+		Formats a set of call outcomes as a human-readable string
+		'''
+		if outcomes == set([True]):
+			return 'succeeded'
+		elif outcomes == set([False]):
+			return 'failed'
+		else:
+			return 'succeeded and failed'
+	
+	@staticmethod
+	def formatText(differences, colour=colored):
+		'''
+		Formats the results of a comparison as human-readable text
+		
+		`colour` specifies the function used to colour text (use `OutputFormatting.uncoloured` to produce plain text.)
+		'''
+		lines = []
+		for title, highlight, sign in [('Added', 'green', '+'), ('Removed', 'red', '-'), ('Changed', 'yellow', '~')]:
+			edges = differences[title.lower()]
+			lines.append(colour('{} edges ({}):'.format(title, len(edges)), color=highlight, attrs=['bold']))
+			for edge in edges:
+				outcome = edge['outcome'] if 'outcome' in edge else '{} -> {}'.format(edge['before'], edge['after'])
+				lines.append('  {} {} -> {} "{}" ({})'.format(
+					colour(sign, color=highlight),
+					edge['caller'],
+					GraphHelpers.formatFunctionName(edge, colour),
+					edge['target'],
+					outcome
+				))
+			lines.append('')
+		return '\n'.join(lines)
+	
+	@staticmethod
+	def isGraphFile(filename):
+		'''
+		Determines whether the specified file is a graph in node-link JSON format rather than an instrumentation log
+		'''
+		with open(filename, 'r', encoding='utf-8', errors='replace') as f:
+			return GraphDiffHelpers.NODE_LINK_PATTERN.match(f.read(4096)) is not None
+	
+	@staticmethod
+	def loadEdges(filename):
+		'''
+		Loads the canonical edges from a saved instrumentation log or a graph file in node-link JSON format,
+		returning the edges along with any warnings
+		'''
+		if os.path.exists(filename) == False:
+			raise RuntimeError('the file "{}" does not exist'.format(filename))
+		if GraphDiffHelpers.isGraphFile(filename) == True:
+			try:
+				return GraphDiffHelpers.canonicalLinks(json.loads(FileIO.readFile(filename)), filename), ''
+			except (ValueError, KeyError, IndexError, TypeError) as e:
+				raise RuntimeError('failed to parse graph file "{}": {}'.format(filename, e))
+		
+		graph, warnings = GraphDiffHelpers.loadGraph(filename)
+		return GraphDiffHelpers.canonicalEdges(graph), warnings
+	
+	@staticmethod
+	def loadGraph(logFile):
+		'''
+		Constructs a call hierarchy graph from a saved instrumentation log, returning the graph along with any warnings
+		'''
+		warnings = io.StringIO()
+		try:
+			with contextlib.redirect_stdout(warnings):
+				graph = GraphHelpers.constructGraph(DetourLibrary.readLog(logFile))
+		except ValueError as e:
+			raise RuntimeError('failed to parse instrumentation log "{}": {}'.format(logFile, e))
+		return graph, warnings.getvalue()
+	
+	@staticmethod
+	def writeRecords(differences, writer):
+		'''
+		Writes a machine-readable record for each of the differences from a comparison to the supplied `RecordWriter`,
+		followed by a summary record with the number of differences of each kind
+		'''
+		for change in ['added', 'removed', 'changed']:
+			for edge in differences[change]:
+				record = {'record': change}
+				record.update(edge)
+				writer.write(record)
+		writer.write({'record': 'summary', 'added': len(differences['added']), 'removed': len(differences['removed']), 'changed': len(differences['changed'])})
+	
+	@staticmethod
+	def _formatEdge(edge):
+		'''
+		Converts a canonical edge tuple into a dictionary suitable for serialisation
+		'''
+		formatted = {'caller': edge[0], 'target': edge[1], 'function': edge[2]}
+		if len(edge) == 4:
+			formatted['outcome'] = GraphDiffHelpers.formatOutcome(edge[3])
+		else:
+			formatted['before'] = GraphDiffHelpers.formatOutcome(edge[3])
+			formatted['after'] = GraphDiffHelpers.formatOutcome(edge[4])
+		return formatted
+
+
+def graphdiff():
+	
+	# Our supported command-line arguments
+	parser = argparse.ArgumentParser(prog='{} graph-diff'.format(sys.argv[0]))
+	parser.add_argument('baseline', help='Instrumentation log saved by `graph --save-log`, or graph file in node-link JSON format, for the baseline run')
+	parser.add_argument('current', help='Instrumentation log saved by `graph --save-log`, or graph file in node-link JSON format, for the run to compare against the baseline')
+	parser.add_argument('-outfile', default=None, help='Write the differences to the specified file instead of printing them')
+	parser.add_argument('--exit-code', action='store_true', help='Exit with a status code of 2 if there are any differences (useful for CI gating)')
+	RecordWriter.addArguments(parser)
+	
+	# If no command-line arguments were supplied, display the help message and exit
+	if len(sys.argv) < 2:
+		parser.print_help()
+		sys.exit(0)
+	
+	# Parse the supplied command-line arguments
+	args = parser.parse_args()
+	
+	# Write records to the output file if one was specified, otherwise write them to stdout and redirect all other output to stderr
+	outfile = None
+	if args.format != 'text' and args.outfile is not None:
+		outfile = open(args.outfile, 'w', encoding='utf-8', newline='')
+		writer = RecordWriter(args.format, outfile)
+	else:
+		writer = RecordWriter.configure(args)
+	
+	try:
+		
+		# Load the canonical edges from the saved instrumentation logs or graph files, reporting any warnings
+		edges = []
+		for filename in [args.baseline, args.current]:
+			loaded, warnings = GraphDiffHelpers.loadEdges(filename)
+			if len(warnings) > 0:
+				OutputFormatting.printWarning('the following issues were encountered when processing "{}":'.format(filename))
+				print(warnings, end='', flush=True)
+			edges.append(loaded)
+		
+		# Compare the graphs
+		differences = GraphDiffHelpers.compare(edges[0], edges[1])
+		
+		# Write the differences as records, or format them as text and write them to the output file or print them
+		if writer is not None:
+			GraphDiffHelpers.writeRecords(differences, writer)
+		elif args.outfile is not None:
+			FileIO.writeFile(args.outfile, GraphDiffHelpers.formatText(differences, OutputFormatting.uncoloured))
+		else:
+			print(GraphDiffHelpers.formatText(differences, colored if OutputFormatting.supportsColour(sys.stdout) == True else OutputFormatting.uncoloured), end='', flush=True)
+		
+		# Print a summary of the number of differences (which goes to stderr when records are written to stdout)
+		total = sum([len(changes) for changes in differences.values()])
+		print('{} added, {} removed, {} changed.'.format(
+			len(differences['added']),
+			len(differences['removed']),
+			len(differences['changed'])
+		), flush=True)
+		
+		# Signal that there were differences if requested
+		if args.exit_code == True and total > 0:
+			sys.exit(2)
+	
+	except RuntimeError as e:
+		print('Error: {}'.format(e))
+		if writer is not None:
+			writer.write({'record': 'error', 'message': str(e)})
+		sys.exit(1)
+	
+	finally:
+		
+		# Ensure the machine-readable output is always a complete document, even if an error occurred
+		if writer is not None:
+			writer.close()
+		if outfile is not None:
+			outfile.close()
@@ -0,0 +1,96 @@
+from ..common import HeaderCache, ImageIndex, OutputFormatting
+from termcolor import colored
+import argparse, os, sys
+
+
+class IndexHelpers(object):
+	'''
+	Helper functionality for building and querying image indexes
+	'''
+	
+	@staticmethod
+	def formatModule(module):
+		'''
+		Formats the details of a module returned by `ImageIndex.lookup()` for display
+		'''
+		return '{}    {}    {}    {} bytes    {}'.format(
+			module['path'],
+			module['architecture'] if module['architecture'] is not None else 'unknown architecture',
+			'version {}'.format(module['version']) if module['version'] is not None else 'no version',
+			module['size'],
+			module['hash']
+		)
+
+
+def index():
+	
+	# Our supported command-line arguments
+	parser = argparse.ArgumentParser(prog='{} index'.format(sys.argv[0]))
+	parser.add_argument('indexes', nargs='+', help='Index database files to build or query')
+	parser.add_argument('--build', default=None, metavar='ROOT', help='Build the index from the mounted or extracted Windows image tree in the specified directory')
+	parser.add_argument('--prefix', default='C:\\', help='Path inside the image that corresponds to the directory specified by --build (default is C:\\)')
+	parser.add_argument('--label', default=None, help='Descriptive label for the image when using --build, such as its tag (default is the name of the directory)')
+	parser.add_argument('--jobs', default=None, type=int, help='Number of worker processes to use with --build (default is the number of CPU cores)')
+	parser.add_argument('--find', action='append', default=[], metavar='DLL', help='List the modules with the specified filename in each index (can be specified multiple times)')
+	HeaderCache.addArguments(parser)
+	
+	# If no command-line arguments were supplied, display the help message and exit
+	if len(sys.argv) < 2:
+		parser.print_help()
+		sys.exit(0)
+	
+	# Parse the supplied command-line arguments
+	args = parser.parse_args()
+	HeaderCache.configure(args)
+	if args.build is not None and len(args.indexes) != 1:
+		parser.error('exactly one index file must be specified when using --build')
+	
+	try:
+		
+		# Build the index if requested
+		if args.build is not None:
+			print('Indexing the modules in {}... '.format(os.path.abspath(args.build)), end='', flush=True)
+			built, errors = ImageIndex.build(os.path.abspath(args.build), args.indexes[0], args.prefix, args.label, args.jobs)
+			print('done.\n')
+			if len(errors) > 0:
+				OutputFormatting.printWarning('the following modules could not be parsed:')
+				OutputFormatting.printRows(sorted(errors.items()), spacing=4, indent=2)
+				print()
+			print('Wrote index of {} modules to {}\n'.format(len(built), args.indexes[0]), flush=True)
+			built.close()
+		
+		# Open each of the indexes
+		indexes = [ImageIndex(filename) for filename in args.indexes]
+		
+		# If no DLLs were specified then print the details of each index
+		if len(args.find) == 0:
+			for opened in indexes:
+				OutputFormatting.printRows([
+					('Index:', opened.filename),
+					('Image:', opened.metadata.get('label', '')),
+					('Prefix:', opened.metadata.get('prefix', '')),
+					('Created:', opened.metadata.get('created', '')),
+					('Modules:', str(len(opened)))
+				], spacing=4)
+				print()
+		
+		# List the modules with each of the specified filenames in each of the indexes
+		for dll in args.find:
+			print('{}:'.format(colored(dll, color='cyan', attrs=['bold'])))
+			rows = []
+			for opened in indexes:
+				for module in opened.lookup(dll):
+					rows.append((opened.metadata.get('label', opened.filename), IndexHelpers.formatModule(module)))
+			if len(rows) > 0:
+				OutputFormatting.printRows(rows, spacing=4, indent=2)
+			else:
+				print(colored('  Not found in any of the specified images', color='red'))
+			print()
+		
+		sys.stdout.flush()
+		for opened in indexes:
+			opened.close()
+	
+	except RuntimeError as e:
+		print('Error: {}'.format(e))
+		sys.exit(1)
@@ -1,7 +1,8 @@
-from ..common import CommonErrors, HelperProcess, ModuleHeader, OutputFormatting, StringUtils, WindowsDebugger
+from ..common import CommonErrors, HeaderCache, HelperProcess, ModuleHeader, OutputFormatting, RecordWriter, StringUtils, WindowsApi, WindowsDebugger
 from termcolor import colored
+from collections import deque
 from ctypes import *
-import argparse, os, sys
+import argparse, io, os, sys
 
 
 class CallTrace(object):
@@ -22,6 +23,17 @@ class CallTrace(object):
 			self.dll,
 			': {}'.format(self.result) if self.result is not None else ''
 		)
+	
+	def toDict(self):
+		'''
+		Returns a machine-readable representation of the function call
+		'''
+		return {
+			'prefix': self.prefix,
+			'function': self.function,
+			'dll': self.dll,
+			'result': self.result
+		}
 
 
 class TraceHelpers(object):
@@ -88,79 +100,218 @@ class TraceHelpers(object):
 		return colored(call.dll, color='green') if call.result == 0 else OutputFormatting.formatColouredResult(call.result, [call.dll])
 	
 	@staticmethod
-	def performTrace(debugger, helper, module, architecture, cwd, args=[]):
+	def summaryRecord(function, dll, result, resolved=None):
 		'''
-		Performs a `LoadLibrary()` trace with loader snaps enabled
+		Creates a machine-readable record for the aggregated result of the calls to the specified function for a DLL,
+		including the path that the DLL was resolved to for `LdrpResolveDllName` calls
+		'''
+		record = {
+			'record': 'summary',
+			'function': function,
+			'dll': dll,
+			'succeeded': result == 0,
+			'error': result,
+			'message': WindowsApi.formatError(result, [dll]) if result != 0 else None
+		}
+		if function == 'LdrpResolveDllName':
+			record['resolved'] = resolved if result == 0 else None
+		return record
+	
+	@staticmethod
+	def writeCalls(writer, module, calls):
+		'''
+		Writes a machine-readable record for each of the function calls from the trace for the specified module
+		'''
+		for call in calls:
+			record = {'record': 'call', 'module': module}
+			record.update(call.toDict())
+			writer.write(record)
+	
+	@staticmethod
+	def extractTraceLines(output, raw, startMarker='[LOADLIBRARY][START]', endMarker='[LOADLIBRARY][END]'):
 		'''
+		Yields the lines of debugger output that fall between the start and end markers, so we avoid parts of the
+		trace that relate purely to loading the helper executable rather than loading the module we are interested in.
 		
-		# Load NTDLL.DLL so we can use the RtlNtStatusToDosError() function to map NTSTATUS codes to Windows API error codes
-		ntdll = cdll.LoadLibrary('ntdll')
+		`output` specifies an iterable of output lines.
+		`raw` specifies a list that the raw text between the markers will be appended to.
+		'''
 		
-		# Run our library loader helper through the debugger with loader snaps enabled
-		result = debugger.debugWithLoaderSnaps(architecture, helper.executable, [module], cwd=cwd)
+		# Skip over the lines that precede the start marker
+		lines = iter(output)
+		for line in lines:
+			if startMarker in line:
+				line = line[line.index(startMarker) + len(startMarker):]
+				break
+		else:
+			raise RuntimeError('could not locate the trace start marker "{}" in the debugger output'.format(startMarker))
 		
-		# Locate the start and end markers in the debugger stdout so we avoid parts of the trace that relate
-		# purely to loading the helper executable rather than loading the module we are interested in
-		startMarker = '[LOADLIBRARY][START]'
-		endMarker = '[LOADLIBRARY][END]'
-		start = result.stdout.index(startMarker) + len(startMarker)
-		end = result.stdout.index(endMarker)
-		subset = result.stdout[start:end]
+		# Yield each line until we reach the end marker, including any text that follows the start marker on the same line
+		while True:
+			line = line.rstrip('\r\n')
+			if endMarker in line:
+				raw.append(line[:line.index(endMarker)])
+				yield raw[-1]
+				return
+			
+			raw.append(line + '\n')
+			yield line
+			line = next(lines, None)
+			if line is None:
+				raise RuntimeError('could not locate the trace end marker "{}" in the debugger output'.format(endMarker))
+	
+	@staticmethod
+	def parseLines(lines):
+		'''
+		Parses the lines of a loader snaps trace, yielding the parsed details of each line that relates to the functions we are interested in
+		'''
+		whitelist = set(TraceHelpers.getFunctionWhitelist())
+		for line in lines:
+			
+			# Split the line into prefix, function name, and details
+			components = line.split(' - ', 2)
+			if len(components) == 3 and components[1] in whitelist:
+				yield TraceHelpers.parseLine(components[0], components[1], components[2])
+	
+	@staticmethod
+	def pairCalls(parsedLines, mapStatus, window=256):
+		'''
+		Pairs the ENTER and RETURN lines of a loader snaps trace in a single pass, returning the list of CallTrace
+		objects for all function calls along with their return values, where `mapStatus` maps NTSTATUS codes to
+		Windows API error codes.
 		
-		# Split each line into prefix, function name, and details
-		lines = [line.split(' - ', 2) for line in subset.replace('\r\n', '\n').split('\n')]
+		RETURN lines that precede their corresponding ENTER lines are pushed back two lines at a time until
+		a match is found or they have been pushed back beyond `window` lines, at which point they are dropped.
+		'''
 		
-		# Isolate the lines related to the functions we are interested in
-		lines = [line for line in lines if len(line) == 3 and line[1] in TraceHelpers.getFunctionWhitelist()]
+		# Maintain a stack of pending function calls for each combination of thread prefix and function name
+		# (We always match a RETURN line with the most recent ENTER line for the same thread and function)
+		calls = []
+		pending = {}
 		
-		# Parse the details of each line
-		parsedLines = [TraceHelpers.parseLine(line[0], line[1], line[2]) for line in lines]
+		# Buffer only as many lines as we need in order to reorder RETURN lines that have been pushed back
+		parsedLines = iter(parsedLines)
+		queue = deque()
+		def fill(count):
+			while len(queue) < count:
+				parsed = next(parsedLines, None)
+				if parsed is None:
+					return
+				queue.append((parsed, 0))
 		
-		# Pair the ENTER and RETURN lines to determine the return values for each function call
-		calls = []
-		pending = []
-		while len(parsedLines) > 0:
+		while True:
+			
+			# Retrieve the next line, stopping once all lines have been consumed
+			fill(1)
+			if len(queue) == 0:
+				return calls
+			parsed, deferrals = queue.popleft()
+			key = (parsed['prefix'], parsed['function'])
 			
 			# Determine if this is an ENTER line or a RETURN line
-			parsed = parsedLines.pop(0)
 			if parsed['operation'] == 'ENTER':
 				
 				# Create a CallTrace object for the function call
 				trace = CallTrace(parsed['prefix'], parsed['function'], parsed['dll'], parsed['result'])
 				calls.append(trace)
-				pending.append(trace)
-				
-			else:
+				pending.setdefault(key, []).append(trace)
+				continue
+			
+			# Attempt to match the RETURN line to its corresponding ENTER line
+			matches = pending.get(key, [])
+			if len(matches) > 0:
 				
-				# Attempt to match the RETURN line to its corresponding ENTER line
-				matches = [c for c in reversed(pending) if parsed['prefix'] == c.prefix and parsed['function'] == c.function]
-				if len(matches) > 0:
-					
-					# Match found, update the result value
-					match = matches[0]
-					match.result = ntdll.RtlNtStatusToDosError(int(parsed['result'], 16))
-					pending.remove(match)
-					
-				elif len(parsedLines) > 1:
-					
-					# Match not found but there are other lines remaining, so push this one back in the queue
+				# Match found, update the result value
+				match = matches.pop()
+				match.result = mapStatus(int(parsed['result'], 16))
+				if len(matches) == 0:
+					del pending[key]
+				continue
+			
+			# Match not found, so push this line back in the queue if there are other lines remaining and it is still within the window
+			fill(2)
+			if len(queue) > 1 and (deferrals + 1) * 2 <= window:
+				if deferrals == 0:
 					OutputFormatting.printWarning('encountered a RETURN trace line before its corresponding ENTER line')
-					parsedLines.insert(2, parsed)
-					
-				else:
-					
-					# Match not found and no other lines left, so we have no choice but to simply drop the line
-					OutputFormatting.printWarning('dropped a RETURN trace line because no corresponding ENTER line could be found')
-		
-		# Report any function calls for which we did not find a return value
+				queue.insert(2, (parsed, deferrals + 1))
+			else:
+				OutputFormatting.printWarning('dropped a RETURN trace line because no corresponding ENTER line could be found')
+	
+	@staticmethod
+	def parseBatchOutput(output, modules, mapStatus):
+		'''
+		Splits the debugger output from a batch mode trace into the traces for each of the specified modules, using the
+		per-module markers printed by our library loader helper. Returns a list of (module, raw output, calls) tuples.
+		
+		`output` specifies an iterable of output lines.
+		`mapStatus` specifies a function that maps NTSTATUS codes to Windows API error codes.
+		'''
+		
+		# Consume the output in a single pass, since the markers for each module appear in the same order as the modules
+		lines = iter(output)
+		traces = []
+		for index, module in enumerate(modules):
+			raw = []
+			moduleLines = TraceHelpers.extractTraceLines(
+				lines,
+				raw,
+				startMarker='[LOADLIBRARY][START][{}]'.format(index),
+				endMarker='[LOADLIBRARY][END][{}]'.format(index)
+			)
+			calls = TraceHelpers.pairCalls(TraceHelpers.parseLines(moduleLines), mapStatus)
+			traces.append((module, ''.join(raw), calls))
+		
+		return traces
+	
+	@staticmethod
+	def filterUnresolved(calls):
+		'''
+		Reports any function calls for which we did not find a return value and returns the list of calls for which we did
+		'''
 		unresolved = [c for c in calls if c.result is None]
-		calls = [c for c in calls if c.result is not None]
 		if len(unresolved) > 0:
 			OutputFormatting.printWarning('return values could not be found for the following function calls:')
 			print(colored('- ' + '\n- '.join([str(c) for c in unresolved]) + '\n', color='yellow'), flush=True)
 		
+		return [c for c in calls if c.result is not None]
+	
+	@staticmethod
+	def performTrace(debugger, helper, module, architecture, cwd, args=[]):
+		'''
+		Performs a `LoadLibrary()` trace with loader snaps enabled
+		'''
+		
+		# Load NTDLL.DLL so we can use the RtlNtStatusToDosError() function to map NTSTATUS codes to Windows API error codes
+		ntdll = cdll.LoadLibrary('ntdll')
+		
+		# Run our library loader helper through the debugger with loader snaps enabled
+		result = debugger.debugWithLoaderSnaps(architecture, helper.executable, [module], cwd=cwd)
+		
+		# Parse the trace output and pair the ENTER and RETURN lines to determine the return values for each function call
+		raw = []
+		lines = TraceHelpers.extractTraceLines(io.StringIO(result.stdout), raw)
+		calls = TraceHelpers.pairCalls(TraceHelpers.parseLines(lines), ntdll.RtlNtStatusToDosError)
+		
 		# Return the raw trace output and the list of calls for which a return value was found
-		return (subset + result.stderr, calls)
+		return (''.join(raw) + result.stderr, TraceHelpers.filterUnresolved(calls))
+	
+	@staticmethod
+	def performBatchTrace(debugger, helper, modules, architecture, cwd):
+		'''
+		Performs `LoadLibrary()` traces for multiple modules in a single debugger session with loader snaps enabled,
+		returning the combined raw trace output and a list of (module, calls) tuples
+		'''
+		
+		# Load NTDLL.DLL so we can use the RtlNtStatusToDosError() function to map NTSTATUS codes to Windows API error codes
+		ntdll = cdll.LoadLibrary('ntdll')
+		
+		# Run our library loader helper through the debugger in batch mode with loader snaps enabled
+		result = debugger.debugWithLoaderSnaps(architecture, helper.executable, ['--batch'] + modules, cwd=cwd)
+		
+		# Split the trace output by module and determine the return values for each module's function calls
+		traces = TraceHelpers.parseBatchOutput(io.StringIO(result.stdout), modules, ntdll.RtlNtStatusToDosError)
+		rawOutput = ''.join([raw for _, raw, _ in traces]) + result.stderr
+		return (rawOutput, [(module, TraceHelpers.filterUnresolved(calls)) for module, _, calls in traces])
 
 
 def trace():
@@ -170,6 +321,9 @@ def trace():
 	parser.add_argument('module', help='DLL or EXE file for which LoadLibrary() call should be traced')
 	parser.add_argument('--raw', '/RAW', action='store_true', help='Print raw trace output in addition to summary info')
 	parser.add_argument('--no-delay-load', '/NODELAY', action='store_true', help='Don\'t perform traces for the module\'s delay-loaded dependencies')
+	parser.add_argument('--separate', '/SEPARATE', action='store_true', help='Run a separate debugger session for each module rather than tracing all modules in a single session')
+	HeaderCache.addArguments(parser)
+	RecordWriter.addArguments(parser)
 	
 	# If no command-line arguments were supplied, display the help message and exit
 	if len(sys.argv) < 2:
@@ -178,6 +332,10 @@ def trace():
 	
 	# Parse the supplied command-line arguments
 	args = parser.parse_args()
+	HeaderCache.configure(args)
+	
+	# If a machine-readable output format was requested then write records to stdout and everything else to stderr
+	writer = RecordWriter.configure(args)
 	
 	try:
 		
@@ -197,15 +355,16 @@ def trace():
 			dependencies.extend(StringUtils.sortCaseInsensitive(header.listDelayLoadedImports()))
 			print('done.\n')
 		
-		# Display the module details
-		print('Parsed module details:')
-		OutputFormatting.printModuleDetails(header)
-		print()
-		
-		# Display the list of dependencies
-		print('The module imports {} direct dependencies:'.format(len(dependencies)))
-		print(colored('\n'.join(dependencies), color='yellow'))
-		print()
+		# Display the module details and the list of dependencies
+		if writer is not None:
+			writer.write(RecordWriter.moduleRecord(header, dependencies=dependencies))
+		else:
+			print('Parsed module details:')
+			OutputFormatting.printModuleDetails(header)
+			print()
+			print('The module imports {} direct dependencies:'.format(len(dependencies)))
+			print(colored('\n'.join(dependencies), color='yellow'))
+			print()
 		
 		# Verify that the debugger for the module's architecture is installed
 		debugger = WindowsDebugger()
@@ -219,13 +378,24 @@ def trace():
 		
 		# Perform the LoadLibrary() trace for the module and each of its dependencies
 		cwd = os.path.dirname(args.module)
+		modules = [args.module] + dependencies
 		rawOutput = ''
 		calls = []
-		for module in [args.module] + dependencies:
-			print('Performing LoadLibrary() trace for {}...'.format(module))
-			result = TraceHelpers.performTrace(debugger, helper, module, architecture, cwd)
-			rawOutput += result[0]
-			calls = calls + result[1]
+		if args.separate == True:
+			for module in modules:
+				print('Performing LoadLibrary() trace for {}...'.format(module))
+				result = TraceHelpers.performTrace(debugger, helper, module, architecture, cwd)
+				rawOutput += result[0]
+				calls = calls + result[1]
+				if writer is not None:
+					TraceHelpers.writeCalls(writer, module, result[1])
+		else:
+			print('Performing LoadLibrary() traces for {} modules in a single debugger session...'.format(len(modules)))
+			rawOutput, traces = TraceHelpers.performBatchTrace(debugger, helper, modules, architecture, cwd)
+			for module, moduleCalls in traces:
+				calls.extend(moduleCalls)
+				if writer is not None:
+					TraceHelpers.writeCalls(writer, module, moduleCalls)
 		print('Done.\n', flush=True)
 		
 		# Generate and print summaries each function except for `LdrpResolveDllName`, which requires special treatment
@@ -242,6 +412,10 @@ def trace():
 			}
 			
 			# Print the summary
+			if writer is not None:
+				for dll, result in results.items():
+					writer.write(TraceHelpers.summaryRecord(function, dll, result))
+				continue
 			print('Summary of {} calls:'.format(colored(function, color='yellow')))
 			summary = [(dll, OutputFormatting.formatColouredResult(result, [dll], TraceHelpers.getSuccessMessage(function))) for dll, result in results.items()]
 			OutputFormatting.printRows(summary, spacing=4)
@@ -253,26 +427,35 @@ def trace():
 		
 		# Determine which path (if any) each DLL was resolved to
 		resolved = {
-			dll: TraceHelpers.getResolvedDll(TraceHelpers.aggregateCalls([c for c in instances if os.path.basename(c.dll.lower()) == dll.lower()]))
+			dll: TraceHelpers.aggregateCalls([c for c in instances if os.path.basename(c.dll.lower()) == dll.lower()])
 			for dll in dlls
 		}
 		
 		# Print the summary
-		print('Summary of {} calls:'.format(colored('LdrpResolveDllName', color='yellow')))
-		OutputFormatting.printRows(resolved.items(), spacing=4)
-		print()
+		if writer is not None:
+			for dll, call in resolved.items():
+				writer.write(TraceHelpers.summaryRecord('LdrpResolveDllName', dll, call.result, call.dll))
+		else:
+			print('Summary of {} calls:'.format(colored('LdrpResolveDllName', color='yellow')))
+			OutputFormatting.printRows([(dll, TraceHelpers.getResolvedDll(call)) for dll, call in resolved.items()], spacing=4)
+			print()
 		
 		# Print the raw trace output if the user requested it
 		if args.raw == True:
-			print('Raw trace output:')
-			print(rawOutput, end='', flush=True)
-		
+			if writer is not None:
+				writer.write({'record': 'raw', 'output': rawOutput})
+			else:
+				print('Raw trace output:')
+				print(rawOutput, end='', flush=True)
+	
 	except RuntimeError as e:
 		print('Error: {}'.format(e))
+		if writer is not None:
+			writer.write({'record': 'error', 'message': str(e)})
 		sys.exit(1)
-
-
-DESCRIPTOR = {
-	'function': trace,
-	'description': 'Traces a LoadLibrary() call for a module and reports detailed results'
-}
+	
+	finally:
+		
+		# Ensure the machine-readable output is always a complete document, even if an error occurred
+		if writer is not None:
+			writer.close()
@@ -1,11 +1,69 @@
 #include <windows.h>
 #include <iostream>
+#include <string>
 using std::cout;
 using std::endl;
 
 int wmain(int argc, wchar_t *argv[])
 {
-	if (argc > 1)
+	if (argc > 2 && std::wstring(argv[1]) == L"--batch")
+	{
+		//Prevent Windows from attempting to display any error dialogs
+		SetErrorMode(SEM_FAILCRITICALERRORS);
+		
+		//Attempt to load each of the specified modules in turn, wrapping the output for each module in markers that identify it
+		for (int index = 2; index < argc; ++index)
+		{
+			cout << "[LOADLIBRARY][START][" << (index - 2) << "]" << endl;
+			HINSTANCE handle = LoadLibraryW(argv[index]);
+			cout << "[LOADLIBRARY][END][" << (index - 2) << "]" << endl;
+			
+			//Unload the module so it does not remain loaded when we trace the modules that follow it
+			if (handle != NULL) {
+				FreeLibrary(handle);
+			}
+		}
+	}
+	else if (argc == 2 && std::wstring(argv[1]) == L"--serve")
+	{
+		//Prevent Windows from attempting to display any error dialogs
+		SetErrorMode(SEM_FAILCRITICALERRORS);
+		
+		//Signal that we are ready to receive requests
+		cout << "READY" << endl;
+		
+		//Read UTF-8 module paths from stdin, one per line, until stdin is closed
+		std::string line;
+		while (std::getline(std::cin, line))
+		{
+			//Strip any trailing carriage return
+			if (!line.empty() && line.back() == '\r') {
+				line.pop_back();
+			}
+			
+			//Respond to empty lines (which are used as health checks) with our ready message
+			if (line.empty())
+			{
+				cout << "READY" << endl;
+				continue;
+			}
+			
+			//Convert the module path to UTF-16
+			int length = MultiByteToWideChar(CP_UTF8, 0, line.c_str(), -1, nullptr, 0);
+			std::wstring module(length, L'\0');
+			MultiByteToWideChar(CP_UTF8, 0, line.c_str(), -1, &module[0], length);
+			
+			//Attempt to load the specified module and write the resulting error code to stdout
+			HINSTANCE handle = LoadLibraryW(module.c_str());
+			DWORD result = (handle != NULL) ? 0 : GetLastError();
+			if (handle != NULL) {
+				FreeLibrary(handle);
+			}
+			
+			cout << result << endl;
+		}
+	}
+	else if (argc > 1)
 	{
 		//Prevent Windows from attempting to display any error dialogs
 		SetErrorMode(SEM_FAILCRITICALERRORS);
@@ -27,6 +85,8 @@ int wmain(int argc, wchar_t *argv[])
 	{
 		cout << "Usage:" << endl;
 		cout << "dlldiag-helper-loadlibrary.exe MODULE" << endl;
+		cout << "dlldiag-helper-loadlibrary.exe --batch MODULE [MODULE...]" << endl;
+		cout << "dlldiag-helper-loadlibrary.exe --serve" << endl;
 	}
 	
 	return 0;
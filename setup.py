@@ -17,7 +17,6 @@ setup(
 	long_description_content_type='text/markdown',
 	classifiers=[
 		'License :: OSI Approved :: MIT License',
-		'Programming Language :: Python :: 3.6',
 		'Programming Language :: Python :: 3.7',
 		'Programming Language :: Python :: 3.8',
 		'Programming Language :: Python :: 3.9',
@@ -33,13 +32,12 @@ setup(
 	license='MIT',
 	packages=['dlldiag', 'dlldiag.common', 'dlldiag.subcommands'],
 	zip_safe=False,
-	python_requires = '>=3.6',
+	python_requires = '>=3.7',
 	install_requires = [
 		'colorama',
 		'pefile',
-		'pywin32',
+		'pywin32; platform_system=="Windows"',
 		'networkx>=2.5.1',
-		'pydot>=1.4.2',
 		'setuptools>=38.6.0',
 		'termcolor',
 		'twine>=1.11.0',